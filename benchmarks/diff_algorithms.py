@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the diff algorithms in confwatch.core.diffalgo.
+
+Diffs generated config files (nginx-like, sshd_config-like, a large YAML
+file) after a few kinds of edits, and reports per algorithm the time and
+the size of the unified diff: fewer lines means the algorithm did not match
+repeated lines (``}``, blank lines, ``enabled: true``) across unrelated
+blocks. Run from the repository root:
+
+    python benchmarks/diff_algorithms.py --scale 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from confwatch.core import diffalgo
+
+
+def nginx_config(rng, servers):
+    lines = ['user www-data;', 'worker_processes auto;', '', 'http {']
+    for i in range(servers):
+        lines += [
+            '    server {',
+            '        listen 443 ssl;',
+            f'        server_name site{i}.example.com;',
+            '',
+            '        location / {',
+            f'            proxy_pass http://backend{rng.randrange(8)};',
+            '            proxy_set_header Host $host;',
+            '        }',
+            '',
+            '        location /static/ {',
+            f'            root /srv/site{i};',
+            '        }',
+            '    }',
+            '',
+        ]
+    return lines + ['}']
+
+
+def sshd_config(rng, blocks):
+    lines = ['Port 22', 'PermitRootLogin no', 'PasswordAuthentication no', '']
+    for i in range(blocks):
+        lines += [
+            f'Match User deploy{i}',
+            '    AllowTcpForwarding no',
+            '    X11Forwarding no',
+            f'    ForceCommand /usr/local/bin/deploy{rng.randrange(4)}',
+            '',
+        ]
+    return lines
+
+
+def yaml_config(rng, services):
+    lines = ['services:']
+    for i in range(services):
+        lines += [
+            f'  service{i}:',
+            f'    image: registry.local/app{rng.randrange(20)}:latest',
+            '    enabled: true',
+            '    replicas: 2',
+            '    env:',
+            '      LOG_LEVEL: info',
+            f'      PORT: "{8000 + i}"',
+            '',
+        ]
+    return lines
+
+
+def move_block(rng, lines, size):
+    """Move ``size`` lines to another place."""
+    start = rng.randrange(len(lines) - size)
+    block = lines[start:start + size]
+    rest = lines[:start] + lines[start + size:]
+    target = rng.randrange(len(rest))
+    return rest[:target] + block + rest[target:]
+
+
+def insert_block(rng, lines, size):
+    """Insert a block that repeats lines of the file (closing braces, blanks)."""
+    start = rng.randrange(len(lines) - size)
+    return lines[:start] + lines[start:start + size] + lines[start:]
+
+
+def scatter(rng, lines, edits):
+    """Change ``edits`` random lines."""
+    new = list(lines)
+    for i in rng.sample(range(len(new)), min(edits, len(new))):
+        new[i] = new[i] + '  # changed'
+    return new
+
+
+def cases(scale, seed):
+    rng = random.Random(seed)
+    files = [
+        ('nginx', nginx_config(rng, max(1, scale // 14))),
+        ('sshd_config', sshd_config(rng, max(1, scale // 5))),
+        ('yaml', yaml_config(rng, max(1, scale // 8))),
+    ]
+    for name, lines in files:
+        yield name, 'moved block', lines, move_block(rng, lines, min(40, len(lines) // 4))
+        yield name, 'duplicated block', lines, insert_block(rng, lines, min(28, len(lines) // 4))
+        yield name, 'scattered edits', lines, scatter(rng, lines, max(1, len(lines) // 50))
+
+
+def timed(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=2000, help='Approximate lines per file (default: 2000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per algorithm, best is reported (default: 3)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    print(f"~{args.scale} lines per file, best of {args.repeat}; time in ms / unified diff lines")
+    print(f"{'file':<12} {'edit':<17}" + ''.join(f" {name:>18}" for name in diffalgo.ALGORITHMS))
+    for name, edit, old, new in cases(args.scale, args.seed):
+        a = [line + '\n' for line in old]
+        b = [line + '\n' for line in new]
+        columns = []
+        for algorithm in diffalgo.ALGORITHMS:
+            elapsed, diff = timed(lambda: list(diffalgo.unified_diff(a, b, algorithm=algorithm)), args.repeat)
+            columns.append(f"{elapsed * 1000:9.1f} /{len(diff):6d}")
+        print(f"{name:<12} {edit:<17}" + ''.join(f" {column:>18}" for column in columns))
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark of DiffViewer.side_by_side_diff against the previous implementation.
+
+The previous version split both contents again in every opcode branch, so
+its cost grew with lines x opcodes. Run from the repository root:
+
+    python benchmarks/side_by_side.py --lines 20000 --edits 2000
+"""
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from confwatch.core.diff import DiffViewer
+
+
+def legacy_side_by_side(file1_content, file2_content):
+    """side_by_side_diff as it was before the streaming engine."""
+    matcher = difflib.SequenceMatcher(None, file1_content.splitlines(), file2_content.splitlines())
+    
+    result = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            for line in file1_content.splitlines()[i1:i2]:
+                result.append((line, line, 'equal'))
+        elif tag == 'replace':
+            lines1 = file1_content.splitlines()[i1:i2]
+            lines2 = file2_content.splitlines()[j1:j2]
+            max_len = max(len(lines1), len(lines2))
+            for k in range(max_len):
+                line1 = lines1[k] if k < len(lines1) else ''
+                line2 = lines2[k] if k < len(lines2) else ''
+                result.append((line1, line2, 'replace'))
+        elif tag == 'delete':
+            for line in file1_content.splitlines()[i1:i2]:
+                result.append((line, '', 'delete'))
+        elif tag == 'insert':
+            for line in file2_content.splitlines()[j1:j2]:
+                result.append(('', line, 'insert'))
+    return result
+
+
+def make_config(lines, edits, seed):
+    """A config file and a copy with ``edits`` scattered single-line changes."""
+    rng = random.Random(seed)
+    old = [f"option_{i} = value-{rng.randrange(10 ** 6)}  # setting {i}" for i in range(lines)]
+    new = list(old)
+    for i in sorted(rng.sample(range(lines), min(edits, lines)), reverse=True):
+        kind = rng.randrange(3)
+        if kind == 0:
+            new[i] = new[i].replace('value', 'changed')
+        elif kind == 1:
+            del new[i]
+        else:
+            new.insert(i, f"added_{i} = {rng.randrange(10 ** 6)}")
+    return '\n'.join(old) + '\n', '\n'.join(new) + '\n'
+
+
+def timed(function, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=20000, help='Lines in the file (default: 20000)')
+    parser.add_argument('--edits', type=int, default=2000, help='Scattered edits (default: 2000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per variant, best is reported (default: 3)')
+    parser.add_argument('--context', type=int, default=3, help='Context lines for the folded variant (default: 3)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    
+    old, new = make_config(args.lines, args.edits, args.seed)
+    print(f"{args.lines} lines, {args.edits} edits, best of {args.repeat}")
+    
+    legacy_time, legacy_rows = timed(lambda: legacy_side_by_side(old, new), args.repeat)
+    # difflib matching, so the rows can be compared with the previous version
+    current_time, current_rows = timed(
+        lambda: DiffViewer.side_by_side_diff(old, new, algorithm='difflib'), args.repeat)
+    if legacy_rows != current_rows:
+        print("ERROR: side_by_side_diff output differs from the previous implementation")
+        sys.exit(1)
+    folded_time, folded_rows = timed(
+        lambda: list(DiffViewer.iter_side_by_side(old, new, context=args.context)), args.repeat)
+    
+    print(f"{'previous side_by_side_diff':<40} {legacy_time * 1000:10.1f} ms  {len(legacy_rows)} rows")
+    print(f"{'side_by_side_diff':<40} {current_time * 1000:10.1f} ms  {len(current_rows)} rows"
+          f"  ({legacy_time / current_time:.1f}x)")
+    print(f"{f'iter_side_by_side context={args.context} inline':<40} {folded_time * 1000:10.1f} ms"
+          f"  {len(folded_rows)} rows")
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -14,7 +14,10 @@ sys.path.insert(0, str(project_root))
 
 from confwatch.core.scanner import FileScanner
 from confwatch.core.storage import GitStorage
+from confwatch.core.expected_writes import ExpectedWrites
+from confwatch.core.profiles import default_home
 from confwatch.core.diff import DiffViewer
+from confwatch.core import diffalgo
 from confwatch.web.app import run_web_server
 from confwatch.core.colors import print_header, print_success, print_error, print_warning, colored
 
@@ -30,6 +33,8 @@ Examples:
   confwatch snapshot -c "Daily backup" --force
   confwatch diff ~/.bashrc
   confwatch history ~/.bashrc
+  confwatch search "proxy_pass"
+  confwatch search 10.0.0.5 --file /etc/hosts
   confwatch tag ~/.bashrc "after-nvm-install"
   confwatch rollback ~/.bashrc abc1234
   confwatch web
@@ -37,6 +42,8 @@ Examples:
   confwatch daemon start
   confwatch daemon stop
   confwatch daemon status
+  confwatch daemon reload
+  confwatch --home /srv/app/.confwatch daemon status
   confwatch web-daemon start --port 9000
   confwatch web-daemon stop
   confwatch web-daemon status
@@ -46,11 +53,16 @@ Examples:
   confwatch update --force
   confwatch reset-password
   confwatch reset-password --force
+  confwatch token create backup-script
+  confwatch token list
+  confwatch token revoke backup-script
   confwatch uninstall
   confwatch uninstall --force
         """
     )
     
+    parser.add_argument('--home', help='ConfWatch home directory (default: $CONFWATCH_HOME or ~/.confwatch)')
+    
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
     
     # Snapshot command
@@ -62,11 +74,21 @@ Examples:
     # Diff command
     diff_parser = subparsers.add_parser('diff', help='Show differences for file')
     diff_parser.add_argument('file', help='File to show diff for')
+    diff_parser.add_argument('--algorithm', choices=diffalgo.ALGORITHMS,
+                             help='Diff algorithm (default: diff.algorithm from the config, or histogram)')
     
     # History command
     history_parser = subparsers.add_parser('history', help='Show file history')
     history_parser.add_argument('file', help='File to show history for')
     
+    # Search command
+    search_parser = subparsers.add_parser('search', help='Find text in all snapshots')
+    search_parser.add_argument('query', help='Text to search for (case-insensitive)')
+    search_parser.add_argument('--file', help='Only search the snapshots of this file')
+    search_parser.add_argument('--limit', '-n', type=int, default=20, help='Results per page (default: 20)')
+    search_parser.add_argument('--offset', type=int, default=0, help='Results to skip (default: 0)')
+    search_parser.add_argument('--rebuild', action='store_true', help='Rebuild the search index first')
+    
     # Tag command
     tag_parser = subparsers.add_parser('tag', help='Tag current version of file')
     tag_parser.add_argument('file', help='File to tag')
@@ -94,6 +116,15 @@ Examples:
     reset_password_parser = subparsers.add_parser('reset-password', help='Reset web interface password')
     reset_password_parser.add_argument('--force', '-f', action='store_true', help='Force reset without confirmation')
     
+    # API token commands
+    token_parser = subparsers.add_parser('token', help='Manage API tokens for scripts')
+    token_subparsers = token_parser.add_subparsers(dest='token_action', help='Token actions')
+    token_create_parser = token_subparsers.add_parser('create', help='Create an API token')
+    token_create_parser.add_argument('name', help='Token name (e.g. the script using it)')
+    token_list_parser = token_subparsers.add_parser('list', help='List API tokens')
+    token_revoke_parser = token_subparsers.add_parser('revoke', help='Revoke an API token')
+    token_revoke_parser.add_argument('name', help='Token name')
+    
     # Daemon commands
     daemon_parser = subparsers.add_parser('daemon', help='Manage file monitoring daemon')
     daemon_subparsers = daemon_parser.add_subparsers(dest='daemon_action', help='Daemon actions')
@@ -102,6 +133,9 @@ Examples:
     daemon_start_parser = daemon_subparsers.add_parser('start', help='Start file monitoring daemon')
     daemon_start_parser.add_argument('--foreground', '-f', action='store_true', help='Run in foreground')
     daemon_start_parser.add_argument('--polling', '-p', action='store_true', help='Use polling instead of watchdog')
+    daemon_start_parser.add_argument('--web', action='store_true', help='Also serve the web interface from the daemon process')
+    daemon_start_parser.add_argument('--host', default=None, help='Web interface host (with --web)')
+    daemon_start_parser.add_argument('--port', type=int, default=None, help='Web interface port (with --web)')
     
     # Daemon stop
     daemon_stop_parser = daemon_subparsers.add_parser('stop', help='Stop file monitoring daemon')
@@ -109,10 +143,26 @@ Examples:
     # Daemon restart
     daemon_restart_parser = daemon_subparsers.add_parser('restart', help='Restart file monitoring daemon')
     daemon_restart_parser.add_argument('--polling', '-p', action='store_true', help='Use polling instead of watchdog')
+    daemon_restart_parser.add_argument('--web', action='store_true', help='Also serve the web interface from the daemon process')
+    daemon_restart_parser.add_argument('--host', default=None, help='Web interface host (with --web)')
+    daemon_restart_parser.add_argument('--port', type=int, default=None, help='Web interface port (with --web)')
     
     # Daemon status
     daemon_status_parser = daemon_subparsers.add_parser('status', help='Show daemon status')
     
+    # Daemon reload
+    daemon_reload_parser = daemon_subparsers.add_parser('reload', help='Reload monitored files from config without restarting')
+    
+    # Daemon rescan
+    daemon_rescan_parser = daemon_subparsers.add_parser('rescan', help='Re-check all monitored files for missed changes')
+    
+    # Daemon flush
+    daemon_flush_parser = daemon_subparsers.add_parser('flush', help='Take pending snapshots now')
+    
+    # Daemon metrics
+    daemon_metrics_parser = daemon_subparsers.add_parser('metrics', help='Show daemon counters')
+    daemon_metrics_parser.add_argument('--prometheus', action='store_true', help='Print metrics in Prometheus text format')
+    
     # Update command
     update_parser = subparsers.add_parser('update', help='Update ConfWatch to latest version')
     update_parser.add_argument('--force', '-f', action='store_true', help='Force update without confirmation')
@@ -128,6 +178,8 @@ Examples:
     web_daemon_start_parser.add_argument('--port', type=int, default=None, help='Port to bind to')
     web_daemon_start_parser.add_argument('--debug', action='store_true', help='Enable debug mode')
     web_daemon_start_parser.add_argument('--foreground', '-f', action='store_true', help='Run in foreground')
+    web_daemon_start_parser.add_argument('--workers', type=int, default=None, help='Worker processes (0: development server)')
+    web_daemon_start_parser.add_argument('--threads', type=int, default=None, help='Request threads per worker')
     
     # Web daemon stop
     web_daemon_stop_parser = web_daemon_subparsers.add_parser('stop', help='Stop persistent web server daemon')
@@ -137,6 +189,11 @@ Examples:
     web_daemon_restart_parser.add_argument('--host', default=None, help='Host to bind to')
     web_daemon_restart_parser.add_argument('--port', type=int, default=None, help='Port to bind to')
     web_daemon_restart_parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    web_daemon_restart_parser.add_argument('--workers', type=int, default=None, help='Worker processes (0: development server)')
+    web_daemon_restart_parser.add_argument('--threads', type=int, default=None, help='Request threads per worker')
+    
+    # Web daemon reload
+    web_daemon_reload_parser = web_daemon_subparsers.add_parser('reload', help='Replace web workers gracefully, without dropping connections')
     
     # Web daemon status
     web_daemon_status_parser = web_daemon_subparsers.add_parser('status', help='Show web daemon status')
@@ -146,6 +203,10 @@ Examples:
     web_daemon_config_parser.add_argument('--host', default='0.0.0.0', help='Host to bind to (default: 0.0.0.0)')
     web_daemon_config_parser.add_argument('--port', type=int, default=8080, help='Port to bind to (default: 8080)')
     web_daemon_config_parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    web_daemon_config_parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: one per core, up to 4; 0: development server)')
+    web_daemon_config_parser.add_argument('--threads', type=int, default=4, help='Request threads per worker (default: 4)')
+    web_daemon_config_parser.add_argument('--timeout', type=int, default=60, help='Request timeout in seconds (default: 60)')
+    web_daemon_config_parser.add_argument('--max-requests', type=int, default=0, help='Requests after which a worker is replaced (default: 0, never)')
     
     # Completion command
     completion_parser = subparsers.add_parser('completion', help='Install shell completion')
@@ -160,7 +221,12 @@ Examples:
         return
     
     # Configuration
-    confwatch_home = os.path.expanduser("~/.confwatch")
+    if args.home:
+        # Child processes (web daemon) and the web app follow the same home
+        os.environ['CONFWATCH_HOME'] = os.path.abspath(os.path.expanduser(args.home))
+        from confwatch.web import app as web_app
+        web_app.set_home(os.environ['CONFWATCH_HOME'])
+    confwatch_home = default_home()
     config_file = os.path.join(confwatch_home, "config", "config.yml")
     repo_dir = os.path.join(confwatch_home, "repo")
     
@@ -176,6 +242,8 @@ Examples:
             handle_diff(args, config_file, repo_dir)
         elif args.command == 'history':
             handle_history(args, config_file, repo_dir)
+        elif args.command == 'search':
+            handle_search(args, config_file, repo_dir)
         elif args.command == 'tag':
             handle_tag(args, config_file, repo_dir)
         elif args.command == 'rollback':
@@ -188,6 +256,8 @@ Examples:
             handle_uninstall(args)
         elif args.command == 'reset-password':
             handle_reset_password(args, config_file)
+        elif args.command == 'token':
+            handle_token(args, config_file)
         elif args.command == 'daemon':
             handle_daemon(args, config_file, repo_dir)
         elif args.command == 'update':
@@ -255,7 +325,13 @@ def handle_diff(args, config_file, repo_dir):
         return
     prev_commit = history[1]['hash']
     curr_commit = history[0]['hash']
-    diff_output = storage.get_file_diff(args.file, prev_commit, curr_commit)
+    algorithm = args.algorithm
+    if algorithm is None:
+        try:
+            algorithm = diffalgo.configure(scanner)
+        except ValueError as e:
+            print(f"Warning: {e}")
+    diff_output = storage.get_file_diff(args.file, prev_commit, curr_commit, algorithm=algorithm)
     print(diff_output)
 
 def handle_history(args, config_file, repo_dir):
@@ -269,6 +345,40 @@ def handle_history(args, config_file, repo_dir):
     for entry in history:
         print(f"[{entry['date']}] {entry['hash'][:8]} - {entry['message']}")
 
+def handle_search(args, config_file, repo_dir):
+    """Handle search command."""
+    from confwatch.core.context import AppContext
+    context = AppContext(config_file, repo_dir)
+    if args.rebuild or not context.search_index.exists():
+        print("Building search index...")
+        if args.rebuild:
+            context.search_index.rebuild()
+    found = context.search(args.query, args.file, max(args.offset, 0), max(args.limit, 1))
+    if not found['total']:
+        print(f"No snapshots contain '{args.query}'")
+        return
+    results = found['results']
+    if not results:
+        print(f"'{args.query}' found in {found['total']} place(s), none after offset {args.offset}")
+        return
+    first = args.offset + 1
+    print(f"'{args.query}' found in {found['total']} place(s), showing {first}-{args.offset + len(results)}:")
+    print("=" * 50)
+    for result in results:
+        name = result['file'] or f"{result['name'].split('_', 1)[-1]} (no longer monitored)"
+        added = result['added']
+        removed = result['removed']
+        print(colored(name, 'cyan'))
+        print(f"  added   [{added['date']}] {added['hash'][:8]}")
+        if removed:
+            print(f"  removed [{removed['date']}] {removed['hash'][:8]}")
+        else:
+            print(f"  still present ({result['versions']} version(s))")
+        if result['line'] is not None:
+            print(f"  {result['line']}: {result['text'].strip()}")
+    if args.offset + len(results) < found['total']:
+        print(f"More results: --offset {args.offset + len(results)}")
+
 def handle_tag(args, config_file, repo_dir):
     """Handle tag command."""
     storage = GitStorage(repo_dir)
@@ -362,8 +472,8 @@ def handle_rollback(args, config_file, repo_dir):
         expanded_path = scanner.expand_path(args.file)
         
         try:
-            with open(expanded_path, 'w', encoding='utf-8') as f:
-                f.write(file_content)
+            confwatch_home = os.path.dirname(os.path.dirname(config_file))
+            ExpectedWrites(confwatch_home).write_file(expanded_path, file_content)
         except Exception as e:
             print(f"Error writing file {args.file}: {e}")
             return
@@ -416,7 +526,7 @@ def handle_list(config_file):
 
 def handle_uninstall(args):
     """Handle uninstall command."""
-    confwatch_home = os.path.expanduser("~/.confwatch")
+    confwatch_home = default_home()
     
     if not os.path.exists(confwatch_home):
         print("ConfWatch is not installed.")
@@ -507,6 +617,39 @@ def handle_reset_password(args, config_file):
     except Exception as e:
         print_error(f"Error resetting password: {e}")
 
+def handle_token(args, config_file):
+    """Handle token commands."""
+    from confwatch.core.auth import AuthManager
+    
+    auth = AuthManager(config_file)
+    
+    if args.token_action == 'create':
+        try:
+            token = auth.create_token(args.name)
+        except ValueError as e:
+            print_error(str(e))
+            return
+        print_success(f"API token '{args.name}' created")
+        print()
+        print(colored(token, "green", "bold"))
+        print()
+        print_warning("Save this token! It won't be shown again.")
+        print("Send it as: Authorization: Bearer <token>")
+    elif args.token_action == 'list':
+        tokens = auth.list_tokens()
+        if not tokens:
+            print("No API tokens.")
+            return
+        for token in tokens:
+            print(f"{token['name']:<30} created {token['created_at']}")
+    elif args.token_action == 'revoke':
+        if auth.revoke_token(args.name):
+            print_success(f"API token '{args.name}' revoked")
+        else:
+            print_error(f"No API token named '{args.name}'")
+    else:
+        print("Usage: confwatch token {create,list,revoke}")
+
 def handle_daemon(args, config_file, repo_dir):
     """Handle daemon commands."""
     from confwatch.daemon.daemon import DaemonManager
@@ -514,14 +657,25 @@ def handle_daemon(args, config_file, repo_dir):
     daemon = DaemonManager(config_file, repo_dir)
     
     if not args.daemon_action:
-        print("Error: No daemon action specified. Use 'start', 'stop', 'restart', or 'status'")
+        print("Error: No daemon action specified. Use 'start', 'stop', 'restart', 'reload', 'rescan', 'flush', 'metrics', or 'status'")
         return
     
+    def web_options():
+        """Web server address for combined mode, defaulting to the web daemon's config."""
+        if not getattr(args, 'web', False):
+            return None
+        from confwatch.core.web_daemon import WebDaemonManager
+        web_config = WebDaemonManager(config_file).load_config()
+        return {
+            'host': args.host or web_config['host'],
+            'port': args.port or web_config['port'],
+        }
+    
     if args.daemon_action == 'start':
         use_watchdog = not args.polling
         background = not args.foreground
         
-        if daemon.start(background=background, use_watchdog=use_watchdog):
+        if daemon.start(background=background, use_watchdog=use_watchdog, web=web_options()):
             if background:
                 print("✓ Daemon started successfully in background")
             else:
@@ -539,12 +693,56 @@ def handle_daemon(args, config_file, repo_dir):
     
     elif args.daemon_action == 'restart':
         use_watchdog = not args.polling
-        if daemon.restart(use_watchdog=use_watchdog):
+        if daemon.restart(use_watchdog=use_watchdog, web=web_options()):
             print("✓ Daemon restarted successfully")
         else:
             print("✗ Failed to restart daemon")
             sys.exit(1)
     
+    elif args.daemon_action == 'reload':
+        if daemon.reload():
+            print("✓ Daemon configuration reload requested")
+        else:
+            print("✗ Failed to reload daemon configuration")
+            sys.exit(1)
+    
+    elif args.daemon_action in ('rescan', 'flush', 'metrics'):
+        from confwatch.daemon.control import ControlError
+        
+        if not daemon.is_running():
+            print("✗ Daemon is not running")
+            sys.exit(1)
+        command = args.daemon_action
+        if command == 'metrics' and args.prometheus:
+            command = 'prometheus'
+        try:
+            result = daemon.request(command, timeout=60)
+        except ControlError as e:
+            print(f"✗ {e}")
+            sys.exit(1)
+        
+        if args.daemon_action == 'rescan':
+            if not result.get('success'):
+                print(f"✗ Rescan failed: {result.get('error')}")
+                sys.exit(1)
+            print(f"✓ Rescanned {result['checked']} files: {result['rehashed']} re-hashed, "
+                  f"{result['drifted']} snapshotted ({result['duration_ms']} ms)")
+            for name, profile in result.get('profiles', {}).items():
+                if profile.get('success'):
+                    print(f"  {name}: {profile['checked']} files, {profile['drifted']} snapshotted")
+                else:
+                    print(f"  {name}: failed: {profile.get('error')}")
+        elif args.daemon_action == 'flush':
+            state = "done" if result['idle'] else "still in progress"
+            print(f"✓ Flushed {result['flushed']} pending snapshot(s), {state} ({result['duration_ms']} ms)")
+            for name, profile in result.get('profiles', {}).items():
+                print(f"  {name}: {profile['flushed']} flushed")
+        elif command == 'prometheus':
+            print(result, end='')
+        else:
+            for name, value in sorted(result.items()):
+                print(f"{name}: {value}")
+    
     elif args.daemon_action == 'status':
         status = daemon.status()
         
@@ -557,6 +755,44 @@ def handle_daemon(args, config_file, repo_dir):
             print(f"Mode: {status.get('mode', 'unknown')}")
             print(f"Monitored files: {status.get('monitored_files', 0)}")
             print(f"Pending snapshots: {status.get('pending_snapshots', 0)}")
+            queue = status.get('queue')
+            if queue:
+                print(f"Snapshot queue: {queue['depth']}/{queue['capacity']} queued, "
+                      f"{queue['in_flight']} in flight, "
+                      f"avg wait {queue['avg_wait_seconds']}s, {queue['dropped']} dropped")
+            journal = status.get('journal')
+            if journal:
+                print(f"Capture journal: {journal['pending_versions']} uncommitted version(s), "
+                      f"{journal['captured']} captured, {journal['bytes']} bytes")
+            reconcile = status.get('last_reconcile')
+            if reconcile:
+                print(f"Startup reconciliation: {reconcile['checked']} checked, "
+                      f"{reconcile['rehashed']} re-hashed, {reconcile['drifted']} snapshotted")
+            if status.get('echoes_suppressed'):
+                print(f"Skipped own writes: {status['echoes_suppressed']}")
+            rate_limit = status.get('rate_limit')
+            if rate_limit and rate_limit['enabled']:
+                print(f"Rate limiting: {len(rate_limit['damped_files'])} damped, "
+                      f"{rate_limit['limited_files']} deferred, "
+                      f"{rate_limit['deferred_changes']} changes summarised")
+                for path in rate_limit['damped_files']:
+                    print(f"  Damped: {path}")
+            web = status.get('web')
+            if web:
+                print(f"Web interface: http://{web['host']}:{web['port']} "
+                      f"({'running' if web['running'] else 'stopped'})")
+                context = status.get('context', {})
+                print(f"Shared cache: {context.get('cached_histories', 0)} histories, "
+                      f"{context.get('cached_responses', 0)} responses, "
+                      f"{context.get('cache_hits', 0)} hits / {context.get('cache_misses', 0)} misses")
+            profiles = status.get('profiles')
+            if profiles:
+                core = status.get('core', {})
+                print(f"Profiles: {len(profiles) + 1} sharing {core.get('watched_directories', 0)} "
+                      f"directory watch(es)")
+                for name, profile in profiles.items():
+                    print(f"  {name}: {profile['monitored_files']} files, {profile['mode']}, "
+                          f"{profile['pending_snapshots']} pending ({profile['home']})")
             print(f"Watchdog available: {'Yes' if status.get('watchdog_available', False) else 'No'}")
         
         print(f"PID file: {status['pid_file']}")
@@ -582,7 +818,7 @@ def handle_web_daemon(args, config_file):
     web_daemon = WebDaemonManager(config_file)
     
     if not args.web_daemon_action:
-        print("Error: No web daemon action specified. Use 'start', 'stop', 'restart', 'status', or 'config'")
+        print("Error: No web daemon action specified. Use 'start', 'stop', 'restart', 'reload', 'status', or 'config'")
         return
     
     if args.web_daemon_action == 'start':
@@ -592,7 +828,9 @@ def handle_web_daemon(args, config_file):
             background=background,
             host=args.host,
             port=args.port,
-            debug=args.debug
+            debug=args.debug,
+            workers=args.workers,
+            threads=args.threads
         ):
             if background:
                 print("✅ Web daemon started successfully in background")
@@ -610,12 +848,17 @@ def handle_web_daemon(args, config_file):
             sys.exit(1)
     
     elif args.web_daemon_action == 'restart':
-        if web_daemon.restart(host=args.host, port=args.port, debug=args.debug):
+        if web_daemon.restart(host=args.host, port=args.port, debug=args.debug,
+                              workers=args.workers, threads=args.threads):
             print("✅ Web daemon restarted successfully")
         else:
             print("❌ Failed to restart web daemon")
             sys.exit(1)
     
+    elif args.web_daemon_action == 'reload':
+        if not web_daemon.reload():
+            sys.exit(1)
+    
     elif args.web_daemon_action == 'status':
         status = web_daemon.status()
         
@@ -627,17 +870,22 @@ def handle_web_daemon(args, config_file):
             print(f"PID: {status['pid']}")
             print(f"URL: http://{status['host']}:{status['port']}")
             print(f"Debug mode: {'Yes' if status['debug'] else 'No'}")
+            print(f"Server: {status['server']}")
         
         print(f"Configuration file: {status['config_file']}")
         print(f"PID file: {status['pid_file']}")
         print(f"Log file: {status['log_file']}")
     
     elif args.web_daemon_action == 'config':
-        web_daemon.save_config(host=args.host, port=args.port, debug=args.debug)
+        web_daemon.save_config(host=args.host, port=args.port, debug=args.debug, workers=args.workers,
+                               threads=args.threads, timeout=args.timeout, max_requests=args.max_requests)
+        config = web_daemon.load_config()
         print("✅ Web daemon configuration updated")
         print(f"Host: {args.host}")
         print(f"Port: {args.port}")
         print(f"Debug: {args.debug}")
+        print(f"Workers: {config['workers']}, threads: {config['threads']}, "
+              f"timeout: {config['timeout']}s, max requests: {config['max_requests']}")
 
 def handle_completion(args):
     """Handle completion command."""
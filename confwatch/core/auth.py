@@ -1,14 +1,22 @@
 """
 Authentication module for ConfWatch.
-Provides simple password-based authentication with unique passwords per installation.
+Provides simple password-based authentication with unique passwords per installation,
+and named API tokens for scripts and other non-browser clients.
 """
 
 import os
+import hmac
 import secrets
 import hashlib
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
 import yaml
 from pathlib import Path
 
+TOKEN_PREFIX = 'cw_'
+
 
 class AuthManager:
     """Manages authentication for ConfWatch web interface."""
@@ -17,6 +25,50 @@ class AuthManager:
         """Initialize AuthManager with config file path."""
         self.config_file = config_file
         self.auth_file = os.path.join(os.path.dirname(config_file), "auth.yml")
+        self._lock = threading.Lock()
+        self._signature = None
+        self._data: Dict = {}
+        self._token_names: Dict[str, str] = {}  # token hash -> token name
+    
+    def _load(self) -> Dict:
+        """Parsed auth file, re-read only when its stat signature changes."""
+        try:
+            st = os.stat(self.auth_file)
+            signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            signature = None
+        with self._lock:
+            if signature != self._signature:
+                data = {}
+                if signature is not None:
+                    try:
+                        with open(self.auth_file, 'r') as f:
+                            data = yaml.safe_load(f) or {}
+                    except Exception:
+                        data = {}
+                if not isinstance(data, dict):
+                    data = {}
+                tokens = data.get('tokens') or {}
+                self._data = data
+                self._token_names = {
+                    entry['hash']: name for name, entry in tokens.items()
+                    if isinstance(entry, dict) and entry.get('hash')
+                }
+                self._signature = signature
+            return self._data
+    
+    def _save(self, data: Dict):
+        """Replace the auth file atomically (readable by the owner only)."""
+        directory = os.path.dirname(self.auth_file)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.auth.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                yaml.dump(data, f, default_flow_style=False)
+            os.replace(tmp, self.auth_file)
+        except BaseException:
+            os.unlink(tmp)
+            raise
     
     def generate_password(self):
         """Generate a random password for this installation."""
@@ -30,27 +82,19 @@ class AuthManager:
         return hashlib.sha256(password.encode()).hexdigest()
     
     def save_password(self, password):
-        """Save hashed password to auth file."""
+        """Save hashed password to auth file (API tokens are kept)."""
         auth_data = {
             'password_hash': self.hash_password(password),
             'created_at': str(Path().cwd())
         }
-        
-        os.makedirs(os.path.dirname(self.auth_file), exist_ok=True)
-        with open(self.auth_file, 'w') as f:
-            yaml.dump(auth_data, f, default_flow_style=False)
+        tokens = self._load().get('tokens')
+        if tokens:
+            auth_data['tokens'] = tokens
+        self._save(auth_data)
     
     def get_stored_password_hash(self):
         """Get stored password hash from auth file."""
-        if not os.path.exists(self.auth_file):
-            return None
-        
-        try:
-            with open(self.auth_file, 'r') as f:
-                auth_data = yaml.safe_load(f)
-                return auth_data.get('password_hash')
-        except Exception:
-            return None
+        return self._load().get('password_hash')
     
     def verify_password(self, password):
         """Verify if provided password matches stored hash."""
@@ -58,7 +102,7 @@ class AuthManager:
         if not stored_hash:
             return False
         
-        return self.hash_password(password) == stored_hash
+        return hmac.compare_digest(self.hash_password(password), stored_hash)
     
     def is_authenticated(self):
         """Check if authentication is set up."""
@@ -69,12 +113,56 @@ class AuthManager:
         if not os.path.exists(self.auth_file):
             return None
         
-        try:
-            with open(self.auth_file, 'r') as f:
-                auth_data = yaml.safe_load(f)
-                return {
-                    'created_at': auth_data.get('created_at', 'Unknown'),
-                    'has_password': bool(auth_data.get('password_hash'))
-                }
-        except Exception:
-            return None 
\ No newline at end of file
+        auth_data = self._load()
+        return {
+            'created_at': auth_data.get('created_at', 'Unknown'),
+            'has_password': bool(auth_data.get('password_hash'))
+        }
+    
+    # API tokens
+    
+    def create_token(self, name: str) -> str:
+        """Create a named API token and return it. Only its hash is stored."""
+        if not name:
+            raise ValueError("Token name is required")
+        data = dict(self._load())
+        tokens = dict(data.get('tokens') or {})
+        if name in tokens:
+            raise ValueError(f"Token '{name}' already exists")
+        token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+        tokens[name] = {'hash': self.hash_password(token), 'created_at': datetime.now().isoformat(timespec='seconds')}
+        data['tokens'] = tokens
+        self._save(data)
+        return token
+    
+    def revoke_token(self, name: str) -> bool:
+        """Delete a token. Returns False if there is no token with that name."""
+        data = dict(self._load())
+        tokens = dict(data.get('tokens') or {})
+        if tokens.pop(name, None) is None:
+            return False
+        data['tokens'] = tokens
+        self._save(data)
+        return True
+    
+    def list_tokens(self) -> List[Dict]:
+        """Names and creation times of the API tokens."""
+        tokens = self._load().get('tokens') or {}
+        return [{'name': name, 'created_at': entry.get('created_at', 'Unknown')}
+                for name, entry in sorted(tokens.items()) if isinstance(entry, dict)]
+    
+    def verify_token(self, token: str) -> Optional[str]:
+        """Name of the API token ``token``, or None if it is not valid.
+        
+        The lookup is by SHA-256 of the token, so its time does not depend on
+        how much of a guess matches a real token.
+        """
+        if not token or not token.startswith(TOKEN_PREFIX):
+            return None
+        digest = self.hash_password(token)
+        data = self._load()
+        name = self._token_names.get(digest)
+        if name is None:
+            return None
+        entry = (data.get('tokens') or {}).get(name) or {}
+        return name if hmac.compare_digest(entry.get('hash', ''), digest) else None 
\ No newline at end of file
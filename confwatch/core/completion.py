@@ -20,7 +20,7 @@ class CompletionGenerator:
             },
             'diff': {
                 'help': 'Show diff between versions',
-                'args': [],
+                'args': ['--algorithm'],
                 'files': True
             },
             'history': {
@@ -28,6 +28,10 @@ class CompletionGenerator:
                 'args': [],
                 'files': True
             },
+            'search': {
+                'help': 'Find text in all snapshots',
+                'args': ['--file', '--limit', '-n', '--offset', '--rebuild']
+            },
             'tag': {
                 'help': 'Tag current version',
                 'args': [],
@@ -45,26 +49,39 @@ class CompletionGenerator:
             'web-daemon': {
                 'help': 'Manage persistent web server daemon',
                 'subcommands': {
-                    'start': {'args': ['--host', '--port', '--debug', '--foreground', '-f']},
+                    'start': {'args': ['--host', '--port', '--debug', '--foreground', '-f', '--workers', '--threads']},
                     'stop': {'args': []},
-                    'restart': {'args': ['--host', '--port', '--debug']},
+                    'restart': {'args': ['--host', '--port', '--debug', '--workers', '--threads']},
+                    'reload': {'args': []},
                     'status': {'args': []},
-                    'config': {'args': ['--host', '--port', '--debug']}
+                    'config': {'args': ['--host', '--port', '--debug', '--workers', '--threads', '--timeout', '--max-requests']}
                 }
             },
             'daemon': {
                 'help': 'Manage file monitoring daemon',
                 'subcommands': {
-                    'start': {'args': ['--foreground', '-f', '--polling', '-p']},
+                    'start': {'args': ['--foreground', '-f', '--polling', '-p', '--web', '--host', '--port']},
                     'stop': {'args': []},
-                    'restart': {'args': ['--polling', '-p']},
-                    'status': {'args': []}
+                    'restart': {'args': ['--polling', '-p', '--web', '--host', '--port']},
+                    'status': {'args': []},
+                    'reload': {'args': []},
+                    'rescan': {'args': []},
+                    'flush': {'args': []},
+                    'metrics': {'args': ['--prometheus']}
                 }
             },
             'update': {
                 'help': 'Update ConfWatch to latest version',
                 'args': ['--force', '-f', '--branch']
             },
+            'token': {
+                'help': 'Manage API tokens for scripts',
+                'subcommands': {
+                    'create': {'args': []},
+                    'list': {'args': []},
+                    'revoke': {'args': []}
+                }
+            },
             'reset-password': {
                 'help': 'Reset web interface password',
                 'args': ['--force', '-f']
@@ -87,10 +104,10 @@ _confwatch_completion() {
     prev="${COMP_WORDS[COMP_CWORD-1]}"
     
     # Main commands
-    local commands="list snapshot diff history tag rollback web web-daemon daemon update reset-password uninstall"
+    local commands="list snapshot diff history search tag rollback web web-daemon daemon update token reset-password uninstall"
     
     # Global options
-    local global_opts="--help -h --version"
+    local global_opts="--help -h --version --home"
     
     # If we're completing the first argument (command)
     if [[ ${COMP_CWORD} == 1 ]]; then
@@ -110,7 +127,24 @@ _confwatch_completion() {
                 COMPREPLY=( $(compgen -f -- ${cur}) )
             fi
             ;;
-        diff|history|tag|rollback)
+        search)
+            if [[ ${prev} == --file ]]; then
+                COMPREPLY=( $(compgen -f -- ${cur}) )
+            else
+                local opts="--file --limit -n --offset --rebuild"
+                COMPREPLY=( $(compgen -W "${opts}" -- ${cur}) )
+            fi
+            ;;
+        diff)
+            if [[ ${prev} == --algorithm ]]; then
+                COMPREPLY=( $(compgen -W "histogram patience myers difflib" -- ${cur}) )
+            elif [[ ${cur} == -* ]]; then
+                COMPREPLY=( $(compgen -W "--algorithm" -- ${cur}) )
+            else
+                COMPREPLY=( $(compgen -f -- ${cur}) )
+            fi
+            ;;
+        history|tag|rollback)
             if [[ ${cur} == -* ]]; then
                 COMPREPLY=()
             else
@@ -123,38 +157,45 @@ _confwatch_completion() {
             COMPREPLY=( $(compgen -W "${opts}" -- ${cur}) )
             ;;
         web-daemon)
-            local subcommands="start stop restart status config"
+            local subcommands="start stop restart reload status config"
             if [[ ${COMP_CWORD} == 2 ]]; then
                 COMPREPLY=( $(compgen -W "${subcommands}" -- ${cur}) )
             else
                 local subcmd="${COMP_WORDS[2]}"
                 case $subcmd in
-                    start|config)
-                        local opts="--host --port --debug --foreground -f"
+                    start)
+                        local opts="--host --port --debug --foreground -f --workers --threads"
+                        COMPREPLY=( $(compgen -W "${opts}" -- ${cur}) )
+                        ;;
+                    config)
+                        local opts="--host --port --debug --workers --threads --timeout --max-requests"
                         COMPREPLY=( $(compgen -W "${opts}" -- ${cur}) )
                         ;;
                     restart)
-                        local opts="--host --port --debug"
+                        local opts="--host --port --debug --workers --threads"
                         COMPREPLY=( $(compgen -W "${opts}" -- ${cur}) )
                         ;;
-                    stop|status)
+                    stop|status|reload)
                         COMPREPLY=()
                         ;;
                 esac
             fi
             ;;
         daemon)
-            local subcommands="start stop restart status"
+            local subcommands="start stop restart status reload rescan flush metrics"
             if [[ ${COMP_CWORD} == 2 ]]; then
                 COMPREPLY=( $(compgen -W "${subcommands}" -- ${cur}) )
             else
                 local subcmd="${COMP_WORDS[2]}"
                 case $subcmd in
                     start|restart)
-                        local opts="--foreground -f --polling -p"
+                        local opts="--foreground -f --polling -p --web --host --port"
                         COMPREPLY=( $(compgen -W "${opts}" -- ${cur}) )
                         ;;
-                    stop|status)
+                    metrics)
+                        COMPREPLY=( $(compgen -W "--prometheus" -- ${cur}) )
+                        ;;
+                    stop|status|reload|rescan|flush)
                         COMPREPLY=()
                         ;;
                 esac
@@ -168,6 +209,11 @@ _confwatch_completion() {
             local opts="--force -f"
             COMPREPLY=( $(compgen -W "${opts}" -- ${cur}) )
             ;;
+        token)
+            if [[ ${COMP_CWORD} == 2 ]]; then
+                COMPREPLY=( $(compgen -W "create list revoke" -- ${cur}) )
+            fi
+            ;;
         *)
             COMPREPLY=()
             ;;
@@ -189,6 +235,7 @@ _confwatch() {
     typeset -A opt_args
     
     _arguments -C \\
+        '--home[ConfWatch home directory]:home:_files -/' \\
         '1: :_confwatch_commands' \\
         '*::arg:->args'
     
@@ -201,9 +248,22 @@ _confwatch() {
                         '(-f --force)'{-f,--force}'[Force snapshot creation]' \\
                         '*:file:_files'
                     ;;
-                diff|history|tag|rollback)
+                diff)
+                    _arguments \\
+                        '--algorithm[Diff algorithm]:algorithm:(histogram patience myers difflib)' \\
+                        '*:file:_files'
+                    ;;
+                history|tag|rollback)
                     _arguments '*:file:_files'
                     ;;
+                search)
+                    _arguments \\
+                        '--file[Only search this file]:file:_files' \\
+                        '(-n --limit)'{-n,--limit}'[Results per page]:limit:' \\
+                        '--offset[Results to skip]:offset:' \\
+                        '--rebuild[Rebuild the search index first]' \\
+                        '1:query:'
+                    ;;
                 web)
                     _arguments \\
                         '--host[Host to bind to]:host:' \\
@@ -225,6 +285,9 @@ _confwatch() {
                     _arguments \\
                         '(-f --force)'{-f,--force}'[Force without confirmation]'
                     ;;
+                token)
+                    _arguments '1:action:(create list revoke)' '2:name:'
+                    ;;
             esac
             ;;
     esac
@@ -236,12 +299,14 @@ _confwatch_commands() {
         'snapshot:Create snapshots'
         'diff:Show diff between versions'
         'history:Show file history'
+        'search:Find text in all snapshots'
         'tag:Tag current version'
         'rollback:Rollback to specific version'
         'web:Start web interface'
         'web-daemon:Manage persistent web server daemon'
         'daemon:Manage file monitoring daemon'
         'update:Update ConfWatch to latest version'
+        'token:Manage API tokens for scripts'
         'reset-password:Reset web interface password'
         'uninstall:Uninstall ConfWatch'
     )
@@ -259,18 +324,32 @@ _confwatch_web_daemon() {
     case $state in
         args)
             case $words[2] in
-                start|config)
+                start)
                     _arguments \\
                         '--host[Host to bind to]:host:' \\
                         '--port[Port to bind to]:port:' \\
                         '--debug[Enable debug mode]' \\
-                        '(-f --foreground)'{-f,--foreground}'[Run in foreground]'
+                        '(-f --foreground)'{-f,--foreground}'[Run in foreground]' \\
+                        '--workers[Worker processes]:workers:' \\
+                        '--threads[Request threads per worker]:threads:'
+                    ;;
+                config)
+                    _arguments \\
+                        '--host[Host to bind to]:host:' \\
+                        '--port[Port to bind to]:port:' \\
+                        '--debug[Enable debug mode]' \\
+                        '--workers[Worker processes]:workers:' \\
+                        '--threads[Request threads per worker]:threads:' \\
+                        '--timeout[Request timeout in seconds]:seconds:' \\
+                        '--max-requests[Requests before a worker is replaced]:requests:'
                     ;;
                 restart)
                     _arguments \\
                         '--host[Host to bind to]:host:' \\
                         '--port[Port to bind to]:port:' \\
-                        '--debug[Enable debug mode]'
+                        '--debug[Enable debug mode]' \\
+                        '--workers[Worker processes]:workers:' \\
+                        '--threads[Request threads per worker]:threads:'
                     ;;
             esac
             ;;
@@ -282,6 +361,7 @@ _confwatch_web_daemon_commands() {
         'start:Start persistent web server daemon'
         'stop:Stop persistent web server daemon'
         'restart:Restart persistent web server daemon'
+        'reload:Replace web workers gracefully'
         'status:Show web daemon status'
         'config:Configure web daemon settings'
     )
@@ -302,7 +382,13 @@ _confwatch_daemon() {
                 start|restart)
                     _arguments \\
                         '(-f --foreground)'{-f,--foreground}'[Run in foreground]' \\
-                        '(-p --polling)'{-p,--polling}'[Use polling instead of watchdog]'
+                        '(-p --polling)'{-p,--polling}'[Use polling instead of watchdog]' \\
+                        '--web[Also serve the web interface]' \\
+                        '--host[Web interface host]:host:' \\
+                        '--port[Web interface port]:port:'
+                    ;;
+                metrics)
+                    _arguments '--prometheus[Prometheus text format]'
                     ;;
             esac
             ;;
@@ -315,6 +401,10 @@ _confwatch_daemon_commands() {
         'stop:Stop file monitoring daemon'
         'restart:Restart file monitoring daemon'
         'status:Show daemon status'
+        'reload:Reload monitored files from config'
+        'rescan:Re-check all monitored files'
+        'flush:Take pending snapshots now'
+        'metrics:Show daemon counters'
     )
     _describe 'daemon command' commands
 }
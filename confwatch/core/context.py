@@ -0,0 +1,414 @@
+"""
+Shared application context: one repository handle, the parsed config, a
+history cache, the response cache and the search index. The web server keeps one for its whole lifetime, and
+shares it with the file watcher when both run in the daemon process.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from . import diffalgo, metrics
+from .expected_writes import stat_signature
+from .response_cache import ResponseCache
+from .scanner import FileScanner
+from .search import SearchIndex
+from .storage import GitStorage
+
+_FULL_SHA = re.compile(r'^[0-9a-f]{40}$')
+
+
+class AppContext:
+    """Config, storage and caches shared between the watcher and the web UI.
+    
+    A GitPython ``Repo`` is not thread-safe, so every repository access goes
+    through ``lock``. File histories are cached until the next snapshot of
+    that file (``invalidate``), or until HEAD moves for another reason (a
+    commit made by a separate process). Diffs are cached in ``responses`` by
+    the blob ids they compare, so they never go stale.
+    
+    Checking for changes costs a few ``stat()`` calls per request: the config
+    is re-parsed only when its mtime changes, and HEAD is resolved only when
+    the HEAD, branch ref or packed-refs file changed.
+    """
+    
+    def __init__(self, config_file: str, repo_dir: str, cache_size: int = 256,
+                 responses: Optional[ResponseCache] = None):
+        self.config_file = config_file
+        self.repo_dir = repo_dir
+        self.cache_size = cache_size
+        self.lock = threading.RLock()
+        self.storage = GitStorage(repo_dir)
+        
+        self._scanner: Optional[FileScanner] = None
+        self._config_mtime: Optional[int] = None
+        self._watched: List[Tuple[str, str]] = []
+        self._resolved: Dict[str, str] = {}
+        self._abs_paths: Set[str] = set()
+        self._safe_names: Dict[str, str] = {}
+        self._head: Optional[str] = None
+        self._head_signature: Optional[tuple] = None
+        self._head_ref: Optional[Tuple[tuple, str]] = None  # (HEAD file signature, ref file)
+        self._history: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        self._blobs: "OrderedDict[Tuple[str, str], str]" = OrderedDict()  # (commit, file) -> blob
+        self._summaries: Optional[Dict[str, Dict]] = None
+        self._summaries_head: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.config_loads = 0
+        self.head_changes = 0
+        self.responses = responses or self._response_cache()
+        self.search_index = SearchIndex.for_home(self.home, self.storage, self.lock)
+    
+    def _response_cache(self) -> ResponseCache:
+        """Response cache configured by the ``web:`` section of the config."""
+        try:
+            settings = self.scanner().get_settings('web')
+        except (OSError, ValueError):
+            settings = {}
+        return ResponseCache.from_settings(settings, self.home)
+    
+    @property
+    def home(self) -> str:
+        """The ConfWatch home this context belongs to."""
+        return os.path.dirname(os.path.dirname(self.config_file))
+    
+    @staticmethod
+    def abs_path(file_path: str) -> str:
+        return str(Path(file_path).expanduser().resolve())
+    
+    # Configuration
+    
+    def scanner(self) -> FileScanner:
+        """Parsed configuration, re-read only when config.yml changes."""
+        try:
+            mtime = os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self.lock:
+            if self._scanner is None or mtime != self._config_mtime:
+                self._use_scanner(FileScanner(self.config_file), mtime)
+            return self._scanner
+    
+    def set_scanner(self, scanner: FileScanner):
+        """Share a configuration the caller has just parsed."""
+        try:
+            mtime = os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            mtime = None
+        with self.lock:
+            self._use_scanner(scanner, mtime)
+    
+    def _use_scanner(self, scanner: FileScanner, mtime: Optional[int]):
+        """Switch to a parsed config and rebuild the watch list index (lock held)."""
+        watched = [(str(path), self.abs_path(str(path))) for path in scanner.watched_files]
+        self._scanner = scanner
+        self._config_mtime = mtime
+        self._watched = watched
+        self._resolved = dict(watched)
+        self._abs_paths = {abs_path for _, abs_path in watched}
+        self._safe_names = {abs_path: self.storage._safe_name(abs_path) for _, abs_path in watched}
+        self.config_loads += 1
+    
+    def watched_files(self) -> List[Tuple[str, str]]:
+        """``(configured path, absolute path)`` of every watched file.
+        
+        Paths are resolved once per config version; unlike
+        ``FileScanner.get_watched_files`` nothing is read or hashed.
+        """
+        self.scanner()
+        return self._watched
+    
+    def resolve(self, file_path: str) -> str:
+        """Absolute path of a file, from the index if it is a configured path."""
+        self.scanner()
+        return self._lookup(file_path)
+    
+    def _lookup(self, file_path: str) -> str:
+        """Like ``resolve``, without checking the config for changes."""
+        if file_path in self._abs_paths:
+            return file_path
+        return self._resolved.get(file_path) or self.abs_path(file_path)
+    
+    def config_version(self) -> Optional[int]:
+        """Modification time of the loaded config, for cache validators."""
+        self.scanner()
+        return self._config_mtime
+    
+    def safe_name(self, abs_path: str) -> str:
+        """Repository file name of a file (see ``GitStorage._safe_name``)."""
+        return self._safe_names.get(abs_path) or self.storage._safe_name(abs_path)
+    
+    # Repository access
+    
+    def _head_sha(self) -> Optional[str]:
+        try:
+            return self.storage.repo.head.commit.hexsha
+        except ValueError:  # no commits yet
+            return None
+    
+    def _ref_file(self, git_dir: str, head_signature: Optional[tuple]) -> Optional[str]:
+        """File of the branch HEAD points to, re-read only when HEAD changes."""
+        if self._head_ref is not None and self._head_ref[0] == head_signature:
+            return self._head_ref[1]
+        try:
+            with open(os.path.join(git_dir, 'HEAD'), 'r') as f:
+                head = f.read().strip()
+        except OSError:
+            return None
+        ref_file = os.path.join(git_dir, head[5:].strip()) if head.startswith('ref:') else None
+        self._head_ref = (head_signature, ref_file)
+        return ref_file
+    
+    def _head_stat(self) -> Optional[tuple]:
+        """Stat signatures of the files that move when HEAD moves."""
+        git_dir = self.storage.repo.git_dir
+        head_signature = stat_signature(os.path.join(git_dir, 'HEAD'))
+        if head_signature is None:
+            return None
+        ref_file = self._ref_file(git_dir, head_signature)
+        return (
+            head_signature,
+            stat_signature(ref_file) if ref_file else None,
+            stat_signature(os.path.join(git_dir, 'packed-refs')),
+        )
+    
+    def head(self) -> Optional[str]:
+        """The current HEAD commit, or None before the first snapshot."""
+        with self.lock:
+            self._check_head()
+            return self._head
+    
+    def _check_head(self):
+        """Drop cached histories if HEAD moved without an ``invalidate`` call."""
+        signature = self._head_stat()
+        if signature is not None and signature == self._head_signature:
+            return
+        head = self._head_sha()
+        self._head_signature = signature
+        if head != self._head:
+            self._history.clear()
+            self._head = head
+            self.head_changes += 1
+    
+    def get_file_history(self, file_path: str) -> List[Dict]:
+        abs_path = self._lookup(file_path)
+        with self.lock:
+            self._check_head()
+            history = self._history.get(abs_path)
+            if history is not None:
+                self._history.move_to_end(abs_path)
+                self.hits += 1
+                metrics.CACHE_REQUESTS.inc(cache='history', result='hit')
+                return history
+            self.misses += 1
+            metrics.CACHE_REQUESTS.inc(cache='history', result='miss')
+            history = self.storage.get_file_history(abs_path)
+            self._remember(self._history, abs_path, history)
+            return history
+    
+    def get_file_histories(self, file_paths: List[str]) -> Dict[str, List[Dict]]:
+        """Histories of several files, keyed by absolute path.
+        
+        Cached histories are reused; all the others are read in a single
+        ``git log`` walk (see ``GitStorage.get_file_histories``) instead of
+        one walk per file.
+        """
+        abs_paths = list(dict.fromkeys(self._lookup(file_path) for file_path in file_paths))
+        with self.lock:
+            self._check_head()
+            histories = {}
+            missing = []
+            for abs_path in abs_paths:
+                history = self._history.get(abs_path)
+                if history is None:
+                    missing.append(abs_path)
+                else:
+                    self._history.move_to_end(abs_path)
+                    histories[abs_path] = history
+            self.hits += len(histories)
+            self.misses += len(missing)
+            metrics.CACHE_REQUESTS.inc(len(histories), cache='history', result='hit')
+            metrics.CACHE_REQUESTS.inc(len(missing), cache='history', result='miss')
+            if missing:
+                for abs_path, history in self.storage.get_file_histories(missing).items():
+                    self._remember(self._history, abs_path, history)
+                    histories[abs_path] = history
+        return histories
+    
+    def file_summaries(self) -> Dict[str, Dict]:
+        """History summaries of all watched files, keyed by absolute path.
+        
+        Computed from one ``git log`` walk per HEAD (see
+        ``GitStorage.get_file_summaries``). When HEAD moves, only the new
+        commits are walked and merged into the previous summaries, so the
+        cost does not grow with the length of the history.
+        """
+        self.scanner()
+        safe_names = self._safe_names
+        with self.lock:
+            self._check_head()
+            if self._summaries is None or self._summaries_head != self._head:
+                self._update_summaries()
+            summaries = self._summaries
+        return {abs_path: summaries[name] for abs_path, name in safe_names.items() if name in summaries}
+    
+    def _update_summaries(self):
+        """Bring the summaries up to HEAD (lock held)."""
+        since = self._summaries_head if self._summaries is not None and self._head else None
+        new = self.storage.get_file_summaries(since) if since else None
+        if new is None:
+            since = None
+            new = self.storage.get_file_summaries() or {}
+        if since:
+            merged = dict(self._summaries)
+            for name, summary in new.items():
+                previous = merged.get(name)
+                if previous is not None:
+                    summary['count'] += previous['count']
+                    for key in ('last_auto_change', 'last_manual_change'):
+                        summary[key] = summary[key] or previous[key]
+                merged[name] = summary
+            new = merged
+        self._summaries = new
+        self._summaries_head = self._head
+    
+    def _blob_id(self, commit: str, safe_name: str) -> Optional[str]:
+        """Blob of a stored file in a commit, or None if either does not exist (lock held)."""
+        key = (commit, safe_name)
+        blob = self._blobs.get(key)
+        if blob is not None:
+            return blob
+        try:
+            blob = self.storage.repo.commit(commit).tree[safe_name].hexsha
+        except Exception:
+            return None
+        # Only full commit ids name immutable content; refs and prefixes may move
+        if _FULL_SHA.match(commit):
+            self._remember(self._blobs, key, blob)
+        return blob
+    
+    def diff_key(self, file_path: str, version1: str, version2: str, fmt: str = 'unified',
+                 algorithm: Optional[str] = None) -> Optional[tuple]:
+        """Cache key of a diff, or None if either version does not contain the file.
+        
+        Includes the resolved diff algorithm, so changing the configured
+        default does not serve diffs computed with the previous one.
+        """
+        algorithm = diffalgo.resolve(algorithm)
+        safe_name = self.safe_name(self._lookup(file_path))
+        with self.lock:
+            blob1 = self._blob_id(version1, safe_name)
+            blob2 = self._blob_id(version2, safe_name)
+        return ('diff', fmt, algorithm, safe_name, blob1, blob2) if blob1 and blob2 else None
+    
+    def get_file_diff(self, file_path: str, version1: str, version2: str, fmt: str = 'unified',
+                      algorithm: Optional[str] = None) -> str:
+        """Diff between two versions, cached by the blob ids it compares.
+        
+        The file name is part of the key as well, since it appears in the
+        diff headers.
+        """
+        return b''.join(self.iter_file_diff(file_path, version1, version2, fmt, algorithm)).decode('utf-8', 'replace')
+    
+    def iter_file_diff(self, file_path: str, version1: str, version2: str, fmt: str = 'unified',
+                       algorithm: Optional[str] = None) -> Iterator[bytes]:
+        """Diff between two versions in chunks.
+        
+        Served from the response cache, or streamed from ``git diff`` and
+        cached once it is complete (if it fits).
+        """
+        abs_path = self._lookup(file_path)
+        key = self.diff_key(abs_path, version1, version2, fmt, algorithm)
+        if key is not None:
+            body = self.responses.get(key)
+            if body is not None:
+                self.hits += 1
+                return iter((body,))
+        self.misses += 1
+        with self.lock:
+            chunks = self.storage.iter_file_diff(abs_path, version1, version2, algorithm)
+        return self.responses.tee(key, chunks) if key is not None else chunks
+    
+    def iter_file_history(self, file_path: str, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """A range of a file's history, read from ``git log`` as it is consumed."""
+        abs_path = self._lookup(file_path)
+        with self.lock:
+            return self.storage.iter_file_history(abs_path, offset, limit)
+    
+    def content_key(self, file_path: str, commit: str) -> Optional[tuple]:
+        """Cache key of a stored version, or None if ``commit`` does not contain the file."""
+        safe_name = self.safe_name(self._lookup(file_path))
+        with self.lock:
+            blob = self._blob_id(commit, safe_name)
+        return ('content', blob) if blob else None
+    
+    def iter_file_content(self, commit: str, file_path: str) -> Iterator[bytes]:
+        """Content of a file as stored in ``commit``, in chunks."""
+        with self.lock:
+            return self.storage.iter_file_content(commit, self._lookup(file_path))
+    
+    def show_file(self, commit: str, file_path: str) -> str:
+        """Content of a file as stored in ``commit``."""
+        with self.lock:
+            return self.storage.repo.git.show(f"{commit}:{self.storage._safe_name(self._lookup(file_path))}")
+    
+    def save_file(self, file_path: str, content: str, comment: str = '', force: bool = False) -> bool:
+        abs_path = self._lookup(file_path)
+        with self.lock:
+            saved = self.storage.save_file(abs_path, content, comment=comment, force=force)
+            if saved:
+                self.invalidate(abs_path)
+            return saved
+    
+    # Search
+    
+    def search(self, query: str, file_path: Optional[str] = None, offset: int = 0,
+               limit: Optional[int] = 20) -> Dict:
+        """Find ``query`` in all snapshots (see ``SearchIndex.search``).
+        
+        The index first catches up with commits made since the last search.
+        Results get the absolute ``file`` path of watched files (None for
+        files no longer in the config).
+        """
+        self.search_index.update()
+        name = self.safe_name(self._lookup(file_path)) if file_path else None
+        found = self.search_index.search(query, name, offset, limit)
+        self.scanner()
+        paths = {safe_name: abs_path for abs_path, safe_name in self._safe_names.items()}
+        for result in found['results']:
+            result['file'] = paths.get(result['name'])
+        return found
+    
+    # Caches
+    
+    def _remember(self, cache: OrderedDict, key, value):
+        if self.cache_size <= 0:
+            return
+        cache[key] = value
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+    
+    def invalidate(self, abs_path: str):
+        """Forget cached data that a new snapshot of ``abs_path`` makes stale."""
+        with self.lock:
+            if self._history.pop(abs_path, None) is not None:
+                self.invalidations += 1
+            self._head = self._head_sha()
+            self._head_signature = self._head_stat()
+    
+    def stats(self) -> dict:
+        return {
+            'cached_histories': len(self._history),
+            'cached_responses': self.responses.stats()['entries'],
+            'summarised_files': len(self._summaries or ()),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'invalidations': self.invalidations,
+            'config_loads': self.config_loads,
+            'head_changes': self.head_changes,
+        }
\ No newline at end of file
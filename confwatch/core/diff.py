@@ -3,7 +3,13 @@ Diff viewer module for comparing file versions.
 """
 
 import difflib
-from typing import List, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import diffalgo
+
+# Replaced lines longer than this get no intra-line highlighting, which
+# keeps its cost (quadratic in the line length) bounded
+MAX_INLINE_LENGTH = 500
 
 
 class DiffViewer:
@@ -11,47 +17,82 @@ class DiffViewer:
     
     @staticmethod
     def unified_diff(file1_content: str, file2_content: str, 
-                    file1_name: str = "file1", file2_name: str = "file2") -> str:
-        """Generate unified diff between two file contents."""
-        diff = difflib.unified_diff(
+                    file1_name: str = "file1", file2_name: str = "file2",
+                    algorithm: Optional[str] = None) -> str:
+        """Generate unified diff between two file contents (see ``diffalgo`` for ``algorithm``)."""
+        diff = diffalgo.unified_diff(
             file1_content.splitlines(keepends=True),
             file2_content.splitlines(keepends=True),
             fromfile=file1_name,
-            tofile=file2_name
+            tofile=file2_name,
+            algorithm=algorithm
         )
         return ''.join(diff)
     
     @staticmethod
-    def side_by_side_diff(file1_content: str, file2_content: str) -> List[Tuple[str, str, str]]:
+    def side_by_side_diff(file1_content: str, file2_content: str,
+                          algorithm: Optional[str] = None) -> List[Tuple[str, str, str]]:
         """Generate side-by-side diff."""
-        matcher = difflib.SequenceMatcher(None, file1_content.splitlines(), file2_content.splitlines())
+        return [(row['left'] or '', row['right'] or '', row['tag'])
+                for row in DiffViewer.iter_side_by_side(file1_content, file2_content, inline=False,
+                                                        algorithm=algorithm)]
+    
+    @staticmethod
+    def iter_side_by_side(file1_content: str, file2_content: str, context: Optional[int] = None,
+                          inline: bool = True, algorithm: Optional[str] = None) -> Iterator[Dict]:
+        """Side-by-side diff rows, produced as they are consumed.
+        
+        Both contents are split into lines once; the cost is linear in the
+        number of rows on top of the line matching itself. Each row has a
+        ``tag`` (equal, replace, delete, insert), the ``left`` and ``right``
+        text and their 1-based line numbers (None on the side without a
+        line).
+        
+        Args:
+            context: Keep only this many unchanged lines around each change;
+                longer unchanged runs become one ``skip`` row with a ``count``
+            inline: Add ``left_changes`` and ``right_changes`` to replaced
+                lines, the ``[start, end)`` character ranges that differ
+                (skipped for lines longer than MAX_INLINE_LENGTH)
+            algorithm: Line matching algorithm (``diffalgo.ALGORITHMS``;
+                default: the configured one)
+        """
+        lines1 = file1_content.splitlines()
+        lines2 = file2_content.splitlines()
+        opcodes = diffalgo.get_opcodes(lines1, lines2, algorithm)
+        last = len(opcodes) - 1
         
-        result = []
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        for n, (tag, i1, i2, j1, j2) in enumerate(opcodes):
             if tag == 'equal':
-                # Lines are the same
-                for line in file1_content.splitlines()[i1:i2]:
-                    result.append((line, line, 'equal'))
+                size = i2 - i1
+                if context is not None:
+                    # Fold the middle of long unchanged runs
+                    head = 0 if n == 0 else context
+                    tail = 0 if n == last else context
+                    if head + tail < size:
+                        for k in range(head):
+                            yield _row('equal', lines1, i1 + k, lines2, j1 + k)
+                        yield {'tag': 'skip', 'left_line': i1 + head + 1, 'right_line': j1 + head + 1,
+                               'count': size - head - tail}
+                        for k in range(size - tail, size):
+                            yield _row('equal', lines1, i1 + k, lines2, j1 + k)
+                        continue
+                for k in range(size):
+                    yield _row('equal', lines1, i1 + k, lines2, j1 + k)
             elif tag == 'replace':
-                # Lines are different
-                lines1 = file1_content.splitlines()[i1:i2]
-                lines2 = file2_content.splitlines()[j1:j2]
-                max_len = max(len(lines1), len(lines2))
-                
-                for k in range(max_len):
-                    line1 = lines1[k] if k < len(lines1) else ''
-                    line2 = lines2[k] if k < len(lines2) else ''
-                    result.append((line1, line2, 'replace'))
+                # Pair the lines of both sides, padding the shorter one
+                for k in range(max(i2 - i1, j2 - j1)):
+                    row = _row('replace', lines1, i1 + k if i1 + k < i2 else None,
+                               lines2, j1 + k if j1 + k < j2 else None)
+                    if inline and row['left'] is not None and row['right'] is not None:
+                        _highlight(row)
+                    yield row
             elif tag == 'delete':
-                # Lines deleted from file1
-                for line in file1_content.splitlines()[i1:i2]:
-                    result.append((line, '', 'delete'))
+                for k in range(i1, i2):
+                    yield _row('delete', lines1, k, lines2, None)
             elif tag == 'insert':
-                # Lines inserted in file2
-                for line in file2_content.splitlines()[j1:j2]:
-                    result.append(('', line, 'insert'))
-        
-        return result
+                for k in range(j1, j2):
+                    yield _row('insert', lines1, None, lines2, k)
     
     @staticmethod
     def html_diff(file1_content: str, file2_content: str, 
@@ -63,4 +104,32 @@ class DiffViewer:
             file2_content.splitlines(),
             file1_name,
             file2_name
-        ) 
\ No newline at end of file
+        ) 
+
+
+def _row(tag: str, lines1: List[str], i: Optional[int], lines2: List[str], j: Optional[int]) -> Dict:
+    return {
+        'tag': tag,
+        'left': lines1[i] if i is not None else None,
+        'right': lines2[j] if j is not None else None,
+        'left_line': i + 1 if i is not None else None,
+        'right_line': j + 1 if j is not None else None,
+    }
+
+
+def _highlight(row: Dict):
+    """Add the changed character ranges of a replaced line pair."""
+    left, right = row['left'], row['right']
+    if len(left) > MAX_INLINE_LENGTH or len(right) > MAX_INLINE_LENGTH:
+        return
+    left_changes = []
+    right_changes = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, left, right, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        if i2 > i1:
+            left_changes.append([i1, i2])
+        if j2 > j1:
+            right_changes.append([j1, j2])
+    row['left_changes'] = left_changes
+    row['right_changes'] = right_changes
\ No newline at end of file
@@ -0,0 +1,338 @@
+"""
+Line diff algorithms for the Python-side diffs (side-by-side view, SQLite
+storage).
+
+Lines are interned to integer ids first, so the algorithms compare ints
+instead of strings. Available algorithms:
+
+- ``myers``: minimal edit script, with the linear-space "middle snake"
+  refinement;
+- ``patience``: anchors on lines that occur exactly once on both sides,
+  which keeps repeated lines like ``}`` or blank lines from being matched
+  across unrelated blocks;
+- ``histogram``: like patience, but anchors on the least frequent common
+  line, so it also works when no line is unique (what ``git`` recommends);
+- ``difflib``: ``difflib.SequenceMatcher``, the previous behaviour.
+
+Unlike ``SequenceMatcher``, none of them has "junk" heuristics. All return
+``difflib``-style opcodes. The default is set by the ``diff:`` config
+section (see ``configure``); git diffs use the same setting through
+``git diff --diff-algorithm``.
+"""
+
+import bisect
+import difflib
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence, Tuple
+
+ALGORITHMS = ('histogram', 'patience', 'myers', 'difflib')
+DEFAULT_ALGORITHM = 'histogram'
+
+# histogram: lines occurring more often than this are never used as anchors
+MAX_CHAIN = 64
+
+_default = DEFAULT_ALGORITHM
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def configure(scanner) -> str:
+    """Use the config's ``diff: algorithm:`` setting as the default."""
+    set_default(scanner.get_settings('diff').get('algorithm', DEFAULT_ALGORITHM))
+    return _default
+
+
+def set_default(algorithm: str):
+    global _default
+    _default = resolve(algorithm)
+
+
+def resolve(algorithm: Optional[str] = None) -> str:
+    """Validated algorithm name; None means the configured default."""
+    if algorithm is None:
+        return _default
+    algorithm = str(algorithm).lower()
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown diff algorithm '{algorithm}' (choose from {', '.join(ALGORITHMS)})")
+    return algorithm
+
+
+def git_algorithm(algorithm: Optional[str] = None) -> str:
+    """Name of the algorithm for ``git diff --diff-algorithm`` (git has no difflib)."""
+    algorithm = resolve(algorithm)
+    return 'myers' if algorithm == 'difflib' else algorithm
+
+
+def intern_lines(a: Sequence[Hashable], b: Sequence[Hashable]) -> Tuple[List[int], List[int]]:
+    """Map equal lines of both sequences to the same small integer."""
+    ids: Dict[Hashable, int] = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    return a_ids, b_ids
+
+
+def get_opcodes(a: Sequence[Hashable], b: Sequence[Hashable], algorithm: Optional[str] = None) -> List[Opcode]:
+    """Opcodes turning ``a`` into ``b``, as ``SequenceMatcher.get_opcodes`` returns them."""
+    algorithm = resolve(algorithm)
+    if algorithm == 'difflib':
+        return difflib.SequenceMatcher(None, a, b).get_opcodes()
+    a_ids, b_ids = intern_lines(a, b)
+    split = {'myers': _myers_split, 'patience': _patience_split, 'histogram': _histogram_split}[algorithm]
+    return _opcodes(_matching_blocks(a_ids, b_ids, split), len(a), len(b))
+
+
+def unified_diff(a: Sequence[str], b: Sequence[str], fromfile: str = '', tofile: str = '', n: int = 3,
+                 lineterm: str = '\n', algorithm: Optional[str] = None) -> Iterator[str]:
+    """Like ``difflib.unified_diff``, with a selectable algorithm."""
+    started = False
+    for group in _grouped(get_opcodes(a, b, algorithm), n):
+        if not started:
+            started = True
+            yield f'--- {fromfile}{lineterm}'
+            yield f'+++ {tofile}{lineterm}'
+        first, last = group[0], group[-1]
+        yield f'@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@{lineterm}'
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                for line in a[i1:i2]:
+                    yield ' ' + line
+                continue
+            if tag in ('replace', 'delete'):
+                for line in a[i1:i2]:
+                    yield '-' + line
+            if tag in ('replace', 'insert'):
+                for line in b[j1:j2]:
+                    yield '+' + line
+
+
+def _range(start: int, stop: int) -> str:
+    """Hunk range in unified diff notation (as difflib writes it)."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+def _grouped(opcodes: List[Opcode], n: int) -> Iterator[List[Opcode]]:
+    """Hunks of opcodes with up to ``n`` lines of context (``get_grouped_opcodes``)."""
+    codes = list(opcodes) or [('equal', 0, 1, 0, 1)]
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+
+# Driver
+
+def _matching_blocks(a: List[int], b: List[int], split) -> List[Tuple[int, int, int]]:
+    """``(i, j, size)`` blocks of equal lines, in order.
+    
+    Runs a divide-and-conquer ``split`` without recursion: common prefixes
+    and suffixes are matched directly, and ``split`` divides what is left
+    into smaller regions and matched blocks.
+    """
+    blocks: List[Tuple[int, int, int]] = []
+    stack: List[tuple] = [(0, len(a), 0, len(b))]
+    while stack:
+        item = stack.pop()
+        if len(item) == 3:
+            blocks.append(item)
+            continue
+        a0, a1, b0, b1 = item
+        start = a0
+        while a0 < a1 and b0 < b1 and a[a0] == b[b0]:
+            a0 += 1
+            b0 += 1
+        if a0 > start:
+            blocks.append((start, b0 - (a0 - start), a0 - start))
+        end = a1
+        while a0 < a1 and b0 < b1 and a[a1 - 1] == b[b1 - 1]:
+            a1 -= 1
+            b1 -= 1
+        if end > a1:
+            stack.append((a1, b1, end - a1))
+        if a0 < a1 and b0 < b1:
+            stack.extend(reversed(split(a, b, a0, a1, b0, b1)))
+    return blocks
+
+
+def _opcodes(blocks: List[Tuple[int, int, int]], n: int, m: int) -> List[Opcode]:
+    opcodes: List[Opcode] = []
+    i = j = 0
+    for bi, bj, size in blocks + [(n, m, 0)]:
+        if i < bi and j < bj:
+            opcodes.append(('replace', i, bi, j, bj))
+        elif i < bi:
+            opcodes.append(('delete', i, bi, j, bj))
+        elif j < bj:
+            opcodes.append(('insert', i, bi, j, bj))
+        if size:
+            if opcodes and opcodes[-1][0] == 'equal' and opcodes[-1][2] == bi:
+                _, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(('equal', i1, bi + size, j1, bj + size))
+            else:
+                opcodes.append(('equal', bi, bi + size, bj, bj + size))
+        i, j = bi + size, bj + size
+    return opcodes
+
+
+def _parts(a0: int, a1: int, b0: int, b1: int, anchors) -> List[tuple]:
+    """Regions between ``(i, j, size)`` anchors, interleaved with the anchors."""
+    parts: List[tuple] = []
+    i, j = a0, b0
+    for ai, bj, size in anchors:
+        if i < ai or j < bj:
+            parts.append((i, ai, j, bj))
+        parts.append((ai, bj, size))
+        i, j = ai + size, bj + size
+    if i < a1 or j < b1:
+        parts.append((i, a1, j, b1))
+    return parts
+
+
+# Myers
+
+def _myers_split(a: List[int], b: List[int], a0: int, a1: int, b0: int, b1: int) -> List[tuple]:
+    """Split at the middle snake of the shortest edit script.
+    
+    Both ends differ (the driver matched common prefixes and suffixes), so
+    the script has at least two edits and each side of the snake gets at
+    least one: every split makes progress.
+    """
+    n = a1 - a0
+    m = b1 - b0
+    delta = n - m
+    odd = delta & 1
+    offset = n + m + 1
+    forward = [0] * (2 * offset + 1)
+    backward = [0] * (2 * offset + 1)
+    for d in range((n + m + 1) // 2 + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a0 + x] == b[b0 + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and delta - (d - 1) <= k <= delta + (d - 1) and x + backward[offset + delta - k] >= n:
+                return _snake_parts(a0, a1, b0, b1, x0, y0, x, y)
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and backward[offset + k - 1] < backward[offset + k + 1]):
+                x = backward[offset + k + 1]
+            else:
+                x = backward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a1 - 1 - x] == b[b1 - 1 - y]:
+                x += 1
+                y += 1
+            backward[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return _snake_parts(a0, a1, b0, b1, n - x, m - y, n - x0, m - y0)
+    raise AssertionError("no middle snake")  # unreachable: the paths always meet
+
+
+def _snake_parts(a0: int, a1: int, b0: int, b1: int, x0: int, y0: int, x1: int, y1: int) -> List[tuple]:
+    parts: List[tuple] = [(a0, a0 + x0, b0, b0 + y0)]
+    if x1 > x0:
+        parts.append((a0 + x0, b0 + y0, x1 - x0))
+    parts.append((a0 + x1, a1, b0 + y1, b1))
+    return parts
+
+
+# Patience
+
+def _patience_split(a: List[int], b: List[int], a0: int, a1: int, b0: int, b1: int) -> List[tuple]:
+    """Anchor on the longest increasing run of lines unique to both sides."""
+    counts: Dict[int, list] = {}
+    for i in range(a0, a1):
+        entry = counts.get(a[i])
+        if entry is None:
+            counts[a[i]] = [1, i, 0, 0]
+        else:
+            entry[0] += 1
+    for j in range(b0, b1):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[2] += 1
+            entry[3] = j
+    unique = sorted((i, j) for count_a, i, count_b, j in counts.values() if count_a == 1 and count_b == 1)
+    if not unique:
+        return _myers_split(a, b, a0, a1, b0, b1)
+    return _parts(a0, a1, b0, b1, [(i, j, 1) for i, j in _longest_increasing(unique)])
+
+
+def _longest_increasing(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Longest subsequence of ``pairs`` (sorted by i) that is increasing in j (patience sorting)."""
+    tops: List[int] = []  # j at the top of each pile
+    top_index: List[int] = []
+    previous: List[int] = [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        pile = bisect.bisect_left(tops, j)
+        if pile:
+            previous[index] = top_index[pile - 1]
+        if pile == len(tops):
+            tops.append(j)
+            top_index.append(index)
+        else:
+            tops[pile] = j
+            top_index[pile] = index
+    result = []
+    index = top_index[-1]
+    while index >= 0:
+        result.append(pairs[index])
+        index = previous[index]
+    result.reverse()
+    return result
+
+
+# Histogram
+
+def _histogram_split(a: List[int], b: List[int], a0: int, a1: int, b0: int, b1: int) -> List[tuple]:
+    """Anchor on the common region whose seed line is rarest in ``a``."""
+    occurrences: Dict[int, List[int]] = {}
+    for i in range(a0, a1):
+        occurrences.setdefault(a[i], []).append(i)
+    best = None  # (seed count, i, j, size)
+    j = b0
+    while j < b1:
+        positions = occurrences.get(b[j])
+        next_j = j + 1
+        if positions and len(positions) <= MAX_CHAIN and (best is None or len(positions) <= best[0]):
+            count = len(positions)
+            for i in positions:
+                start_i, start_j = i, j
+                while start_i > a0 and start_j > b0 and a[start_i - 1] == b[start_j - 1]:
+                    start_i -= 1
+                    start_j -= 1
+                end_i, end_j = i + 1, j + 1
+                while end_i < a1 and end_j < b1 and a[end_i] == b[end_j]:
+                    end_i += 1
+                    end_j += 1
+                size = end_i - start_i
+                if best is None or count < best[0] or (count == best[0] and size > best[3]):
+                    best = (count, start_i, start_j, size)
+                next_j = max(next_j, end_j)
+        j = next_j
+    if best is None:
+        return _myers_split(a, b, a0, a1, b0, b1)
+    _, i, j, size = best
+    return _parts(a0, a1, b0, b1, [(i, j, size)])
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Expected writes: files that ConfWatch itself is about to rewrite.
+
+Rollbacks (CLI and web) write a monitored file and commit the snapshot
+themselves. They register the written file here, with its blob id and stat
+signature, so the daemon can recognise the resulting filesystem event as its
+own echo by a single stat() instead of reading, hashing and committing the
+file a second time. Entries expire after a short time.
+"""
+
+import os
+import json
+import time
+import tempfile
+from typing import Dict, Optional, Tuple
+
+from .log import get_logger
+
+log = get_logger('expected_writes')
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+DEFAULT_TTL = 60  # seconds
+
+
+def stat_signature(file_path: str) -> Optional[Tuple[int, int, int, int]]:
+    """Stat signature used to recognise an unchanged file."""
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino)
+
+
+class ExpectedWrites:
+    """Shared, short-lived registry of writes made by ConfWatch."""
+    
+    def __init__(self, confwatch_home: str):
+        self.path = os.path.join(confwatch_home, "expected_writes.json")
+        self.lock_path = self.path + ".lock"
+        self._entries: Dict[str, dict] = {}
+        self._loaded_mtime: Optional[int] = None
+    
+    def _read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+    
+    def _refresh(self):
+        """Re-read the registry only if the file changed since the last read."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            self._entries = {}
+            self._loaded_mtime = None
+            return
+        if mtime != self._loaded_mtime:
+            self._entries = self._read()
+            self._loaded_mtime = mtime
+    
+    def register(self, file_path: str, blob_id: str, signature: Optional[tuple] = None,
+                 ttl: float = DEFAULT_TTL):
+        """Register a write that has just been made to ``file_path``."""
+        file_path = os.path.realpath(file_path)
+        if signature is None:
+            signature = stat_signature(file_path)
+        if signature is None:
+            return
+        
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time.time()
+            entries = {path: entry for path, entry in self._read().items()
+                       if entry.get('expires', 0) > now}
+            entries[file_path] = {
+                'blob': blob_id,
+                'stat': list(signature),
+                'expires': now + ttl,
+            }
+            fd, tmp_path = tempfile.mkstemp(prefix='.expected_writes.', dir=os.path.dirname(self.path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+    
+    def write_file(self, file_path: str, content: str, ttl: float = DEFAULT_TTL) -> str:
+        """Write ``content`` to a file and register the write. Returns the blob id."""
+        from .storage import GitStorage
+        
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        blob_id = GitStorage.blob_id(content)
+        try:
+            self.register(file_path, blob_id, ttl=ttl)
+        except OSError as e:
+            # The daemon will simply snapshot the file once more
+            log.warning(f"Could not register write to {file_path}: {e}")
+        return blob_id
+    
+    def match(self, file_path: str, signature: Optional[tuple]) -> Optional[str]:
+        """Return the registered blob id if the file is exactly as ConfWatch left it."""
+        if signature is None:
+            return None
+        self._refresh()
+        entry = self._entries.get(file_path)
+        if not entry or entry.get('expires', 0) <= time.time():
+            return None
+        if tuple(entry.get('stat') or ()) != tuple(signature):
+            return None
+        return entry.get('blob')
\ No newline at end of file
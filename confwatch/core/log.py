@@ -0,0 +1,242 @@
+"""
+Logging for ConfWatch and its daemons.
+
+``setup_logging`` sends every record through a bounded in-memory queue to a
+listener thread, which does the file I/O (and rotation), so a slow disk
+never stalls the watcher's event loop or a web request. When the queue is
+full, new records are dropped and counted instead of waiting.
+
+Settings come from the optional ``logging:`` section of ``config.yml``::
+
+    logging:
+      level: info          # debug adds a line per filesystem event and request
+      format: text         # or json: one object per line
+      max_bytes: 10485760  # rotate at this size (0: never)
+      backups: 5           # rotated files to keep
+      rotate_when:         # midnight, h, ...: rotate by time instead of size
+      queue_size: 10000    # records buffered before new ones are dropped
+
+Until ``setup_logging`` is called (CLI commands), ConfWatch loggers print
+``[COMPONENT] message`` lines to stdout at INFO level.
+"""
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from typing import Optional
+
+ROOT_LOGGER = 'confwatch'
+
+_listener: Optional["_Listener"] = None
+_queue_handler: Optional["DroppingQueueHandler"] = None
+_log_file: Optional[str] = None
+_settings: dict = {}
+
+
+def get_logger(component: str) -> logging.Logger:
+    """Logger for a component; it appears as ``[COMPONENT]`` in text logs."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
+
+
+def _component(record: logging.LogRecord) -> str:
+    name = record.name
+    if name.startswith(ROOT_LOGGER + '.'):
+        name = name[len(ROOT_LOGGER) + 1:]
+    return name.upper()
+
+
+class TextFormatter(logging.Formatter):
+    """``2025-07-10 12:00:00 INFO [WATCHER] message``, or just ``[WATCHER] message``."""
+    
+    def __init__(self, timestamps: bool = True):
+        super().__init__()
+        self.timestamps = timestamps
+    
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"[{_component(record)}] {record.getMessage()}"
+        if self.timestamps:
+            line = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<7} {line}"
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+# Attributes every LogRecord has; anything else was passed with ``extra=``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; ``extra=`` fields become keys."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname.lower(),
+            'component': _component(record).lower(),
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue records without ever blocking; count the ones that do not fit."""
+    
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, but leave exc_info to the listener's
+        # formatter instead of baking the traceback into the message
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+    """Queue listener whose stop waits for room instead of failing on a full queue."""
+    
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class _StreamToLogger:
+    """File-like object turning ``print()`` output into log records."""
+    
+    encoding = 'utf-8'
+    
+    def __init__(self, logger: logging.Logger, level: int):
+        self.logger = logger
+        self.level = level
+        self._buffer = ''
+    
+    def write(self, text: str) -> int:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                self.logger.log(self.level, line.rstrip())
+        return len(text)
+    
+    def flush(self):
+        pass
+    
+    def isatty(self) -> bool:
+        return False
+
+
+def _level(name) -> int:
+    level = logging.getLevelName(str(name).upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def setup_logging(log_file: Optional[str] = None, settings: Optional[dict] = None,
+                  capture_output: bool = False):
+    """Route all logging through the queue to ``log_file`` (stdout if None).
+    
+    ``settings`` is the ``logging:`` config section. ``capture_output`` also
+    turns ``print()`` output into log records, for background daemons whose
+    stdout and stderr point at the log file.
+    """
+    global _log_file, _settings
+    shutdown_logging()
+    settings = settings or {}
+    _log_file, _settings = log_file, settings
+    level = _level(settings.get('level', 'info'))
+    
+    if log_file:
+        backups = int(settings.get('backups', 5))
+        if settings.get('rotate_when'):
+            target = logging.handlers.TimedRotatingFileHandler(
+                log_file, when=str(settings['rotate_when']), backupCount=backups, encoding='utf-8', delay=True
+            )
+        else:
+            target = logging.handlers.RotatingFileHandler(
+                log_file, maxBytes=int(settings.get('max_bytes', 10 * 1024 * 1024)), backupCount=backups,
+                encoding='utf-8', delay=True
+            )
+    else:
+        target = logging.StreamHandler(sys.stdout)
+    _start_listener(target)
+    root = logging.getLogger()
+    # Libraries (GitPython, asyncio) log every subprocess and selector at DEBUG
+    root.setLevel(max(level, logging.INFO))
+    confwatch = logging.getLogger(ROOT_LOGGER)
+    confwatch.handlers = []
+    confwatch.setLevel(level)
+    confwatch.propagate = True
+    # Werkzeug logs every request at INFO: per-event chatter, so debug only
+    logging.getLogger('werkzeug').setLevel(logging.DEBUG if level <= logging.DEBUG else logging.WARNING)
+    
+    if capture_output:
+        sys.stdout = _StreamToLogger(get_logger('stdout'), logging.INFO)
+        sys.stderr = _StreamToLogger(get_logger('stderr'), logging.ERROR)
+
+
+def _start_listener(target: logging.Handler):
+    """Send the root logger's records through a new queue to ``target``."""
+    global _listener, _queue_handler
+    target.setFormatter(JsonFormatter() if _settings.get('format') == 'json' else TextFormatter())
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=int(_settings.get('queue_size', 10000))))
+    logging.getLogger().handlers = [_queue_handler]
+    _listener = _Listener(_queue_handler.queue, target)
+    _listener.start()
+
+
+def after_fork():
+    """Restart logging in a forked worker process.
+    
+    The listener thread does not survive ``fork()``. A worker appends to the
+    same log file through a handler that reopens it once the parent process
+    has rotated it; only the parent rotates.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener = None
+    if _log_file:
+        target = logging.handlers.WatchedFileHandler(_log_file, encoding='utf-8', delay=True)
+    else:
+        target = logging.StreamHandler(sys.stdout)
+    _start_listener(target)
+
+
+def shutdown_logging():
+    """Write out queued records and close the log file."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+
+def dropped_records() -> int:
+    """Records dropped because the log queue was full."""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+atexit.register(shutdown_logging)
+
+# Default until setup_logging: plain ``[COMPONENT] message`` on stdout
+_console = logging.StreamHandler(sys.stdout)
+_console.setFormatter(TextFormatter(timestamps=False))
+logging.getLogger(ROOT_LOGGER).addHandler(_console)
+logging.getLogger(ROOT_LOGGER).setLevel(logging.INFO)
+logging.getLogger(ROOT_LOGGER).propagate = False
\ No newline at end of file
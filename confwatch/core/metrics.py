@@ -0,0 +1,240 @@
+"""
+Prometheus-format metrics for ConfWatch's hot paths.
+
+Metrics are defined once, below, and stay no-ops until ``enable()`` is
+called: an instrumented call then costs one flag check and ``time()``
+returns a shared do-nothing context manager. Enable them with::
+
+    metrics:
+      enabled: true
+
+in ``config.yml``. ``render()`` produces the Prometheus text exposition
+format, served on the web app's ``/metrics`` and the daemon's ``prometheus``
+control command.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+_enabled = False
+_lock = threading.Lock()
+_registry: List["_Metric"] = []
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def enable(enabled: bool = True):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def configure(scanner) -> bool:
+    """Enable metrics if the config's ``metrics:`` section asks for it."""
+    enable(scanner.get_settings('metrics').get('enabled', False))
+    return _enabled
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    """Base class: name, help text, label names and the registry entry."""
+    
+    kind = 'untyped'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+        self._function: Optional[Callable[[], object]] = None
+        _registry.append(self)
+    
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+    
+    def _labels(self, key: tuple, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+    
+    def set_function(self, function: Callable[[], object]):
+        """Read the value(s) from ``function`` at render time.
+        
+        It returns a number, or a dict mapping label-value tuples to numbers.
+        Nothing is tracked on the hot path.
+        """
+        self._function = function
+    
+    def _samples(self) -> Dict[tuple, float]:
+        if self._function is None:
+            with _lock:
+                return dict(self._values)
+        value = self._function()
+        return value if isinstance(value, dict) else {(): value}
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._samples().items()):
+            lines.append(f"{self.name}{self._labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    
+    kind = 'counter'
+    
+    def inc(self, amount: float = 1, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that goes up and down."""
+    
+    kind = 'gauge'
+    
+    def set(self, value: float, **labels):
+        if not _enabled:
+            return
+        with _lock:
+            self._values[self._key(labels)] = value
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_TIMER = _NoopTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'started')
+    
+    def __init__(self, histogram: "Histogram", labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+    
+    def observe(self, value: float, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+    
+    def time(self, **labels):
+        """Context manager observing the elapsed time of its block."""
+        if not _enabled:
+            return _NOOP_TIMER
+        return _Timer(self, labels)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with _lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                labels = self._labels(key, (('le', _format_value(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = self._labels(key, (('le', '+Inf'),))
+            lines.append(f"{self.name}_bucket{labels} {values[-1]}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {values[-1]}")
+        return lines
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _registry:
+        try:
+            lines.extend(metric.render())
+        except Exception as e:
+            lines.append(f"# {metric.name} unavailable: {_escape(str(e))}")
+    return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# ConfWatch metrics
+
+EVENT_TO_COMMIT = Histogram(
+    'confwatch_event_to_commit_seconds',
+    'Time from the first detected change of a file to its snapshot commit',
+    buckets=(0.1, 0.5, 1, 2.5, 5, 7.5, 10, 15, 30, 60, 120, 300, 600, 1800),  # includes debounce and rate limiting
+)
+SNAPSHOT_STAGE = Histogram(
+    'confwatch_snapshot_stage_seconds',
+    'Time spent in each snapshot stage (read, hash, capture, write, index, compare, commit)',
+    ['stage'],
+)
+HISTORY_SECONDS = Histogram('confwatch_history_seconds', 'Time to load the history of a file')
+DIFF_SECONDS = Histogram('confwatch_diff_seconds', 'Time to compute a diff between two versions')
+QUEUE_WAIT = Histogram('confwatch_queue_wait_seconds', 'Time snapshot jobs spend queued')
+QUEUE_DEPTH = Gauge('confwatch_queue_depth', 'Files waiting in snapshot queues')
+QUEUE_IN_FLIGHT = Gauge('confwatch_queue_in_flight', 'Snapshot jobs being read or written')
+JOURNAL_PENDING = Gauge('confwatch_journal_pending_versions', 'Captured file versions waiting to be committed')
+QUEUE_JOBS = Counter('confwatch_queue_jobs_total', 'Snapshot jobs by outcome', ['result'])
+DEBOUNCE_CANCELLED = Counter(
+    'confwatch_debounce_cancelled_total',
+    'Pending snapshots restarted by a further change within the debounce delay',
+)
+HASH_CHECKS = Counter(
+    'confwatch_hash_checks_total',
+    'File checks by outcome: skipped on an unchanged stat, own write, or read and hashed',
+    ['result'],
+)
+CACHE_REQUESTS = Counter('confwatch_cache_requests_total', 'Shared history/diff cache lookups', ['cache', 'result'])
+GIT_COMMANDS = Counter('confwatch_git_commands_total', 'Git subprocesses started', ['command'])
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+Process helpers shared by the daemon managers.
+"""
+
+import os
+import time
+import select
+
+
+def process_exists(pid: int) -> bool:
+    """Check whether a process with this PID exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def wait_for_exit(pid: int, timeout: float) -> bool:
+    """Wait until a (not necessarily child) process exits.
+    
+    Uses a pidfd where available (Linux 5.3+), so the exit is noticed
+    immediately without polling; otherwise polls with a short, growing
+    interval. Returns False if the process is still alive after ``timeout``.
+    """
+    pidfd_open = getattr(os, 'pidfd_open', None)
+    if pidfd_open is not None:
+        try:
+            fd = pidfd_open(pid)
+        except ProcessLookupError:
+            return True
+        except OSError:
+            fd = None
+        if fd is not None:
+            try:
+                poller = select.poll()
+                poller.register(fd, select.POLLIN)
+                return bool(poller.poll(timeout * 1000))
+            finally:
+                os.close(fd)
+    
+    deadline = time.monotonic() + timeout
+    delay = 0.01
+    while process_exists(pid):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.25)
+    return True
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""
+ConfWatch homes ("profiles").
+
+A profile is one ConfWatch home directory with its own config, repository,
+password and state files. The home is ``~/.confwatch`` unless moved with the
+``CONFWATCH_HOME`` environment variable or ``confwatch --home``. One daemon can
+monitor further profiles listed in its config::
+
+    daemon:
+      profiles:
+        - /srv/app1/.confwatch
+        - name: app2
+          home: /srv/app2/confwatch
+"""
+
+import os
+from typing import List
+
+from .log import get_logger
+from .scanner import FileScanner
+
+log = get_logger('profiles')
+
+DEFAULT_PROFILE = 'default'
+
+
+def default_home() -> str:
+    """The ConfWatch home: ``$CONFWATCH_HOME`` or ``~/.confwatch``."""
+    return os.path.abspath(os.path.expanduser(os.environ.get('CONFWATCH_HOME') or '~/.confwatch'))
+
+
+class Profile:
+    """One ConfWatch home and the paths derived from it."""
+    
+    def __init__(self, home: str, name: str = DEFAULT_PROFILE):
+        self.home = os.path.abspath(os.path.expanduser(home))
+        self.name = name
+        self.config_file = os.path.join(self.home, "config", "config.yml")
+        self.repo_dir = os.path.join(self.home, "repo")
+    
+    @staticmethod
+    def name_for(home: str) -> str:
+        """Default name: the owner directory for ``.../<owner>/.confwatch``."""
+        home = os.path.abspath(os.path.expanduser(home))
+        base = os.path.basename(home)
+        if base.startswith('.'):
+            return os.path.basename(os.path.dirname(home)) or base
+        return base
+    
+    def __repr__(self):
+        return f"Profile({self.name!r}, {self.home!r})"
+
+
+def load_profiles(scanner: FileScanner) -> List[Profile]:
+    """Extra profiles listed under ``daemon: profiles:`` in a config.
+    
+    Entries are a home path or ``{name: ..., home: ...}``. The config's own
+    home and repeated homes are skipped; duplicate names and homes without a
+    config file are skipped with a warning.
+    """
+    entries = scanner.get_settings('daemon').get('profiles') or []
+    own_home = os.path.dirname(os.path.dirname(os.path.abspath(scanner.config_path)))
+    profiles: List[Profile] = []
+    seen_homes = {own_home}
+    seen_names = {DEFAULT_PROFILE}
+    
+    for entry in entries:
+        if isinstance(entry, dict):
+            home, name = entry.get('home'), entry.get('name')
+        else:
+            home, name = entry, None
+        if not isinstance(home, str) or not home:
+            log.warning(f"Ignoring invalid profile entry: {entry!r}")
+            continue
+        profile = Profile(home, str(name or Profile.name_for(home)))
+        if profile.home in seen_homes:
+            continue
+        if profile.name in seen_names:
+            log.warning(f"Duplicate profile name '{profile.name}', skipping {profile.home}")
+            continue
+        if not os.path.exists(profile.config_file):
+            log.warning(f"No config for profile '{profile.name}': {profile.config_file}")
+            continue
+        seen_homes.add(profile.home)
+        seen_names.add(profile.name)
+        profiles.append(profile)
+    return profiles
\ No newline at end of file
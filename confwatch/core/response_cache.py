@@ -0,0 +1,213 @@
+"""
+Response cache for the web API.
+
+Cached bodies are keyed by what they were computed from, never by the
+request: diffs by the two blob ids, histories by the HEAD commit. A key
+therefore never goes stale; when refs move, requests simply use new keys
+and the old entries age out of the LRU. That also makes the entries safe to
+keep on disk across restarts.
+
+Configured in the ``web:`` section of ``config.yml``::
+
+    web:
+      cache_size: 32          # MB of response bodies kept in memory (0 disables)
+      cache_persist: false    # also keep them in ~/.confwatch/cache/responses
+      cache_disk_size: 256    # MB on disk
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Iterable, Iterator, List, Optional
+
+from . import metrics
+from .log import get_logger
+
+log = get_logger('response_cache')
+
+MB = 1024 * 1024
+
+
+class ResponseCache:
+    """Byte-bounded LRU cache of response bodies, optionally persisted to disk."""
+    
+    def __init__(self, max_bytes: int = 32 * MB, directory: Optional[str] = None,
+                 disk_max_bytes: int = 256 * MB):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes: Optional[int] = None  # measured on the first write
+        
+        # Counters
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @classmethod
+    def from_settings(cls, settings: dict, confwatch_home: str) -> "ResponseCache":
+        """Create a cache from the ``web:`` config section."""
+        directory = None
+        if settings.get('cache_persist', False):
+            directory = os.path.join(confwatch_home, "cache", "responses")
+        return cls(
+            max_bytes=int(float(settings.get('cache_size', 32)) * MB),
+            directory=directory,
+            disk_max_bytes=int(float(settings.get('cache_disk_size', 256)) * MB),
+        )
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+    
+    def _file(self, key: tuple) -> str:
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode()).hexdigest())
+    
+    def get(self, key: tuple) -> Optional[bytes]:
+        """Cached body for ``key``, from memory or disk."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            body = self._entries.get(key)
+            if body is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                metrics.CACHE_REQUESTS.inc(cache='response', result='hit')
+                return body
+        
+        if self.directory:
+            try:
+                with open(self._file(key), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                body = None
+            if body is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, body)
+                metrics.CACHE_REQUESTS.inc(cache='response', result='disk_hit')
+                return body
+        
+        with self._lock:
+            self.misses += 1
+        metrics.CACHE_REQUESTS.inc(cache='response', result='miss')
+        return None
+    
+    def put(self, key: tuple, body: bytes):
+        """Cache a body; bodies larger than a quarter of the cache are not kept."""
+        if not self.enabled or len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            self._remember(key, body)
+        if self.directory:
+            try:
+                self._write(key, body)
+            except OSError as e:
+                log.warning(f"Failed to persist cached response: {e}")
+    
+    def tee(self, key: tuple, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass ``chunks`` through, caching the body once the stream is complete.
+        
+        A body that outgrows what ``put`` would keep stops being collected, so
+        a stream never holds more than a quarter of the cache.
+        """
+        parts: List[bytes] = []
+        size = 0
+        keep = self.enabled
+        for chunk in chunks:
+            if keep:
+                size += len(chunk)
+                if size > self.max_bytes // 4:
+                    keep = False
+                    parts = []
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if keep:
+            self.put(key, b''.join(parts))
+    
+    def _remember(self, key: tuple, body: bytes):
+        """Insert into the in-memory LRU (lock held)."""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = body
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+    
+    def _write(self, key: tuple, body: bytes):
+        """Write a body to disk atomically; not synced, the cache can be rebuilt."""
+        path = self._file(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp.', dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._disk_usage()
+            else:
+                self._disk_bytes += len(body)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._prune_disk()
+    
+    def _disk_usage(self) -> int:
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    total += entry.stat().st_size
+        return total
+    
+    def _prune_disk(self):
+        """Delete the least recently written files down to 80% of the limit (lock held)."""
+        with os.scandir(self.directory) as entries:
+            files = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.path)
+                           for entry in entries if entry.is_file())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.disk_max_bytes * 0.8:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+    
+    def clear(self):
+        """Drop the in-memory entries (persisted ones stay valid)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'persisted': self.directory is not None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
\ No newline at end of file
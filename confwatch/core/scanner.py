@@ -22,6 +22,12 @@ class FileScanner:
         else:
             self.watched_files = self.config.get('watch', []) if self.config else []
     
+    def get_settings(self, section: str) -> Dict:
+        """Get an optional settings section (only available in dict format)."""
+        if not isinstance(self.config, dict):
+            return {}
+        return self.config.get(section) or {}
+    
     def _load_config(self) -> Dict:
         """Load configuration from YAML file."""
         try:
@@ -0,0 +1,88 @@
+"""
+Minimal sd_notify client for running under systemd with ``Type=notify``.
+
+Messages are datagrams sent to ``$NOTIFY_SOCKET``. Without that variable
+(not started by systemd) every call is a no-op.
+"""
+
+import os
+import socket
+import threading
+from typing import Callable, Optional
+
+
+class SdNotifier:
+    """Sends readiness, status and watchdog notifications to systemd."""
+    
+    def __init__(self):
+        address = os.environ.get('NOTIFY_SOCKET')
+        if address and address.startswith('@'):
+            address = '\0' + address[1:]  # abstract namespace
+        self.address = address or None
+        self._watchdog_thread: Optional[threading.Thread] = None
+        self._watchdog_stop = threading.Event()
+    
+    @property
+    def enabled(self) -> bool:
+        return self.address is not None
+    
+    def notify(self, *assignments: str) -> bool:
+        """Send ``KEY=VALUE`` assignments. Returns False if nothing was sent."""
+        if not self.address:
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC)
+        try:
+            sock.sendto('\n'.join(assignments).encode(), self.address)
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+    
+    def ready(self, status: Optional[str] = None) -> bool:
+        messages = ['READY=1', f'MAINPID={os.getpid()}']
+        if status:
+            messages.append(f'STATUS={status}')
+        return self.notify(*messages)
+    
+    def stopping(self) -> bool:
+        return self.notify('STOPPING=1')
+    
+    def status(self, text: str) -> bool:
+        return self.notify(f'STATUS={text}')
+    
+    def watchdog(self) -> bool:
+        return self.notify('WATCHDOG=1')
+    
+    def watchdog_interval(self) -> Optional[float]:
+        """Seconds between watchdog pings (half of ``WatchdogSec``), or None."""
+        try:
+            usec = int(os.environ.get('WATCHDOG_USEC', ''))
+        except ValueError:
+            return None
+        watchdog_pid = os.environ.get('WATCHDOG_PID')
+        if usec <= 0 or (watchdog_pid and watchdog_pid != str(os.getpid())):
+            return None
+        return usec / 1e6 / 2
+    
+    def start_watchdog(self, healthy: Optional[Callable[[], bool]] = None):
+        """Ping the watchdog from a background thread while ``healthy()`` holds.
+        
+        For processes whose main thread is busy (e.g. serving HTTP). The
+        thread sleeps on an event between pings, so it causes no other wakeups.
+        """
+        interval = self.watchdog_interval()
+        if not self.enabled or interval is None or self._watchdog_thread:
+            return
+        
+        def run():
+            while not self._watchdog_stop.wait(interval):
+                if healthy is None or healthy():
+                    self.watchdog()
+        
+        self._watchdog_thread = threading.Thread(target=run, name="confwatch-sd-watchdog", daemon=True)
+        self._watchdog_thread.start()
+    
+    def stop_watchdog(self):
+        self._watchdog_stop.set()
+        self._watchdog_thread = None
\ No newline at end of file
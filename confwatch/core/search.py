@@ -0,0 +1,290 @@
+"""
+Full-text search over the contents of all snapshots.
+
+The index is an SQLite database (``~/.confwatch/cache/search.db``) with:
+
+- ``contents``: every distinct blob once, in an FTS5 table with the trigram
+  tokenizer, so any substring of three or more characters is an index
+  lookup (case-insensitive);
+- ``commits`` and ``versions``: for every commit, the files it changed and
+  the blob each of them got (NULL when the file was removed).
+
+``update`` indexes only the commits made since the last update (``git log
+--raw`` over the new range), reading each new blob once. A search finds the
+matching blobs, then walks the versions of the files that ever had one to
+turn them into spans: the commit where the text appeared in a file, and the
+commit where it disappeared again (if it did).
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .log import get_logger
+
+log = get_logger('search')
+
+BATCH_COMMITS = 500  # commits indexed per transaction
+MAX_BLOB_SIZE = 4 * 1024 * 1024  # bytes; larger blobs are not searchable
+_NULL_SHA = '0' * 40
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS blobs (id INTEGER PRIMARY KEY, sha TEXT UNIQUE NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS contents USING fts5(content, tokenize='trigram');
+CREATE TABLE IF NOT EXISTS commits (seq INTEGER PRIMARY KEY, sha TEXT UNIQUE NOT NULL, time INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS versions (file TEXT NOT NULL, seq INTEGER NOT NULL, blob INTEGER,
+                                     PRIMARY KEY (file, seq));
+CREATE INDEX IF NOT EXISTS versions_blob ON versions (blob);
+"""
+
+
+class SearchIndex:
+    """Inverted index of snapshot contents, kept up to date incrementally."""
+    
+    def __init__(self, path: str, storage, lock):
+        """
+        Args:
+            path: Database file
+            storage: GitStorage of the repository to index
+            lock: Lock guarding repository access (``AppContext.lock``)
+        """
+        self.path = path
+        self.storage = storage
+        self.repo_lock = lock
+        self._lock = threading.Lock()
+        self._ready = False
+    
+    @classmethod
+    def for_home(cls, confwatch_home: str, storage, lock) -> "SearchIndex":
+        return cls(os.path.join(confwatch_home, "cache", "search.db"), storage, lock)
+    
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+    
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self._ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                try:
+                    conn.executescript(_SCHEMA)
+                except sqlite3.OperationalError as e:
+                    raise RuntimeError(f"Search needs SQLite 3.34+ with FTS5 (have {sqlite3.sqlite_version}): {e}")
+                self._ready = True
+            yield conn
+        finally:
+            conn.close()
+    
+    # Indexing
+    
+    def update(self) -> int:
+        """Index the commits made since the last update. Returns how many were added.
+        
+        Safe to call from several threads and processes: each batch is
+        written only if nobody indexed further in the meantime.
+        """
+        added = 0
+        with self._lock, self._connect() as conn:
+            while True:
+                last = self._indexed_head(conn)
+                with self.repo_lock:
+                    head = self._head()
+                    if head is None or head == last:
+                        return added
+                    if last is not None and not self._is_ancestor(last, head):
+                        log.info("History was rewritten, rebuilding the search index")
+                        with conn:
+                            self._clear(conn)
+                        last = None
+                    commits = self._read_commits(f"{last}..{head}" if last else head)
+                for start in range(0, len(commits), BATCH_COMMITS):
+                    batch = commits[start:start + BATCH_COMMITS]
+                    if not self._index_batch(conn, last, batch):
+                        break  # another writer got ahead; start over from its position
+                    last = batch[-1][0]
+                    added += len(batch)
+                    log.debug(f"Indexed {added} commits")
+    
+    def _indexed_head(self, conn: sqlite3.Connection) -> Optional[str]:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'head'").fetchone()
+        return row[0] if row else None
+    
+    def _head(self) -> Optional[str]:
+        repo = self.storage.repo
+        return repo.head.commit.hexsha if repo.head.is_valid() else None
+    
+    def _index_batch(self, conn: sqlite3.Connection, last: Optional[str], commits) -> bool:
+        """Index ``commits``, which follow ``last``. False if the index has moved past ``last``."""
+        with self.repo_lock:
+            blobs = self._read_blobs(conn, commits)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self._indexed_head(conn) != last:
+                conn.execute("ROLLBACK")
+                return False
+            for sha, content in blobs.items():
+                cursor = conn.execute("INSERT OR IGNORE INTO blobs (sha) VALUES (?)", (sha,))
+                if cursor.rowcount:
+                    conn.execute("INSERT INTO contents (rowid, content) VALUES (?, ?)", (cursor.lastrowid, content))
+            for sha, timestamp, changes in commits:
+                seq = conn.execute("INSERT INTO commits (sha, time) VALUES (?, ?)", (sha, timestamp)).lastrowid
+                conn.executemany(
+                    "INSERT OR REPLACE INTO versions (file, seq, blob) "
+                    "VALUES (?, ?, (SELECT id FROM blobs WHERE sha = ?))",
+                    [(name, seq, blob) for name, blob in changes])
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('head', ?)", (commits[-1][0],))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+    
+    def _is_ancestor(self, commit: str, head: str) -> bool:
+        try:
+            return self.storage.repo.is_ancestor(commit, head)
+        except Exception:
+            return False
+    
+    def _read_commits(self, rev: str) -> List[Tuple[str, int, List[Tuple[str, Optional[str]]]]]:
+        """Commits of ``rev``, oldest first: ``(hash, time, [(file, blob or None)])`` (lock held)."""
+        output = self.storage.repo.git.log(
+            rev, '--reverse', '--raw', '--no-abbrev', '--no-renames', '--format=%x1e%H %ct')
+        commits = []
+        for record in output.split('\x1e')[1:]:
+            lines = record.strip('\n').split('\n')
+            sha, timestamp = lines[0].split()
+            changes = []
+            for line in lines[1:]:
+                if not line.startswith(':'):
+                    continue
+                meta, name = line.split('\t', 1)
+                blob = meta.split()[3]
+                changes.append((name, None if blob == _NULL_SHA else blob))
+            commits.append((sha, int(timestamp), changes))
+        return commits
+    
+    def _read_blobs(self, conn: sqlite3.Connection, commits) -> Dict[str, str]:
+        """Contents of the blobs in ``commits`` that are not indexed yet (lock held)."""
+        wanted = {blob for _, _, changes in commits for _, blob in changes if blob}
+        known = set()
+        for sha in wanted:
+            if conn.execute("SELECT 1 FROM blobs WHERE sha = ?", (sha,)).fetchone():
+                known.add(sha)
+        blobs = {}
+        odb = self.storage.repo.odb  # one ``git cat-file --batch`` process for all reads
+        for sha in wanted - known:
+            info = odb.info(bytes.fromhex(sha))
+            if info.size > MAX_BLOB_SIZE:
+                blobs[sha] = ''
+                continue
+            blobs[sha] = odb.stream(bytes.fromhex(sha)).read().decode('utf-8', 'replace')
+        return blobs
+    
+    def _clear(self, conn: sqlite3.Connection):
+        for table in ('meta', 'blobs', 'contents', 'commits', 'versions'):
+            conn.execute(f"DELETE FROM {table}")
+    
+    def rebuild(self) -> int:
+        """Drop the index and build it again from the whole history."""
+        with self._lock, self._connect() as conn:
+            with conn:
+                self._clear(conn)
+        return self.update()
+    
+    # Queries
+    
+    def search(self, query: str, file: Optional[str] = None, offset: int = 0,
+               limit: Optional[int] = 20) -> Dict:
+        """Where ``query`` occurs in the history.
+        
+        Returns ``{'total': n, 'results': [...]}`` with one result per span
+        of consecutive versions of a file that contain the text, newest
+        first. Each result has the repository file name, the commit that
+        added the text and the one that removed it (None if it is still
+        there), how many versions contained it, and its first line in the
+        last of those versions. ``file`` restricts the search to one
+        repository file name.
+        """
+        if not query:
+            return {'total': 0, 'results': []}
+        if len(query) >= 3:
+            # Trigram index: a quoted phrase is a case-insensitive substring match
+            matching = "SELECT rowid FROM contents WHERE contents MATCH ?"
+            term = '"' + query.replace('"', '""') + '"'
+        else:
+            matching = "SELECT rowid FROM contents WHERE content LIKE ? ESCAPE '\\'"
+            term = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        
+        sql = (f"SELECT v.file, v.seq, c.sha, c.time, v.blob, v.blob IN ({matching}) "
+               f"FROM versions v JOIN commits c ON c.seq = v.seq "
+               f"WHERE v.file IN (SELECT file FROM versions WHERE blob IN ({matching})"
+               f"{' AND file = ?' if file else ''}) "
+               f"ORDER BY v.file, v.seq")
+        params = [term, term] + ([file] if file else [])
+        with self._connect() as conn:
+            spans = self._spans(conn.execute(sql, params))
+            spans.sort(key=lambda span: span['_seq'], reverse=True)
+            page = spans[offset:] if limit is None else spans[offset:offset + limit]
+            for span in page:
+                span.pop('_seq')
+                blob = span.pop('_blob')
+                row = conn.execute("SELECT content FROM contents WHERE rowid = ?", (blob,)).fetchone()
+                span['line'], span['text'] = _first_line(row[0] if row else '', query)
+        for span in spans[:offset] + spans[offset + len(page):]:
+            span.pop('_seq', None)
+            span.pop('_blob', None)
+        return {'total': len(spans), 'results': page}
+    
+    @staticmethod
+    def _spans(rows) -> List[Dict]:
+        """Turn ``(file, seq, commit, time, blob, matches)`` rows, ordered by file and commit, into spans."""
+        spans = []
+        current = None
+        previous_file = None
+        for name, seq, sha, timestamp, blob, matches in rows:
+            if name != previous_file:
+                current = None
+                previous_file = name
+            if matches:
+                if current is None:
+                    current = {'name': name, 'added': _commit(sha, timestamp), 'removed': None, 'versions': 0,
+                               '_seq': seq}
+                    spans.append(current)
+                current['versions'] += 1
+                current['last'] = _commit(sha, timestamp)
+                current['_blob'] = blob
+            elif current is not None:
+                current['removed'] = _commit(sha, timestamp)
+                current = None
+        return spans
+    
+    def stats(self) -> Dict:
+        if not self.exists():
+            return {'commits': 0, 'blobs': 0, 'head': None}
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'head'").fetchone()
+            return {
+                'commits': conn.execute("SELECT COUNT(*) FROM commits").fetchone()[0],
+                'blobs': conn.execute("SELECT COUNT(*) FROM blobs").fetchone()[0],
+                'head': row[0] if row else None,
+            }
+
+
+def _commit(sha: str, timestamp: int) -> Dict:
+    return {'hash': sha, 'date': datetime.fromtimestamp(timestamp).isoformat()}
+
+
+def _first_line(content: str, query: str) -> Tuple[Optional[int], Optional[str]]:
+    """Number and text of the first line containing ``query`` (ignoring case)."""
+    needle = query.casefold()
+    for number, line in enumerate(content.splitlines(), 1):
+        if needle in line.casefold():
+            return number, line
+    return None, None
\ No newline at end of file
@@ -4,12 +4,68 @@ Storage modules for version control of configuration files.
 
 import os
 import shutil
+import time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Union
 from datetime import datetime
 import git
 import hashlib
 
+from . import diffalgo, metrics
+from .log import get_logger
+
+log = get_logger('storage')
+
+
+def _git_command_name(command) -> str:
+    """Subcommand of a git command line (``rev-list`` for ``git -c x=y rev-list ...``)."""
+    if isinstance(command, str):
+        command = command.split()
+    args = iter(command[1:])
+    for arg in args:
+        if arg == '-c':
+            next(args, None)
+        elif not str(arg).startswith('-'):
+            return str(arg)
+    return 'git'
+
+
+class _CountingGit(git.Git):
+    """Git command wrapper that counts the subprocesses it starts."""
+    
+    def execute(self, command, *args, **kwargs):
+        if metrics.is_enabled():
+            metrics.GIT_COMMANDS.inc(command=_git_command_name(command))
+        return super().execute(command, *args, **kwargs)
+
+
+class _Repo(git.Repo):
+    GitCommandWrapperType = _CountingGit
+
+
+def _read_output(process, chunk_size: int = 64 * 1024, histogram: Optional[metrics.Histogram] = None,
+                 started: float = 0.0) -> Iterator[bytes]:
+    """Yield the stdout of a git process as it is produced; kill it if the reader stops early.
+    
+    With ``histogram``, the time from ``started`` (a ``perf_counter`` value)
+    until the stream ends or is closed is observed in it.
+    """
+    popen = process.proc
+    try:
+        while True:
+            chunk = popen.stdout.read1(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if popen.poll() is None:
+            popen.kill()
+        popen.stdout.close()
+        popen.stderr.close()
+        popen.wait()
+        if histogram is not None:
+            histogram.observe(time.perf_counter() - started)
+
 
 class BaseStorage:
     """Base class for storage backends."""
@@ -43,9 +99,9 @@ class GitStorage(BaseStorage):
     def _init_repo(self):
         """Initialize Git repository."""
         try:
-            self.repo = git.Repo(self.storage_path)
+            self.repo = _Repo(self.storage_path)
         except git.InvalidGitRepositoryError:
-            self.repo = git.Repo.init(self.storage_path)
+            self.repo = _Repo.init(self.storage_path)
             # Configure Git user
             self.repo.config_writer().set_value("user", "name", "ConfWatch").release()
             self.repo.config_writer().set_value("user", "email", "confwatch@localhost").release()
@@ -54,38 +110,60 @@ class GitStorage(BaseStorage):
         abs_path = str(Path(file_path).expanduser().resolve())
         h = hashlib.sha256(abs_path.encode()).hexdigest()
         return f"{h}_{Path(file_path).name}"
-
+    
+    @staticmethod
+    def blob_id(content: Union[str, bytes]) -> str:
+        """Compute the Git blob id the content would be stored under."""
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+    
+    def get_head_blob_id(self, file_path: str) -> Optional[str]:
+        """Get the blob id of the file's latest snapshot, or None if it has none."""
+        try:
+            return self.repo.head.commit.tree[self._safe_name(file_path)].hexsha
+        except (KeyError, ValueError):
+            return None
+    
     def save_file(self, file_path: str, content: str, comment: str = '', force: bool = False) -> bool:
         try:
             abs_path = str(Path(file_path).expanduser().resolve())
             safe_name = self._safe_name(abs_path)
             storage_file = self.storage_path / safe_name
-            with open(storage_file, 'w') as f:
-                f.write(content)
-            self.repo.index.add([safe_name])
+            with metrics.SNAPSHOT_STAGE.time(stage='write'):
+                with open(storage_file, 'w') as f:
+                    f.write(content)
+            with metrics.SNAPSHOT_STAGE.time(stage='index'):
+                self.repo.index.add([safe_name])
             try:
-                has_changes = self.repo.index.diff('HEAD') or len(list(self.repo.iter_commits())) == 0
+                with metrics.SNAPSHOT_STAGE.time(stage='compare'):
+                    has_changes = self.repo.index.diff('HEAD') or len(list(self.repo.iter_commits())) == 0
                 if has_changes or force:
                     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                     msg = f"Snapshot: {abs_path} at {timestamp}"
                     if comment:
                         msg += f"\n{comment}"
-                    self.repo.index.commit(msg)
+                    with metrics.SNAPSHOT_STAGE.time(stage='commit'):
+                        self.repo.index.commit(msg)
                     return True
             except git.BadName:
                 timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 msg = f"Snapshot: {abs_path} at {timestamp}"
                 if comment:
                     msg += f"\n{comment}"
-                self.repo.index.commit(msg)
+                with metrics.SNAPSHOT_STAGE.time(stage='commit'):
+                    self.repo.index.commit(msg)
                 return True
             return False
         except Exception as e:
-            print(f"Error saving file to Git: {e}")
+            log.error(f"Error saving file to Git: {e}")
             return False
     
     def get_file_history(self, file_path: str) -> List[Dict]:
         """Get Git history for file."""
+        with metrics.HISTORY_SECONDS.time():
+            return self._get_file_history(file_path)
+    
+    def _get_file_history(self, file_path: str) -> List[Dict]:
         try:
             safe_name = self._safe_name(file_path)
             
@@ -106,11 +184,161 @@ class GitStorage(BaseStorage):
             
             return history
         except Exception as e:
-            print(f"Error getting file history: {e}")
+            log.error(f"Error getting file history: {e}")
             return []
     
-    def get_file_diff(self, file_path: str, version1: str, version2: str) -> str:
-        """Get Git diff between versions."""
+    def iter_file_history(self, file_path: str, offset: int = 0, limit: Optional[int] = None) -> Iterator[Dict]:
+        """Like ``get_file_history``, but parsed from ``git log`` while it runs.
+        
+        ``offset`` and ``limit`` select a range of the history, newest first.
+        The process is started right away; records are read as they are
+        consumed, so memory use does not depend on the length of the history.
+        """
+        started = time.perf_counter()
+        safe_name = self._safe_name(file_path)
+        if not (self.storage_path / safe_name).exists() or not self.repo.head.is_valid():
+            return iter(())
+        args = ['--format=%H%x1f%ct%x1f%an%x1f%B%x1e']
+        if offset:
+            args.append(f'--skip={int(offset)}')
+        if limit is not None:
+            args.append(f'--max-count={int(limit)}')
+        process = self.repo.git.log(*args, '--', safe_name, as_process=True)
+        return self._history_records(_read_output(process, histogram=metrics.HISTORY_SECONDS, started=started))
+    
+    @staticmethod
+    def _history_records(chunks: Iterator[bytes]) -> Iterator[Dict]:
+        pending = b''
+        for chunk in chunks:
+            records = (pending + chunk).split(b'\x1e')
+            pending = records.pop()
+            for record in records:
+                commit, timestamp, author, message = record.decode('utf-8', 'replace').lstrip('\n').split('\x1f', 3)
+                yield {
+                    'hash': commit,
+                    'message': message.strip(),
+                    'date': datetime.fromtimestamp(int(timestamp)).isoformat(),
+                    'author': author,
+                }
+    
+    def get_file_histories(self, file_paths: List[str]) -> Dict[str, List[Dict]]:
+        """Histories of several files from one ``git log`` walk, keyed by the given paths.
+        
+        Same records as ``get_file_history``; files without snapshots get an
+        empty list.
+        """
+        names = {self._safe_name(file_path): file_path for file_path in file_paths}
+        histories: Dict[str, List[Dict]] = {file_path: [] for file_path in file_paths}
+        stored = [name for name in names if (self.storage_path / name).exists()]
+        if not stored:
+            return histories
+        try:
+            if not self.repo.head.is_valid():
+                return histories
+            # Records: \x1e hash \x1f commit time \x1f author \x1f message \x1f changed files
+            with metrics.HISTORY_SECONDS.time():
+                output = self.repo.git.log('--name-only', '--format=%x1e%H%x1f%ct%x1f%an%x1f%B%x1f', '--', *stored)
+        except Exception as e:
+            log.error(f"Error getting file histories: {e}")
+            return histories
+        
+        for record in output.split('\x1e')[1:]:
+            try:
+                commit, timestamp, author, message, changed = record.split('\x1f', 4)
+            except ValueError:
+                continue
+            entry = {
+                'hash': commit,
+                'message': message.strip(),
+                'date': datetime.fromtimestamp(int(timestamp)).isoformat(),
+                'author': author,
+            }
+            for name in changed.split('\n'):
+                file_path = names.get(name.strip())
+                if file_path is not None:
+                    histories[file_path].append(entry)
+        return histories
+    
+    def get_file_summaries(self, since: Optional[str] = None) -> Optional[Dict[str, Dict]]:
+        """Summarise the history of every stored file in one ``git log`` walk.
+        
+        Keys are repository file names (see ``_safe_name``). Each summary has
+        the snapshot count, the last commit and change time, whether the last
+        snapshot was automatic, and the times of the last automatic and manual
+        snapshots. With ``since``, only commits after that one are counted.
+        Returns None if the log cannot be read.
+        """
+        try:
+            if not self.repo.head.is_valid():
+                return {}
+            records = self._log(f"{since}..HEAD" if since else 'HEAD')
+        except Exception as e:
+            log.error(f"Error summarising file histories: {e}")
+            return None
+        
+        summaries: Dict[str, Dict] = {}
+        for commit, timestamp, message, names in records:
+            date = datetime.fromtimestamp(timestamp).isoformat()
+            auto = '[AUTO]' in message
+            for name in names:
+                summary = summaries.get(name)
+                if summary is None:  # newest first: the first commit seen is the last one
+                    summary = summaries[name] = {
+                        'count': 0,
+                        'last_commit': commit,
+                        'last_change': date,
+                        'last_auto': auto,
+                        'last_auto_change': None,
+                        'last_manual_change': None,
+                    }
+                summary['count'] += 1
+                key = 'last_auto_change' if auto else 'last_manual_change'
+                if summary[key] is None:
+                    summary[key] = date
+        return summaries
+    
+    def get_commits(self, since: str, until: str = 'HEAD', limit: int = 1000) -> Optional[List[Dict]]:
+        """Commits after ``since`` up to ``until``, oldest first, with the files they changed.
+        
+        Returns None if ``since`` is not an ancestor of ``until`` (unknown, or
+        history was rewritten) or if there are more than ``limit`` commits.
+        """
+        try:
+            if not self.repo.is_ancestor(since, until):
+                return None
+            records = self._log(f"{since}..{until}", f"--max-count={limit + 1}")
+        except Exception:
+            return None
+        if len(records) > limit:
+            return None
+        return [{
+            'hash': commit,
+            'message': message.strip(),
+            'date': datetime.fromtimestamp(timestamp).isoformat(),
+            'auto': '[AUTO]' in message,
+            'files': names,
+        } for commit, timestamp, message, names in reversed(records)]
+    
+    def _log(self, rev: str, *args) -> List[tuple]:
+        """``(hash, commit time, message, changed files)`` of the commits in ``rev``, newest first."""
+        # Records: \x1e hash \x1f commit time \x1f message \x1f changed files
+        output = self.repo.git.log(rev, *args, '--name-only', '--format=%x1e%H%x1f%ct%x1f%B%x1f')
+        records = []
+        for record in output.split('\x1e')[1:]:
+            try:
+                commit, timestamp, message, names = record.split('\x1f', 3)
+            except ValueError:
+                continue
+            records.append((commit, int(timestamp), message,
+                            [name.strip() for name in names.split('\n') if name.strip()]))
+        return records
+    
+    def get_file_diff(self, file_path: str, version1: str, version2: str, algorithm: Optional[str] = None) -> str:
+        """Get Git diff between versions (``algorithm``: see ``diffalgo``)."""
+        with metrics.DIFF_SECONDS.time():
+            return self._get_file_diff(file_path, version1, version2, algorithm)
+    
+    def _get_file_diff(self, file_path: str, version1: str, version2: str, algorithm: Optional[str] = None) -> str:
         try:
             safe_name = self._safe_name(file_path)
             
@@ -123,14 +351,43 @@ class GitStorage(BaseStorage):
                 self.repo.commit(version1)
                 self.repo.commit(version2)
             except Exception as e:
-                print(f"Error: Invalid commit hash: {e}")
+                log.error(f"Invalid commit hash: {e}")
                 return ""
             
-            diff = self.repo.git.diff(version1, version2, '--', safe_name)
+            diff = self.repo.git.diff(f'--diff-algorithm={diffalgo.git_algorithm(algorithm)}',
+                                      version1, version2, '--', safe_name)
             return diff
         except Exception as e:
-            print(f"Error getting diff: {e}")
+            log.error(f"Error getting diff: {e}")
             return ""
+    
+    def iter_file_diff(self, file_path: str, version1: str, version2: str,
+                       algorithm: Optional[str] = None) -> Iterator[bytes]:
+        """Like ``get_file_diff``, but yields the output of ``git diff`` as it is produced.
+        
+        The versions are checked and the process is started right away.
+        """
+        started = time.perf_counter()
+        safe_name = self._safe_name(file_path)
+        if not (self.storage_path / safe_name).exists():
+            return iter(())
+        try:
+            self.repo.commit(version1)
+            self.repo.commit(version2)
+        except Exception as e:
+            log.error(f"Invalid commit hash: {e}")
+            return iter(())
+        process = self.repo.git.diff(f'--diff-algorithm={diffalgo.git_algorithm(algorithm)}',
+                                     version1, version2, '--', safe_name, as_process=True)
+        return _read_output(process, histogram=metrics.DIFF_SECONDS, started=started)
+    
+    def iter_file_content(self, commit: str, file_path: str) -> Iterator[bytes]:
+        """Stored content of a file in ``commit``, in chunks. Raises ValueError if there is none."""
+        try:
+            blob = self.repo.commit(commit).tree[self._safe_name(file_path)]
+        except Exception as e:
+            raise ValueError(f"No version of {file_path} in {commit}: {e}")
+        return _read_output(self.repo.git.cat_file('blob', blob.hexsha, as_process=True))
 
 
 class SQLiteStorage(BaseStorage):
@@ -199,7 +456,7 @@ class SQLiteStorage(BaseStorage):
             return True
             
         except Exception as e:
-            print(f"Error saving file to SQLite: {e}")
+            log.error(f"Error saving file to SQLite: {e}")
             return False
     
     def get_file_history(self, file_path: str) -> List[Dict]:
@@ -230,14 +487,13 @@ class SQLiteStorage(BaseStorage):
             return history
             
         except Exception as e:
-            print(f"Error getting file history: {e}")
+            log.error(f"Error getting file history: {e}")
             return []
     
-    def get_file_diff(self, file_path: str, version1: str, version2: str) -> str:
+    def get_file_diff(self, file_path: str, version1: str, version2: str, algorithm: Optional[str] = None) -> str:
         """Get diff between SQLite versions."""
         try:
             import sqlite3
-            import difflib
             
             file_name = Path(file_path).name
             
@@ -254,15 +510,16 @@ class SQLiteStorage(BaseStorage):
             conn.close()
             
             # Generate diff
-            diff = difflib.unified_diff(
+            diff = diffalgo.unified_diff(
                 content1.splitlines(keepends=True),
                 content2.splitlines(keepends=True),
                 fromfile=f"{file_path} (v{version1})",
-                tofile=f"{file_path} (v{version2})"
+                tofile=f"{file_path} (v{version2})",
+                algorithm=algorithm
             )
             
             return ''.join(diff)
             
         except Exception as e:
-            print(f"Error getting diff: {e}")
+            log.error(f"Error getting diff: {e}")
             return "" 
\ No newline at end of file
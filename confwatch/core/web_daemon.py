@@ -6,13 +6,25 @@ Manages persistent web server with custom configuration.
 import os
 import sys
 import signal
-import time
 import atexit
 import argparse
 from pathlib import Path
 from typing import Optional
 
 from .colors import print_header, print_success, print_error, print_warning, colored
+from .sdnotify import SdNotifier
+from .process import wait_for_exit
+from .log import get_logger, setup_logging
+
+log = get_logger('web_daemon')
+
+DEFAULT_THREADS = 4
+DEFAULT_TIMEOUT = 60
+
+
+def default_workers() -> int:
+    """One worker per core, up to four: requests are short and mostly Git-bound."""
+    return min(4, os.cpu_count() or 1)
 
 
 class WebDaemonManager:
@@ -29,6 +41,7 @@ class WebDaemonManager:
         
         self.running = False
         self.web_process = None
+        self.notifier = SdNotifier()
     
     def is_running(self) -> bool:
         """Check if web daemon is already running."""
@@ -62,18 +75,23 @@ class WebDaemonManager:
         except (ValueError, FileNotFoundError):
             return None
     
-    def save_config(self, host: str = '0.0.0.0', port: int = 8080, debug: bool = False):
+    def save_config(self, host: str = '0.0.0.0', port: int = 8080, debug: bool = False,
+                    workers: Optional[int] = None, threads: int = DEFAULT_THREADS,
+                    timeout: int = DEFAULT_TIMEOUT, max_requests: int = 0):
         """Save web daemon configuration."""
-        config = {
-            'host': host,
-            'port': port,
-            'debug': debug
-        }
+        if workers is None:
+            workers = default_workers()
         
         config_content = f"""# ConfWatch Web Daemon Configuration
 HOST={host}
 PORT={port}
 DEBUG={str(debug).lower()}
+# Worker processes (0: Flask development server), threads per worker,
+# request timeout in seconds, requests before a worker is replaced (0: never)
+WORKERS={workers}
+THREADS={threads}
+TIMEOUT={timeout}
+MAX_REQUESTS={max_requests}
 """
         
         with open(self.config_file_path, 'w') as f:
@@ -86,7 +104,11 @@ DEBUG={str(debug).lower()}
         config = {
             'host': '0.0.0.0',
             'port': 8080,
-            'debug': False
+            'debug': False,
+            'workers': default_workers(),
+            'threads': DEFAULT_THREADS,
+            'timeout': DEFAULT_TIMEOUT,
+            'max_requests': 0,
         }
         
         if os.path.exists(self.config_file_path):
@@ -106,12 +128,15 @@ DEBUG={str(debug).lower()}
                                     config['port'] = int(value)
                                 elif key == 'debug':
                                     config['debug'] = value.lower() in ('true', '1', 'yes')
+                                elif key in ('workers', 'threads', 'timeout', 'max_requests'):
+                                    config[key] = int(value)
             except Exception as e:
                 print(f"Warning: Could not load config: {e}")
         
         return config
     
-    def start(self, background: bool = True, host: str = None, port: int = None, debug: bool = None) -> bool:
+    def start(self, background: bool = True, host: str = None, port: int = None, debug: bool = None,
+              workers: int = None, threads: int = None) -> bool:
         """Start the web daemon."""
         if self.is_running():
             print_header("WEB DAEMON", "cyan")
@@ -126,9 +151,14 @@ DEBUG={str(debug).lower()}
             config['port'] = port
         if debug is not None:
             config['debug'] = debug
+        if workers is not None:
+            config['workers'] = workers
+        if threads is not None:
+            config['threads'] = threads
         
         # Save updated config
-        self.save_config(config['host'], config['port'], config['debug'])
+        self.save_config(config['host'], config['port'], config['debug'], config['workers'],
+                         config['threads'], config['timeout'], config['max_requests'])
         
         if background:
             return self._start_background(config)
@@ -140,6 +170,7 @@ DEBUG={str(debug).lower()}
         print_header("WEB DAEMON", "cyan")
         print("Starting ConfWatch web server in foreground...")
         print(f"Host: {config['host']}, Port: {config['port']}, Debug: {config['debug']}")
+        print(f"Server: {self._describe_server(config)}")
         
         # Write PID file
         with open(self.pid_file, 'w') as f:
@@ -149,21 +180,13 @@ DEBUG={str(debug).lower()}
         atexit.register(self._cleanup)
         signal.signal(signal.SIGTERM, self._signal_handler)
         signal.signal(signal.SIGINT, self._signal_handler)
+        self._setup_logging(background=False)
         
         try:
-            # Start web server
-            from confwatch.web.app import run_web_server
-            self.running = True
-            
             print_success(f"Started successfully (PID: {os.getpid()})")
             print_success(f"Web interface available at: http://{config['host']}:{config['port']}")
             
-            run_web_server(
-                host=config['host'],
-                port=config['port'],
-                debug=config['debug']
-            )
-            
+            self._serve(config)
             return True
             
         except Exception as e:
@@ -176,6 +199,7 @@ DEBUG={str(debug).lower()}
         print_header("WEB DAEMON", "cyan")
         print("Starting ConfWatch web server in background...")
         print(f"Host: {config['host']}, Port: {config['port']}, Debug: {config['debug']}")
+        print(f"Server: {self._describe_server(config)}")
         
         # Fork process
         try:
@@ -208,9 +232,9 @@ DEBUG={str(debug).lower()}
             sys.stderr.flush()
             
             # Redirect to log file
-            with open(self.log_file, 'a') as log:
-                os.dup2(log.fileno(), sys.stdout.fileno())
-                os.dup2(log.fileno(), sys.stderr.fileno())
+            with open(self.log_file, 'a') as log_fd:
+                os.dup2(log_fd.fileno(), sys.stdout.fileno())
+                os.dup2(log_fd.fileno(), sys.stderr.fileno())
             
             # Close stdin
             sys.stdin.close()
@@ -222,27 +246,46 @@ DEBUG={str(debug).lower()}
             # Setup cleanup
             atexit.register(self._cleanup)
             signal.signal(signal.SIGTERM, self._signal_handler)
+            self._setup_logging(background=True)
             
-            # Start web server
-            from confwatch.web.app import run_web_server
-            self.running = True
-            
-            print_success(f"Background daemon started (PID: {os.getpid()})")
-            print_success(f"Web interface available at: http://{config['host']}:{config['port']}")
-            
-            run_web_server(
-                host=config['host'],
-                port=config['port'],
-                debug=config['debug']
-            )
+            log.info(f"Background daemon started (PID: {os.getpid()})")
+            log.info(f"Web interface available at: http://{config['host']}:{config['port']}")
             
+            self._serve(config)
             return True
             
         except Exception as e:
-            print_error(f"Failed to start background daemon: {e}")
+            log.error(f"Failed to start background daemon: {e}")
             self._cleanup()
             sys.exit(1)
     
+    @staticmethod
+    def _describe_server(config: dict) -> str:
+        if config['debug'] or config['workers'] <= 0:
+            return "Flask development server"
+        return f"{config['workers']} workers x {config['threads']} threads, {config['timeout']}s request timeout"
+    
+    def _serve(self, config: dict):
+        """Run the web server until it is stopped (SIGTERM)."""
+        from confwatch.web.app import run_web_server
+        self.running = True
+        self.notifier.start_watchdog()
+        run_web_server(
+            host=config['host'],
+            port=config['port'],
+            debug=config['debug'],
+            workers=config['workers'],
+            threads=config['threads'],
+            timeout=config['timeout'],
+            max_requests=config['max_requests'],
+            notifier=self.notifier
+        )
+        # The prefork server returns on SIGTERM / SIGINT: exit like the signal handler
+        self.running = False
+        self.notifier.stop_watchdog()
+        self._cleanup()
+        sys.exit(0)
+    
     def stop(self) -> bool:
         """Stop the web daemon."""
         if not self.is_running():
@@ -261,12 +304,10 @@ DEBUG={str(debug).lower()}
             print(f"Stopping web daemon (PID: {pid})")
             os.kill(pid, signal.SIGTERM)
             
-            # Wait for process to stop
-            for _ in range(10):  # Wait up to 10 seconds
-                if not self.is_running():
-                    print_success("Stopped successfully")
-                    return True
-                time.sleep(1)
+            # Wait up to 10 seconds; the exit is noticed as soon as it happens
+            if wait_for_exit(pid, 10):
+                print_success("Stopped successfully")
+                return True
             
             # Force kill if still running
             print_warning("Force stopping web daemon")
@@ -282,18 +323,32 @@ DEBUG={str(debug).lower()}
             print_error(f"Failed to stop: {e}")
             return False
     
-    def restart(self, host: str = None, port: int = None, debug: bool = None) -> bool:
+    def restart(self, host: str = None, port: int = None, debug: bool = None,
+                workers: int = None, threads: int = None) -> bool:
         """Restart the web daemon."""
         print_header("WEB DAEMON", "cyan")
         print("Restarting...")
         if self.is_running():
             if not self.stop():
                 return False
-            
-            # Wait a moment
-            time.sleep(2)
         
-        return self.start(background=True, host=host, port=port, debug=debug)
+        return self.start(background=True, host=host, port=port, debug=debug, workers=workers, threads=threads)
+    
+    def reload(self) -> bool:
+        """Replace the worker processes without dropping connections (SIGHUP)."""
+        print_header("WEB DAEMON", "cyan")
+        if not self.is_running():
+            print("Not running")
+            return False
+        
+        config = self.load_config()
+        if config['debug'] or config['workers'] <= 0:
+            print_error("Reload needs worker processes (WORKERS > 0, no debug mode); use restart")
+            return False
+        
+        os.kill(self.get_pid(), signal.SIGHUP)
+        print_success("Workers are being replaced")
+        return True
     
     def status(self) -> dict:
         """Get web daemon status."""
@@ -310,15 +365,26 @@ DEBUG={str(debug).lower()}
             'host': config['host'],
             'port': config['port'],
             'debug': config['debug'],
+            'server': self._describe_server(config),
         }
         
         return status_info
     
+    def _setup_logging(self, background: bool):
+        """Queue-based logging to web_daemon.log (background) or stdout (foreground)."""
+        try:
+            from .scanner import FileScanner
+            settings = FileScanner(self.config_file).get_settings('logging')
+        except Exception:
+            settings = {}
+        setup_logging(self.log_file if background else None, settings, capture_output=background)
+    
     def _signal_handler(self, signum, frame):
         """Handle termination signals."""
-        print_header("WEB DAEMON", "cyan")
-        print(f"Received signal {signum}")
+        log.info(f"Received signal {signum}, stopping")
         self.running = False
+        self.notifier.stopping()
+        self.notifier.stop_watchdog()
         self._cleanup()
         sys.exit(0)
     
@@ -3,10 +3,12 @@ ConfWatch Daemon Module
 Provides file monitoring and automatic snapshot creation.
 """
 
+from .core import WatcherCore
 from .watcher import FileWatcher
 from .daemon import DaemonManager
 
 __all__ = [
+    "WatcherCore",
     "FileWatcher",
     "DaemonManager",
 ] 
\ No newline at end of file
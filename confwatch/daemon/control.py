@@ -0,0 +1,157 @@
+"""
+Unix-domain control socket for the running daemon.
+
+Protocol: newline-delimited JSON over ``~/.confwatch/daemon.sock``. Each
+request is ``{"command": "<name>", "args": {...}}`` and gets exactly one
+response line, ``{"ok": true, "result": ...}`` or
+``{"ok": false, "error": "..."}``. A connection may carry several requests.
+
+The server runs on the watcher core's event loop, so handlers see the live
+watcher state without any locking.
+"""
+
+import os
+import json
+import socket
+import asyncio
+import inspect
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from ..core.log import get_logger
+
+log = get_logger('control')
+
+MAX_REQUEST_SIZE = 64 * 1024
+
+Handler = Callable[[dict], Union[Any, Awaitable[Any]]]
+
+
+class ControlError(Exception):
+    """Raised when the daemon cannot be reached or rejects a request."""
+
+
+class ControlServer:
+    """Serves control requests on a Unix socket (loop thread only)."""
+    
+    def __init__(self, socket_path: str, handlers: Dict[str, Handler]):
+        self.socket_path = socket_path
+        self.handlers = dict(handlers)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.requests = 0
+    
+    async def start(self):
+        """Bind the socket, replacing a stale one left by a crashed daemon."""
+        if os.path.exists(self.socket_path):
+            if _is_alive(self.socket_path):
+                raise ControlError(f"Control socket already in use: {self.socket_path}")
+            os.unlink(self.socket_path)
+        
+        old_umask = os.umask(0o177)  # socket is only accessible by its owner
+        try:
+            self._server = await asyncio.start_unix_server(
+                self._handle_client, path=self.socket_path, limit=MAX_REQUEST_SIZE
+            )
+        finally:
+            os.umask(old_umask)
+        log.info(f"Listening on {self.socket_path}")
+    
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.unlink(self.socket_path)
+        except OSError:
+            pass
+    
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await self._send(writer, {'ok': False, 'error': 'Request too large'})
+                    break
+                if not line:
+                    break
+                response = await self._dispatch(line)
+                await self._send(writer, response)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+    
+    async def _dispatch(self, line: bytes) -> dict:
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            command = request['command']
+            args = request.get('args') or {}
+        except (ValueError, KeyError, TypeError):
+            return {'ok': False, 'error': 'Malformed request'}
+        
+        handler = self.handlers.get(command)
+        if handler is None:
+            return {'ok': False, 'error': f"Unknown command: {command}"}
+        try:
+            result = handler(args)
+            if inspect.isawaitable(result):
+                result = await result
+            return {'ok': True, 'result': result}
+        except Exception as e:
+            log.warning(f"Command {command} failed: {e}")
+            return {'ok': False, 'error': str(e)}
+    
+    async def _send(self, writer: asyncio.StreamWriter, response: dict):
+        writer.write(json.dumps(response, default=str).encode() + b'\n')
+        await writer.drain()
+
+
+def _is_alive(socket_path: str) -> bool:
+    """Check whether a daemon is accepting connections on the socket."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(0.5)
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+class ControlClient:
+    """Blocking client for the daemon control socket."""
+    
+    def __init__(self, socket_path: str, timeout: float = 5.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+    
+    def request(self, command: str, timeout: Optional[float] = None, **args) -> Any:
+        """Send one request and return its result. Raises ControlError."""
+        payload = json.dumps({'command': command, 'args': args}).encode() + b'\n'
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(timeout or self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(payload)
+            data = b''
+            while not data.endswith(b'\n'):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        except OSError as e:
+            raise ControlError(f"Daemon control socket unavailable: {e}") from e
+        finally:
+            sock.close()
+        
+        try:
+            response = json.loads(data)
+        except ValueError:
+            raise ControlError("Invalid response from daemon")
+        if not response.get('ok'):
+            raise ControlError(response.get('error', 'Request failed'))
+        return response.get('result')
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+Asyncio event loop core for the file watcher.
+
+A single event loop handles filesystem events (read from an inotify fd),
+debounce timers, polling and any sockets added on top of it. Blocking work
+is pushed to two executors: a small pool for reading/hashing files and a
+single thread for Git writes, which keeps writes serialised.
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional
+
+from ..core.log import get_logger
+from .inotify import Inotify, INOTIFY_AVAILABLE, IN_CONTENT_EVENTS, IN_DELETE_SELF, IN_IGNORED, IN_ONLYDIR, IN_Q_OVERFLOW
+
+log = get_logger('core')
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+    FileSystemEventHandler = object
+
+# Callback signature: callback(file_path, mask). ``mask`` is an inotify mask,
+# or 0 when the backend cannot tell what happened (watchdog). After a queue
+# overflow the callback gets the directory path and ``IN_Q_OVERFLOW``.
+DirCallback = Callable[[str, int], None]
+
+
+class _WatchdogBridge(FileSystemEventHandler):
+    """Forward watchdog events from observer threads into the event loop."""
+    
+    def __init__(self, core: "WatcherCore"):
+        self.core = core
+        super().__init__()
+    
+    # Opened/closed-without-write events are ignored: reading a file to
+    # snapshot it must not look like a change.
+    _CONTENT_EVENT_TYPES = ('modified', 'created', 'moved', 'closed')
+    
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in self._CONTENT_EVENT_TYPES:
+            return
+        for path in (event.src_path, getattr(event, 'dest_path', None)):
+            if path:
+                self.core.call_soon(self.core._dispatch_path, os.path.abspath(path), 0)
+
+
+class _DirWatch:
+    """Subscribers of one watched directory."""
+    
+    __slots__ = ('path', 'wd', 'callbacks')
+    
+    def __init__(self, path: str, wd):
+        self.path = path
+        self.wd = wd  # inotify watch descriptor or watchdog ObservedWatch
+        self.callbacks: List[DirCallback] = []
+
+
+class WatcherCore:
+    """Owns the event loop, the filesystem event source and the executors."""
+    
+    def __init__(self, io_workers: int = 2):
+        self.io_workers = max(1, int(io_workers))
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.io_executor: Optional[ThreadPoolExecutor] = None
+        self.git_executor: Optional[ThreadPoolExecutor] = None
+        
+        self.events_mode: Optional[str] = None  # 'inotify', 'watchdog' or None
+        self._inotify: Optional[Inotify] = None
+        self._observer = None
+        self._bridge = None
+        self._dirs: Dict[str, _DirWatch] = {}
+        self._wds: Dict[int, _DirWatch] = {}
+        
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.is_running = False
+        self.event_count = 0
+    
+    # Lifecycle
+    
+    def start(self):
+        """Start the event loop in a dedicated thread."""
+        if self.is_running:
+            return
+        self.io_executor = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="confwatch-io")
+        self.git_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="confwatch-git")
+        self.loop = asyncio.new_event_loop()
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="confwatch-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self.is_running = True
+    
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._ready.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+    
+    def stop(self, timeout: float = 5.0):
+        """Stop the loop, close the event source and shut the executors down."""
+        if not self.is_running:
+            return
+        try:
+            self.submit(self._shutdown()).result(timeout=timeout)
+        except Exception as e:
+            log.error(f"Error during shutdown: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        self.git_executor.shutdown(wait=True)
+        self.io_executor.shutdown(wait=True)
+        self.is_running = False
+    
+    async def _shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._disable_events()
+    
+    # Scheduling helpers
+    
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+    
+    def call_soon(self, callback: Callable, *args):
+        """Schedule a callback on the loop from any thread."""
+        if self.in_loop_thread():
+            self.loop.call_soon(callback, *args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+    
+    def submit(self, coro) -> Future:
+        """Run a coroutine on the loop from another thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def create_task(self, coro) -> asyncio.Task:
+        """Start a long-running task owned by the core (loop thread only)."""
+        task = self.loop.create_task(coro)
+        self._tasks.append(task)
+        task.add_done_callback(lambda t: self._tasks.remove(t) if t in self._tasks else None)
+        return task
+    
+    def run_in_io(self, func: Callable, *args):
+        """Run blocking file I/O or hashing on the I/O pool."""
+        return self.loop.run_in_executor(self.io_executor, func, *args)
+    
+    def run_in_git(self, func: Callable, *args):
+        """Run a blocking Git operation on the single Git thread."""
+        return self.loop.run_in_executor(self.git_executor, func, *args)
+    
+    # Filesystem events
+    
+    def enable_events(self) -> Optional[str]:
+        """Enable the best available event source. Returns its name or None."""
+        if self.events_mode:
+            return self.events_mode
+        if INOTIFY_AVAILABLE:
+            try:
+                self._inotify = Inotify()
+                self.loop.add_reader(self._inotify.fileno(), self._on_inotify_readable)
+                self.events_mode = 'inotify'
+                return self.events_mode
+            except OSError as e:
+                log.warning(f"inotify unavailable: {e}")
+                self._inotify = None
+        if WATCHDOG_AVAILABLE:
+            self._observer = Observer()
+            self._bridge = _WatchdogBridge(self)
+            self._observer.start()
+            self.events_mode = 'watchdog'
+            return self.events_mode
+        return None
+    
+    def _disable_events(self):
+        if self._inotify:
+            self.loop.remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
+        if self._observer:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+        self._dirs.clear()
+        self._wds.clear()
+        self.events_mode = None
+    
+    def watch_directory(self, path: str, callback: DirCallback) -> bool:
+        """Subscribe to events for files in a directory (loop thread only)."""
+        watch = self._dirs.get(path)
+        if watch is None:
+            wd = None
+            try:
+                if self._inotify:
+                    wd = self._inotify.add_watch(path, IN_CONTENT_EVENTS | IN_DELETE_SELF | IN_ONLYDIR)
+                elif self._observer:
+                    wd = self._observer.schedule(self._bridge, path, recursive=False)
+                else:
+                    return False
+            except OSError as e:
+                log.warning(f"Failed to watch directory {path}: {e}")
+                return False
+            watch = _DirWatch(path, wd)
+            self._dirs[path] = watch
+            if self._inotify:
+                self._wds[wd] = watch
+        if callback not in watch.callbacks:
+            watch.callbacks.append(callback)
+        return True
+    
+    def unwatch_directory(self, path: str, callback: DirCallback):
+        """Drop a directory subscription; the watch goes with the last subscriber."""
+        watch = self._dirs.get(path)
+        if watch is None:
+            return
+        if callback in watch.callbacks:
+            watch.callbacks.remove(callback)
+        if watch.callbacks:
+            return
+        del self._dirs[path]
+        if self._inotify:
+            self._wds.pop(watch.wd, None)
+            self._inotify.rm_watch(watch.wd)
+        elif self._observer:
+            self._observer.unschedule(watch.wd)
+    
+    def watched_directories(self) -> List[str]:
+        return list(self._dirs)
+    
+    def _on_inotify_readable(self):
+        for event in self._inotify.read_events():
+            self.event_count += 1
+            if event.mask & IN_Q_OVERFLOW:
+                # Events were lost: let every subscriber re-check its files
+                for watch in list(self._dirs.values()):
+                    self._dispatch(watch, None, IN_Q_OVERFLOW)
+                continue
+            watch = self._wds.get(event.wd)
+            if watch is None:
+                continue
+            if event.mask & IN_IGNORED:
+                # Directory removed or unmounted; the kernel dropped the watch
+                self._wds.pop(event.wd, None)
+                self._dirs.pop(watch.path, None)
+                continue
+            self._dispatch(watch, event.name, event.mask)
+    
+    def _dispatch_path(self, file_path: str, mask: int):
+        self.event_count += 1
+        watch = self._dirs.get(os.path.dirname(file_path))
+        if watch is not None:
+            self._dispatch(watch, os.path.basename(file_path), mask)
+    
+    def _dispatch(self, watch: _DirWatch, name: Optional[str], mask: int):
+        file_path = os.path.join(watch.path, name) if name else watch.path
+        for callback in list(watch.callbacks):
+            try:
+                callback(file_path, mask)
+            except Exception as e:
+                log.error(f"Event callback failed for {file_path}: {e}")
+    
+    def stats(self) -> dict:
+        """Get core statistics."""
+        return {
+            'events_mode': self.events_mode,
+            'watched_directories': len(self._dirs),
+            'directory_subscriptions': sum(len(watch.callbacks) for watch in self._dirs.values()),
+            'events_received': self.event_count,
+            'threads': threading.active_count(),
+        }
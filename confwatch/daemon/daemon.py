@@ -5,15 +5,27 @@ Daemon manager for ConfWatch file monitoring.
 import os
 import sys
 import signal
-import time
+import select
+import asyncio
 import json
 import atexit
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 
+from .core import WatcherCore
 from .watcher import FileWatcher
+from .supervisor import Supervisor
+from .control import ControlServer, ControlClient, ControlError
+from ..core import diffalgo, metrics
+from ..core.log import get_logger, setup_logging, dropped_records
+from ..core.scanner import FileScanner
+from ..core.profiles import Profile, load_profiles
+from ..core.sdnotify import SdNotifier
+from ..core.process import wait_for_exit
 from ..core.colors import print_header, print_success, print_error, print_warning, colored
 
+log = get_logger('daemon')
+
 
 class DaemonManager:
     """Manages the ConfWatch daemon process."""
@@ -26,8 +38,16 @@ class DaemonManager:
         confwatch_home = os.path.dirname(os.path.dirname(config_file))
         self.pid_file = os.path.join(confwatch_home, "daemon.pid")
         self.log_file = os.path.join(confwatch_home, "daemon.log")
+        self.socket_path = os.path.join(confwatch_home, "daemon.sock")
         
+        # One event loop, inotify fd and executor set shared by every profile
+        self.core: Optional[WatcherCore] = None
         self.watcher: Optional[FileWatcher] = None
+        self.supervisor: Optional[Supervisor] = None
+        self.profiles: Dict[str, FileWatcher] = {}  # extra profiles by name
+        self.use_watchdog = True
+        self.control: Optional[ControlServer] = None
+        self.notifier = SdNotifier()
         self.running = False
     
     def is_running(self) -> bool:
@@ -62,19 +82,23 @@ class DaemonManager:
         except (ValueError, FileNotFoundError):
             return None
     
-    def start(self, background: bool = True, use_watchdog: bool = True) -> bool:
-        """Start the daemon."""
+    def start(self, background: bool = True, use_watchdog: bool = True, web: Optional[dict] = None) -> bool:
+        """Start the daemon.
+        
+        ``web`` (``{'host': ..., 'port': ...}``) also serves the web interface
+        from the daemon process, sharing its repository handle and caches.
+        """
         if self.is_running():
             print_header("DAEMON", "magenta")
             print(f"Already running (PID: {self.get_pid()})")
             return False
         
         if background:
-            return self._start_background(use_watchdog)
+            return self._start_background(use_watchdog, web)
         else:
-            return self._start_foreground(use_watchdog)
+            return self._start_foreground(use_watchdog, web)
     
-    def _start_foreground(self, use_watchdog: bool = True) -> bool:
+    def _start_foreground(self, use_watchdog: bool = True, web: Optional[dict] = None) -> bool:
         """Start daemon in foreground."""
         print_header("DAEMON", "magenta")
         print("Starting ConfWatch daemon in foreground...")
@@ -85,49 +109,42 @@ class DaemonManager:
         
         # Setup cleanup
         atexit.register(self._cleanup)
-        signal.signal(signal.SIGTERM, self._signal_handler)
-        signal.signal(signal.SIGINT, self._signal_handler)
+        self._block_signals()
+        self._setup_logging(background=False)
         
         try:
-            # Start file watcher
-            self.watcher = FileWatcher(self.config_file, self.repo_dir)
-            self.watcher.start(use_watchdog=use_watchdog)
-            self.running = True
-            
-            print_success(f"Started successfully (PID: {os.getpid()})")
-            
-            # Keep daemon running
-            try:
-                while self.running:
-                    time.sleep(1)
-            except KeyboardInterrupt:
-                print_header("\nDAEMON", "magenta")
-                print("Received interrupt signal")
-            
-            return True
-            
+            self._start_watcher(use_watchdog, web)
+            log.info(f"Started successfully (PID: {os.getpid()})")
         except Exception as e:
             print_error(f"Failed to start: {e}")
             self._cleanup()
             return False
+        
+        self._serve()
+        sys.exit(0)
     
-    def _start_background(self, use_watchdog: bool = True) -> bool:
+    def _start_background(self, use_watchdog: bool = True, web: Optional[dict] = None) -> bool:
         """Start daemon in background."""
         print_header("DAEMON", "magenta")
         print("Starting ConfWatch daemon in background...")
         
+        # The daemon reports readiness (its PID) or the startup error through a pipe
+        ready_r, ready_w = os.pipe()
+        
         # Fork process
         try:
             pid = os.fork()
             if pid > 0:
                 # Parent process
-                print_success(f"Started successfully (PID: {pid})")
-                return True
+                os.close(ready_w)
+                os.waitpid(pid, 0)  # intermediate child exits right away
+                return self._wait_ready(ready_r)
         except OSError as e:
             print_error(f"Failed to fork: {e}")
             return False
         
         # Child process continues here
+        os.close(ready_r)
         try:
             # Detach from parent
             os.setsid()
@@ -135,7 +152,7 @@ class DaemonManager:
             # Fork again to prevent zombie
             pid = os.fork()
             if pid > 0:
-                sys.exit(0)
+                os._exit(0)
             
             # Change working directory
             os.chdir("/")
@@ -145,9 +162,9 @@ class DaemonManager:
             sys.stderr.flush()
             
             # Redirect to log file
-            with open(self.log_file, 'a') as log:
-                os.dup2(log.fileno(), sys.stdout.fileno())
-                os.dup2(log.fileno(), sys.stderr.fileno())
+            with open(self.log_file, 'a') as log_fd:
+                os.dup2(log_fd.fileno(), sys.stdout.fileno())
+                os.dup2(log_fd.fileno(), sys.stderr.fileno())
             
             # Close stdin
             sys.stdin.close()
@@ -158,25 +175,203 @@ class DaemonManager:
             
             # Setup cleanup
             atexit.register(self._cleanup)
-            signal.signal(signal.SIGTERM, self._signal_handler)
+            self._block_signals()
+            self._setup_logging(background=True)
             
-            # Start file watcher
-            self.watcher = FileWatcher(self.config_file, self.repo_dir)
-            self.watcher.start(use_watchdog=use_watchdog)
-            self.running = True
+            self._start_watcher(use_watchdog, web)
+            log.info(f"Background daemon started (PID: {os.getpid()})")
+            os.write(ready_w, f"OK {os.getpid()}".encode())
+            os.close(ready_w)
             
-            print_success(f"Background daemon started (PID: {os.getpid()})")
+        except Exception as e:
+            log.error(f"Failed to start background daemon: {e}")
+            try:
+                os.write(ready_w, f"ERROR {e}".encode())
+            except OSError:
+                pass
+            self._cleanup()
+            sys.exit(1)
+        
+        self._serve()
+        sys.exit(0)
+    
+    def _wait_ready(self, ready_fd: int, timeout: float = 30) -> bool:
+        """Wait for the background daemon to report that it has started."""
+        try:
+            readable, _, _ = select.select([ready_fd], [], [], timeout)
+            message = os.read(ready_fd, 4096).decode(errors='replace') if readable else ''
+        finally:
+            os.close(ready_fd)
+        
+        if message.startswith("OK "):
+            print_success(f"Started successfully (PID: {message[3:]})")
+            return True
+        if message.startswith("ERROR "):
+            print_error(f"Failed to start: {message[6:]}")
+        elif readable:
+            print_error(f"Daemon exited during startup, see {self.log_file}")
+        else:
+            print_error(f"Daemon did not report readiness within {timeout:g}s")
+        return False
+    
+    def _setup_logging(self, background: bool):
+        """Queue-based logging to daemon.log (background) or stdout (foreground)."""
+        try:
+            settings = FileScanner(self.config_file).get_settings('logging')
+        except Exception:
+            settings = {}
+        setup_logging(self.log_file if background else None, settings, capture_output=background)
+    
+    def _start_watcher(self, use_watchdog: bool, web: Optional[dict] = None):
+        scanner = FileScanner(self.config_file)
+        settings = scanner.get_settings('daemon')
+        metrics.configure(scanner)
+        try:
+            diffalgo.configure(scanner)
+        except ValueError as e:
+            log.warning(f"{e}; using the {diffalgo.DEFAULT_ALGORITHM} diff algorithm")
+        self.use_watchdog = use_watchdog
+        self.core = WatcherCore(io_workers=int(settings.get('queue_workers', 2)))
+        self.core.start()
+        if web:
+            self.supervisor = Supervisor(self.config_file, self.repo_dir, core=self.core, **web)
+            self.watcher = self.supervisor.watcher
+            self.supervisor.start(use_watchdog=use_watchdog)
+        else:
+            self.watcher = FileWatcher(self.config_file, self.repo_dir, core=self.core)
+            self.watcher.start(use_watchdog=use_watchdog)
+        self._start_control()
+        self._sync_profiles(load_profiles(scanner))
+        self.running = True
+    
+    def _sync_profiles(self, profiles: List[Profile]) -> dict:
+        """Start watchers for new profiles and stop those no longer listed.
+        
+        Blocks on the core's loop, so it must not run on the loop thread.
+        """
+        wanted = {profile.name: profile for profile in profiles}
+        current = dict(self.profiles)
+        added, removed = [], []
+        
+        for name, watcher in list(current.items()):
+            profile = wanted.get(name)
+            if profile is None or profile.config_file != watcher.config_file:
+                if watcher.is_running:
+                    watcher.stop()
+                del current[name]
+                removed.append(name)
+        
+        for name, profile in wanted.items():
+            if name in current:
+                continue
+            try:
+                watcher = FileWatcher(profile.config_file, profile.repo_dir, core=self.core)
+                watcher.start(use_watchdog=self.use_watchdog)
+            except Exception as e:
+                log.warning(f"Profile '{name}' not started: {e}")
+                continue
+            current[name] = watcher
+            added.append(name)
+            log.info(f"Monitoring profile '{name}' ({profile.home})")
+        
+        # Replace rather than mutate: control handlers read it from the loop thread
+        self.profiles = current
+        return {'added': added, 'removed': removed}
+    
+    def _all_watchers(self) -> Dict[str, FileWatcher]:
+        watchers = {'default': self.watcher}
+        watchers.update(self.profiles)
+        return watchers
+    
+    # Signals that end or reload the daemon. They are blocked in every thread
+    # (threads inherit the mask, so this must happen before any is started)
+    # and taken synchronously by _serve() with sigwait().
+    _SIGNALS = {signal.SIGTERM, signal.SIGINT, signal.SIGHUP}
+    
+    def _block_signals(self):
+        signal.pthread_sigmask(signal.SIG_BLOCK, self._SIGNALS)
+    
+    def _serve(self):
+        """Sleep until a signal arrives; SIGHUP reloads, anything else stops.
+        
+        The main thread does not wake up at all while idle, except for
+        systemd watchdog pings when ``WatchdogSec`` is configured.
+        """
+        files = sum(len(watcher.watched) for watcher in self._all_watchers().values())
+        self.notifier.ready(f"Monitoring {files} files in {len(self.profiles) + 1} profile(s)")
+        watchdog_interval = self.notifier.watchdog_interval()
+        
+        while self.running:
+            if watchdog_interval:
+                info = signal.sigtimedwait(self._SIGNALS, watchdog_interval)
+                if info is None:
+                    if self._healthy():
+                        self.notifier.watchdog()
+                    continue
+                signum = info.si_signo
+            else:
+                signum = signal.sigwait(self._SIGNALS)
             
-            # Keep daemon running
-            while self.running:
-                time.sleep(1)
+            if signum == signal.SIGHUP:
+                log.info("Received SIGHUP, reloading configuration")
+                self.notifier.notify("RELOADING=1")
+                try:
+                    self.core.submit(self._reload_async()).result()
+                except Exception as e:
+                    log.error(f"Reload failed: {e}")
+                self.notifier.ready()
+                continue
             
+            log.info(f"Received signal {signum}, stopping")
+            self.running = False
+        
+        self.notifier.stopping()
+        self._cleanup()
+    
+    def _healthy(self) -> bool:
+        """Check that the watcher's event loop still responds."""
+        try:
+            self.core.submit(asyncio.sleep(0)).result(timeout=5)
             return True
-            
+        except Exception:
+            return False
+    
+    def _start_control(self):
+        """Serve the control socket on the watcher's event loop."""
+        handlers = {
+            'ping': lambda args: {'pid': os.getpid()},
+            'status': lambda args: self._live_status(),
+            'metrics': lambda args: dict(self.watcher.metrics(), profiles=len(self.profiles) + 1,
+                                         log_records_dropped=dropped_records()),
+            'prometheus': lambda args: self._prometheus(),
+            'rescan': lambda args: self._each_profile(lambda w: w.rescan_async()),
+            'flush': lambda args: self._each_profile(lambda w: w.flush_async(float(args.get('timeout', 30)))),
+            'reload': lambda args: self._reload_async(),
+        }
+        self.control = ControlServer(self.socket_path, handlers)
+        try:
+            self.core.submit(self.control.start()).result(timeout=5)
         except Exception as e:
-            print_error(f"Failed to start background daemon: {e}")
-            self._cleanup()
-            sys.exit(1)
+            log.warning(f"Control socket unavailable: {e}")
+            self.control = None
+    
+    def _stop_control(self):
+        if self.control is None:
+            return
+        try:
+            self.core.submit(self.control.stop()).result(timeout=5)
+        except Exception as e:
+            log.warning(f"Failed to close control socket: {e}")
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        self.control = None
+    
+    def request(self, command: str, timeout: Optional[float] = None, **args):
+        """Send a command to the running daemon over its control socket.
+        
+        Raises ControlError if the daemon cannot be reached.
+        """
+        return ControlClient(self.socket_path).request(command, timeout=timeout, **args)
     
     def stop(self) -> bool:
         """Stop the daemon."""
@@ -196,12 +391,10 @@ class DaemonManager:
             print(f"Stopping daemon (PID: {pid})")
             os.kill(pid, signal.SIGTERM)
             
-            # Wait for process to stop
-            for _ in range(10):  # Wait up to 10 seconds
-                if not self.is_running():
-                    print_success("Stopped successfully")
-                    return True
-                time.sleep(1)
+            # Wait up to 10 seconds; the exit is noticed as soon as it happens
+            if wait_for_exit(pid, 10):
+                print_success("Stopped successfully")
+                return True
             
             # Force kill if still running
             print_warning("Force stopping daemon")
@@ -217,18 +410,15 @@ class DaemonManager:
             print_error(f"Failed to stop: {e}")
             return False
     
-    def restart(self, use_watchdog: bool = True) -> bool:
+    def restart(self, use_watchdog: bool = True, web: Optional[dict] = None) -> bool:
         """Restart the daemon."""
         print_header("DAEMON", "magenta")
         print("Restarting...")
         if self.is_running():
             if not self.stop():
                 return False
-            
-            # Wait a moment
-            time.sleep(2)
         
-        return self.start(use_watchdog=use_watchdog)
+        return self.start(use_watchdog=use_watchdog, web=web)
     
     def status(self) -> dict:
         """Get daemon status."""
@@ -242,32 +432,97 @@ class DaemonManager:
             'log_file': self.log_file,
         }
         
-        # If running, try to get watcher status
-        if running and self.watcher:
+        # If running, ask the daemon for its live watcher status
+        if running:
             try:
-                watcher_status = self.watcher.status()
-                status_info.update(watcher_status)
+                if self.watcher:
+                    status_info.update(self._live_status())
+                else:
+                    status_info.update(self.request('status'))
             except Exception as e:
                 status_info['watcher_error'] = str(e)
         
         return status_info
     
-    def _signal_handler(self, signum, frame):
-        """Handle termination signals."""
-        print_header("DAEMON", "magenta")
-        print(f"Received signal {signum}")
-        self.running = False
-        
-        if self.watcher:
-            self.watcher.stop()
+    def _live_status(self) -> dict:
+        status = self.supervisor.status() if self.supervisor else self.watcher.status()
+        if self.profiles:
+            status['profiles'] = {
+                name: {
+                    'home': os.path.dirname(os.path.dirname(watcher.config_file)),
+                    'running': watcher.is_running,
+                    'mode': watcher.mode or 'stopped',
+                    'monitored_files': sum(1 for path in watcher.watched if os.path.exists(path)),
+                    'pending_snapshots': len(watcher.pending_snapshots),
+                    'queue_depth': watcher.queue.stats()['depth'],
+                }
+                for name, watcher in self.profiles.items()
+            }
+        return status
+    
+    def _prometheus(self) -> str:
+        if not metrics.is_enabled():
+            raise ControlError("Metrics are disabled (set metrics: enabled: true in config.yml)")
+        return metrics.render()
+    
+    async def _each_profile(self, action) -> dict:
+        """Run ``action(watcher)`` for every profile (loop thread).
         
-        self._cleanup()
-        sys.exit(0)
+        Returns the default profile's result, with the other profiles'
+        results under ``profiles``.
+        """
+        result = await action(self.watcher)
+        if self.profiles:
+            result['profiles'] = {}
+            for name, watcher in self.profiles.items():
+                result['profiles'][name] = await action(watcher)
+        return result
+    
+    async def _reload_async(self) -> dict:
+        """Reload every profile's config, then apply changes to the profile list."""
+        result = await self._each_profile(lambda w: w.reload_async())
+        if result.get('success'):
+            profiles = load_profiles(self.watcher.scanner)
+            changes = await self.core.loop.run_in_executor(None, self._sync_profiles, profiles)
+            result['profiles_added'] = changes['added']
+            result['profiles_removed'] = changes['removed']
+        return result
+    
+    def reload(self) -> bool:
+        """Ask the running daemon to reload its configuration."""
+        pid = self.get_pid() if self.is_running() else None
+        if pid is None:
+            print_header("DAEMON", "magenta")
+            print("Not running")
+            return False
+        try:
+            result = self.request('reload')
+            if not result.get('success'):
+                print_error(f"Reload failed: {result.get('error')}")
+                return False
+            print(f"Added {result['added']}, removed {result['removed']} file(s)")
+            for name in result.get('profiles_added', []):
+                print(f"Started profile: {name}")
+            for name in result.get('profiles_removed', []):
+                print(f"Stopped profile: {name}")
+        except ControlError:
+            # Older daemon without a control socket
+            os.kill(pid, signal.SIGHUP)
+        return True
     
     def _cleanup(self):
         """Cleanup daemon resources."""
-        if self.watcher:
+        self._stop_control()
+        for watcher in self.profiles.values():
+            if watcher.is_running:
+                watcher.stop()
+        self.profiles = {}
+        if self.supervisor:
+            self.supervisor.stop()
+        elif self.watcher and self.watcher.is_running:
             self.watcher.stop()
+        if self.core:
+            self.core.stop()
         
         if os.path.exists(self.pid_file):
             try:
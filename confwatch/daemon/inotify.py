@@ -0,0 +1,106 @@
+"""
+Minimal inotify binding (Linux only) for the asyncio watcher core.
+
+The inotify file descriptor is non-blocking so it can be registered with
+``loop.add_reader`` and drained whenever it becomes readable.
+"""
+
+import os
+import struct
+import ctypes
+import ctypes.util
+from typing import List, NamedTuple
+
+# Event masks (see inotify(7))
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+# Changes that may alter the content of a file inside a watched directory
+IN_CONTENT_EVENTS = IN_CLOSE_WRITE | IN_MODIFY | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MOVED_FROM
+
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    _inotify_init1 = _libc.inotify_init1
+    _inotify_add_watch = _libc.inotify_add_watch
+    _inotify_rm_watch = _libc.inotify_rm_watch
+    _inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    _inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    INOTIFY_AVAILABLE = True
+except (OSError, AttributeError):
+    INOTIFY_AVAILABLE = False
+
+
+class InotifyEvent(NamedTuple):
+    """A single decoded inotify event."""
+    wd: int
+    mask: int
+    cookie: int
+    name: str
+
+
+class Inotify:
+    """Non-blocking inotify instance."""
+    
+    def __init__(self):
+        if not INOTIFY_AVAILABLE:
+            raise OSError("inotify is not available on this platform")
+        fd = _inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.fd = fd
+    
+    def fileno(self) -> int:
+        return self.fd
+    
+    def add_watch(self, path: str, mask: int) -> int:
+        """Add (or update) a watch and return its watch descriptor."""
+        wd = _inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), path)
+        return wd
+    
+    def rm_watch(self, wd: int):
+        """Remove a watch. Errors for already-removed watches are ignored."""
+        _inotify_rm_watch(self.fd, wd)
+    
+    def read_events(self) -> List[InotifyEvent]:
+        """Read all currently queued events without blocking."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                events.append(InotifyEvent(wd, mask, cookie, os.fsdecode(name)))
+        return events
+    
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
@@ -0,0 +1,336 @@
+"""
+Write-ahead capture journal for the file watcher.
+
+The watcher reads a changed file right after the event (once writes settle)
+and appends its content here, long before the debounce delay runs out, so a
+version that is overwritten or deleted within the delay is not lost. The
+snapshot queue later commits the journaled versions of a file, oldest first,
+and marks them done. Versions that were captured but not committed are
+replayed when the daemon starts again.
+
+The journal is one append-only file of checksummed records::
+
+    length (4 bytes) | crc32 (4 bytes) | zlib-compressed payload
+
+A payload is a JSON header line, followed by the file content for capture
+records. Appends are not synced one by one: ``sync``, called on a short
+timer, fsyncs everything appended so far at once. A torn record at the end
+of the file (a crash in the middle of an append) is cut off on ``open``.
+"""
+
+import os
+import json
+import time
+import zlib
+import struct
+import tempfile
+import threading
+import weakref
+from typing import Dict, List, Optional
+
+from ..core import metrics
+from ..core.log import get_logger
+
+log = get_logger('journal')
+
+_RECORD = struct.Struct('>II')  # payload length, crc32 of the payload
+_COMPRESS_LEVEL = 3
+
+# Live journals, summed by the metrics gauge at scrape time
+_journals: "weakref.WeakSet[CaptureJournal]" = weakref.WeakSet()
+
+metrics.JOURNAL_PENDING.set_function(lambda: sum(journal.pending_count() for journal in list(_journals)))
+
+
+class JournalEntry:
+    """A captured version of a file that has not been committed yet."""
+    
+    __slots__ = ('seq', 'path', 'captured_at', 'blob', 'signature', 'offset', 'length')
+    
+    def __init__(self, seq: int, path: str, captured_at: float, blob: str,
+                 signature: Optional[tuple], offset: int, length: int):
+        self.seq = seq
+        self.path = path
+        self.captured_at = captured_at
+        self.blob = blob
+        self.signature = signature
+        self.offset = offset  # of the record in the journal file
+        self.length = length  # of the whole record
+
+
+def _encode(header: dict, content: bytes = b'') -> bytes:
+    payload = zlib.compress(json.dumps(header, separators=(',', ':')).encode() + b'\n' + content, _COMPRESS_LEVEL)
+    return _RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode(record: bytes) -> tuple:
+    """``(header, content)`` of a record; raises ValueError if it is damaged."""
+    length, crc = _RECORD.unpack_from(record)
+    payload = record[_RECORD.size:_RECORD.size + length]
+    if len(payload) != length or zlib.crc32(payload) != crc:
+        raise ValueError("damaged journal record")
+    try:
+        header, _, content = zlib.decompress(payload).partition(b'\n')
+        return json.loads(header), content
+    except (zlib.error, ValueError) as e:
+        raise ValueError(f"damaged journal record: {e}")
+
+
+class CaptureJournal:
+    """Append-only, crash-safe journal of captured file versions.
+    
+    Thread-safe: versions are appended and read on the I/O pool and marked
+    done from the Git thread.
+    """
+    
+    def __init__(self, journal_file: str, max_versions: int = 20, compact_bytes: int = 16 * 1024 * 1024):
+        """
+        Args:
+            journal_file: Path of the journal file
+            max_versions: Uncommitted versions kept per file; older ones are dropped
+            compact_bytes: Size above which the file is compacted once versions are done
+        """
+        self.journal_file = journal_file
+        self.max_versions = max(1, int(max_versions))
+        self.compact_bytes = compact_bytes
+        
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._size = 0
+        self._seq = 0
+        self._unsynced = False
+        self._pending: Dict[str, List[JournalEntry]] = {}
+        self._last_blob: Dict[str, str] = {}
+        
+        # Counters
+        self.captured = 0
+        self.committed = 0
+        self.dropped = 0
+        self.recovered = 0
+        self.syncs = 0
+        self.compactions = 0
+        _journals.add(self)
+    
+    # Opening and replay
+    
+    def open(self) -> int:
+        """Open the journal and load the versions a previous run left behind.
+        
+        Returns the number of recovered versions.
+        """
+        with self._lock:
+            if self._fd is not None:
+                return self.recovered
+            os.makedirs(os.path.dirname(self.journal_file) or '.', exist_ok=True)
+            self._fd = os.open(self.journal_file, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+            self._pending.clear()
+            self._last_blob.clear()
+            valid = self._replay()
+            size = os.fstat(self._fd).st_size
+            if valid < size:
+                log.warning(f"Discarding {size - valid} bytes of incomplete records in {self.journal_file}")
+                os.ftruncate(self._fd, valid)
+                os.fsync(self._fd)
+            self._size = valid
+            self.recovered = sum(len(entries) for entries in self._pending.values())
+            return self.recovered
+    
+    def _replay(self) -> int:
+        """Load pending versions from the file. Returns the length of its valid part."""
+        with open(self.journal_file, 'rb') as f:
+            data = f.read()
+        
+        live: Dict[int, JournalEntry] = {}
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            length = _RECORD.unpack_from(data, offset)[0] + _RECORD.size
+            try:
+                header, _ = _decode(data[offset:offset + length])
+            except ValueError:
+                break
+            if header.get('type') == 'capture':
+                signature = tuple(header['stat']) if header.get('stat') else None
+                live[header['seq']] = JournalEntry(header['seq'], header['path'], header['ts'],
+                                                   header['blob'], signature, offset, length)
+                self._seq = max(self._seq, header['seq'])
+            elif header.get('type') == 'done':
+                for seq in header.get('seqs', ()):
+                    live.pop(seq, None)
+            offset += length
+        
+        for seq in sorted(live):
+            entry = live[seq]
+            self._pending.setdefault(entry.path, []).append(entry)
+            self._last_blob[entry.path] = entry.blob
+        return offset
+    
+    # Writing
+    
+    def _write(self, record: bytes) -> int:
+        """Append a record; returns its offset. Caller holds the lock."""
+        offset = self._size
+        view = memoryview(record)
+        while view:
+            written = os.write(self._fd, view)
+            view = view[written:]
+        self._size += len(record)
+        self._unsynced = True
+        return offset
+    
+    def append(self, path: str, content: str, blob: str, signature: Optional[tuple] = None) -> bool:
+        """Journal a captured version, unless it is the file's last known version.
+        
+        Returns True if a record was written. The record is durable after the
+        next ``sync``.
+        """
+        with self._lock:
+            if self._fd is None or self._last_blob.get(path) == blob:
+                return False
+            self._seq += 1
+            header = {
+                'type': 'capture',
+                'seq': self._seq,
+                'path': path,
+                'ts': time.time(),
+                'blob': blob,
+                'stat': list(signature) if signature else None,
+            }
+            record = _encode(header, content.encode('utf-8'))
+            offset = self._write(record)
+            entries = self._pending.setdefault(path, [])
+            entries.append(JournalEntry(self._seq, path, header['ts'], blob, signature, offset, len(record)))
+            self._last_blob[path] = blob
+            self.captured += 1
+            
+            if len(entries) > self.max_versions:
+                excess = entries[:len(entries) - self.max_versions]
+                del entries[:len(excess)]
+                self._write(_encode({'type': 'done', 'seqs': [entry.seq for entry in excess]}))
+                self.dropped += len(excess)
+            return True
+    
+    def sync(self):
+        """Make everything appended so far durable with a single fsync."""
+        with self._lock:
+            if self._fd is None or not self._unsynced:
+                return
+            self._unsynced = False
+            fd = os.dup(self._fd)  # stays valid if the journal is compacted meanwhile
+        try:
+            os.fsync(fd)
+            self.syncs += 1
+        finally:
+            os.close(fd)
+    
+    def mark_done(self, path: str, seqs, blob: Optional[str] = None):
+        """Mark versions of ``path`` as committed (``seqs`` may be empty), and sync.
+        
+        ``blob`` is the content the file's history now ends with; later
+        captures of the same content are skipped.
+        """
+        seqs = set(seqs)
+        with self._lock:
+            if self._fd is None:
+                return
+            remaining = [entry for entry in self._pending.get(path, ()) if entry.seq not in seqs]
+            if remaining:
+                self._pending[path] = remaining
+            else:
+                self._pending.pop(path, None)
+                if blob:
+                    self._last_blob[path] = blob
+            if not seqs:
+                return
+            self._write(_encode({'type': 'done', 'seqs': sorted(seqs)}))
+            self.committed += len(seqs)
+            if self._size > self.compact_bytes:
+                self._compact()
+        self.sync()
+    
+    def discard(self, path: str):
+        """Forget a file that is no longer monitored."""
+        with self._lock:
+            self._last_blob.pop(path, None)
+            entries = self._pending.pop(path, None)
+            if self._fd is None or not entries:
+                return
+            self._write(_encode({'type': 'done', 'seqs': [entry.seq for entry in entries]}))
+    
+    def _compact(self):
+        """Rewrite the file with only the pending versions. Caller holds the lock."""
+        entries = sorted((entry for entries in self._pending.values() for entry in entries),
+                         key=lambda entry: entry.seq)
+        if sum(entry.length for entry in entries) > self.compact_bytes // 2:
+            return  # mostly live data; compacting would not gain much
+        
+        directory = os.path.dirname(self.journal_file) or '.'
+        fd, tmp_path = tempfile.mkstemp(prefix='.capture.journal.', dir=directory)
+        try:
+            offset = 0
+            with os.fdopen(fd, 'wb') as f:
+                for entry in entries:
+                    f.write(os.pread(self._fd, entry.length, entry.offset))
+                    entry.offset = offset
+                    offset += entry.length
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_file)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        os.close(self._fd)
+        self._fd = os.open(self.journal_file, os.O_RDWR | os.O_APPEND)
+        self._size = offset
+        self._unsynced = False
+        self.compactions += 1
+    
+    # Reading
+    
+    def pending(self, path: str) -> List[JournalEntry]:
+        """Uncommitted versions of a file, oldest first."""
+        with self._lock:
+            return list(self._pending.get(path, ()))
+    
+    def paths(self) -> List[str]:
+        """Files with uncommitted versions."""
+        with self._lock:
+            return list(self._pending)
+    
+    def read(self, entry: JournalEntry) -> str:
+        """Content of a journaled version."""
+        with self._lock:
+            if self._fd is None:
+                raise ValueError("journal is closed")
+            record = os.pread(self._fd, entry.length, entry.offset)
+        return _decode(record)[1].decode('utf-8')
+    
+    def pending_count(self) -> int:
+        return sum(len(entries) for entries in list(self._pending.values()))
+    
+    def close(self):
+        """Sync and close the journal; pending versions are replayed on the next ``open``."""
+        self.sync()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+    
+    def stats(self) -> dict:
+        """Get journal statistics."""
+        with self._lock:
+            return {
+                'file': self.journal_file,
+                'bytes': self._size,
+                'pending_files': len(self._pending),
+                'pending_versions': sum(len(entries) for entries in self._pending.values()),
+                'captured': self.captured,
+                'committed': self.committed,
+                'dropped': self.dropped,
+                'recovered': self.recovered,
+                'syncs': self.syncs,
+                'compactions': self.compactions,
+            }
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""
+Per-file rate limiting and flap damping for automatic snapshots.
+
+Every monitored file gets a token bucket: each debounced change spends a
+token, and tokens refill slowly. A file that runs out of tokens has its
+next snapshot deferred until a token is available. A file that keeps
+changing (``flap_threshold`` changes within ``flap_window`` seconds) is
+damped: it gets at most one summary snapshot every ``summary_interval``
+seconds, which records the latest content. Once the file calms down it
+goes back to normal snapshots.
+"""
+
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from ..core.log import get_logger
+
+log = get_logger('ratelimit')
+
+
+class TokenBucket:
+    """Token bucket refilled by one token every ``refill_seconds``."""
+    
+    __slots__ = ('capacity', 'refill_seconds', 'tokens', 'updated')
+    
+    def __init__(self, capacity: int, refill_seconds: float, now: float):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.tokens = float(capacity)
+        self.updated = now
+    
+    def _refill(self, now: float):
+        if self.refill_seconds > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.refill_seconds)
+        else:
+            self.tokens = float(self.capacity)
+        self.updated = now
+    
+    def take(self, now: float) -> bool:
+        """Spend a token if one is available."""
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+    
+    def next_available(self, now: float) -> float:
+        """Seconds until the next token is available."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.refill_seconds
+
+
+class _FileRate:
+    """Rate limiting state of one file."""
+    
+    __slots__ = ('bucket', 'changes', 'damped', 'damped_since', 'deferred', 'last_snapshot')
+    
+    def __init__(self, bucket: TokenBucket, history: int):
+        self.bucket = bucket
+        self.changes = deque(maxlen=history)  # timestamps of recent changes
+        self.damped = False
+        self.damped_since = 0.0
+        self.deferred = 0  # changes folded into the next summary snapshot
+        self.last_snapshot = 0.0
+
+
+class RateLimiter:
+    """Decides whether a debounced change may be snapshotted right away.
+    
+    Not thread-safe: the watcher uses it on its event loop thread only.
+    """
+    
+    def __init__(self, burst: int = 6, refill_seconds: float = 60, flap_threshold: int = 12,
+                 flap_window: float = 300, summary_interval: float = 600):
+        self.files: Dict[str, _FileRate] = {}
+        self.total_deferred = 0
+        self.summaries = 0
+        self.configure(burst, refill_seconds, flap_threshold, flap_window, summary_interval)
+    
+    def configure(self, burst: int, refill_seconds: float, flap_threshold: int,
+                  flap_window: float, summary_interval: float):
+        """Apply (new) limits. ``burst`` of 0 disables rate limiting."""
+        self.burst = max(0, int(burst))
+        self.refill_seconds = max(0.0, float(refill_seconds))
+        self.flap_threshold = max(2, int(flap_threshold))
+        self.flap_window = max(1.0, float(flap_window))
+        self.summary_interval = max(1.0, float(summary_interval))
+        for state in self.files.values():
+            state.bucket.capacity = self.burst
+            state.bucket.refill_seconds = self.refill_seconds
+            state.changes = deque(state.changes, maxlen=self.flap_threshold)
+    
+    @property
+    def enabled(self) -> bool:
+        return self.burst > 0
+    
+    def _get(self, path: str, now: float) -> _FileRate:
+        state = self.files.get(path)
+        if state is None:
+            state = _FileRate(TokenBucket(self.burst, self.refill_seconds, now), self.flap_threshold)
+            self.files[path] = state
+        return state
+    
+    def _recent_changes(self, state: _FileRate, now: float) -> int:
+        return sum(1 for t in list(state.changes) if now - t <= self.flap_window)
+    
+    def _maybe_recover(self, path: str, state: _FileRate, now: float):
+        """Undamp a file once it changes less than half as often as the threshold."""
+        if state.damped and self._recent_changes(state, now) < self.flap_threshold // 2:
+            state.damped = False
+            log.info(f"{path} calmed down, resuming normal snapshots")
+    
+    def admit(self, path: str, now: Optional[float] = None) -> Optional[float]:
+        """Register a change of ``path``.
+        
+        Returns None if the snapshot may be taken now, otherwise the number
+        of seconds after which a summary snapshot should be taken instead.
+        For a damped file that is ``summary_interval`` after its last
+        snapshot, whatever the bucket says, so a summary scheduled before
+        the file was damped should be moved to it.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic() if now is None else now
+        state = self._get(path, now)
+        self._maybe_recover(path, state, now)
+        state.changes.append(now)
+        
+        if not state.damped and self._recent_changes(state, now) >= self.flap_threshold:
+            state.damped = True
+            state.damped_since = now
+            log.warning(f"{path} is flapping, limiting it to one snapshot "
+                        f"every {self.summary_interval:g}s")
+        
+        if not state.damped and state.bucket.take(now):
+            state.last_snapshot = now
+            return None
+        
+        state.deferred += 1
+        self.total_deferred += 1
+        if state.damped:
+            return max(0.0, state.last_snapshot + self.summary_interval - now)
+        return state.bucket.next_available(now)
+    
+    def is_damped(self, path: str) -> bool:
+        state = self.files.get(path)
+        return state is not None and state.damped
+    
+    def summary_reason(self, path: str, reason: str) -> str:
+        """Snapshot reason for a deferred change."""
+        state = self.files.get(path)
+        if state is None or state.deferred <= 1:
+            return f"{reason} (rate limited)"
+        return f"{reason}; {state.deferred} changes summarised (rate limited)"
+    
+    def summary_taken(self, path: str, now: Optional[float] = None):
+        """Record that the deferred changes of ``path`` were snapshotted."""
+        state = self.files.get(path)
+        if state is None:
+            return
+        now = time.monotonic() if now is None else now
+        state.deferred = 0
+        state.last_snapshot = now
+        if not state.damped:
+            state.bucket.take(now)
+        self.summaries += 1
+        self._maybe_recover(path, state, now)
+    
+    def forget(self, path: str):
+        self.files.pop(path, None)
+    
+    def stats(self) -> dict:
+        """Get rate limiting statistics."""
+        now = time.monotonic()
+        files = list(self.files.items())
+        return {
+            'enabled': self.enabled,
+            'burst': self.burst,
+            'refill_seconds': self.refill_seconds,
+            'summary_interval': self.summary_interval,
+            # A damped file that has calmed down is only undamped on its next change
+            'damped_files': sorted(path for path, state in files if state.damped
+                                   and self._recent_changes(state, now) >= self.flap_threshold // 2),
+            'limited_files': sum(1 for _, state in files if state.deferred),
+            'deferred_changes': self.total_deferred,
+            'summary_snapshots': self.summaries,
+        }
\ No newline at end of file
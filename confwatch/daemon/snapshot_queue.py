@@ -0,0 +1,275 @@
+"""
+Bounded snapshot work queue for the file watcher.
+
+The queue lives on the watcher core's event loop. Reading and hashing run
+on the core's I/O pool; Git writes run on its single Git thread, so they
+are serialised because a GitPython ``Repo`` is not thread-safe.
+"""
+
+import time
+import asyncio
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from ..core import metrics
+from ..core.log import get_logger
+
+log = get_logger('queue')
+
+# Live queues, summed by the metrics gauges at scrape time
+_queues: "weakref.WeakSet[SnapshotQueue]" = weakref.WeakSet()
+
+
+def _sum_queues(measure: Callable[["SnapshotQueue"], int]) -> int:
+    return sum(measure(queue) for queue in list(_queues))
+
+
+def _job_totals() -> Dict[tuple, int]:
+    totals: Dict[tuple, int] = {}
+    for queue in list(_queues):
+        for result, count in queue._stats.items():
+            totals[(result,)] = totals.get((result,), 0) + count
+    return totals
+
+
+metrics.QUEUE_DEPTH.set_function(lambda: _sum_queues(lambda queue: len(queue._pending)))
+metrics.QUEUE_IN_FLIGHT.set_function(lambda: _sum_queues(lambda queue: len(queue._in_flight)))
+metrics.QUEUE_JOBS.set_function(_job_totals)
+
+
+class SnapshotJob:
+    """A pending snapshot request for one file."""
+    
+    __slots__ = ('path', 'reason', 'enqueued_at', 'generation')
+    
+    def __init__(self, path: str, reason: str, generation: int):
+        self.path = path
+        self.reason = reason
+        self.enqueued_at = time.monotonic()
+        self.generation = generation
+
+
+class SnapshotQueue:
+    """Bounded, path-coalescing queue feeding snapshot work to a worker pool.
+    
+    Overflow policy:
+    - a request for a path that is already queued is coalesced into the
+      existing entry (the newest reason wins, the queue position is kept);
+    - a request for a new path when the queue is full waits for up to
+      ``put_timeout`` seconds and is dropped if no slot frees up;
+    - content read by a worker is dropped as stale if the path was
+      re-submitted while it was being read, so only the latest content is
+      written.
+    
+    All methods except ``stats`` must be called on the core's loop thread.
+    """
+    
+    def __init__(self, core, reader: Callable[[str], Optional[tuple]],
+                 writer: Callable[..., bool],
+                 maxsize: int = 256, workers: int = 2, put_timeout: float = 1.0,
+                 head_blob: Optional[Callable[[str], Optional[str]]] = None):
+        """
+        Args:
+            core: WatcherCore providing the loop and executors
+            reader: ``reader(path)`` returns ``(content, blob_id, *extra)`` or None;
+                a ``blob_id`` of None means the write must not be skipped
+            writer: ``writer(path, reason, content, blob_id, *extra)`` commits a snapshot
+            maxsize: Maximum number of distinct pending paths
+            workers: Number of concurrent read/hash jobs
+            put_timeout: Seconds ``put`` may wait when the queue is full
+            head_blob: ``head_blob(path)`` returns the blob id of the path's
+                latest snapshot; run on the Git thread to confirm a skip
+        """
+        self.core = core
+        self.reader = reader
+        self.writer = writer
+        self.maxsize = max(1, int(maxsize))
+        self.workers = max(1, int(workers))
+        self.put_timeout = put_timeout
+        self.head_blob = head_blob
+        
+        self._pending: "OrderedDict[str, SnapshotJob]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._last_blob: Dict[str, str] = {}
+        self._work_ready: Optional[asyncio.Event] = None
+        self._space_ready: Optional[asyncio.Event] = None
+        self._running = False
+        
+        # Counters
+        self._stats = {
+            'submitted': 0,
+            'coalesced': 0,
+            'dropped': 0,
+            'stale': 0,
+            'unchanged': 0,
+            'written': 0,
+            'failed': 0,
+        }
+        self._max_depth = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_count = 0
+        _queues.add(self)
+    
+    def start(self):
+        """Start the worker tasks."""
+        if self._running:
+            return
+        self._running = True
+        self._work_ready = asyncio.Event()
+        self._space_ready = asyncio.Event()
+        for _ in range(self.workers):
+            self.core.create_task(self._worker())
+    
+    def stop(self):
+        """Stop accepting work and discard queued jobs."""
+        self._running = False
+        self._pending.clear()
+        if self._work_ready:
+            self._work_ready.set()
+            self._space_ready.set()
+    
+    def submit(self, path: str, reason: str) -> bool:
+        """Queue a snapshot without waiting. Returns False if the queue is full."""
+        if not self._running:
+            return False
+        job = self._pending.get(path)
+        if job is None and len(self._pending) >= self.maxsize:
+            return False
+        
+        self._stats['submitted'] += 1
+        generation = self._generations.get(path, 0) + 1
+        self._generations[path] = generation
+        
+        if job is not None:
+            job.reason = reason
+            job.generation = generation
+            self._stats['coalesced'] += 1
+            return True
+        
+        self._pending[path] = SnapshotJob(path, reason, generation)
+        self._max_depth = max(self._max_depth, len(self._pending))
+        self._work_ready.set()
+        return True
+    
+    def discard(self, path: str):
+        """Forget a path that is no longer monitored."""
+        if self._pending.pop(path, None) is not None:
+            self._space_ready.set()
+        self._generations.pop(path, None)
+        self._last_blob.pop(path, None)
+    
+    def note_blob(self, path: str, blob_id: str):
+        """Record content committed outside the queue (e.g. by a rollback)."""
+        self._last_blob[path] = blob_id
+    
+    async def put(self, path: str, reason: str) -> bool:
+        """Queue a snapshot, waiting up to ``put_timeout`` for a free slot."""
+        if self.submit(path, reason):
+            return True
+        deadline = time.monotonic() + self.put_timeout
+        while self._running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self._space_ready.clear()
+            try:
+                await asyncio.wait_for(self._space_ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if self.submit(path, reason):
+                return True
+        self._stats['dropped'] += 1
+        return False
+    
+    def _take(self) -> Optional[SnapshotJob]:
+        """Take the oldest job whose path is not already being processed."""
+        for path in self._pending:
+            if path not in self._in_flight:
+                job = self._pending.pop(path)
+                self._in_flight[path] = job.generation
+                wait = time.monotonic() - job.enqueued_at
+                self._wait_total += wait
+                self._wait_count += 1
+                self._wait_max = max(self._wait_max, wait)
+                metrics.QUEUE_WAIT.observe(wait)
+                self._space_ready.set()
+                return job
+        return None
+    
+    def _is_stale(self, job: SnapshotJob) -> bool:
+        return self._generations.get(job.path, 0) != job.generation
+    
+    async def _worker(self):
+        """Read and hash files, then hand the result to the Git thread."""
+        while self._running:
+            job = self._take()
+            if job is None:
+                self._work_ready.clear()
+                await self._work_ready.wait()
+                continue
+            try:
+                result = await self.core.run_in_io(self.reader, job.path)
+                if result is None:
+                    continue
+                blob = result[1]
+                if self._is_stale(job):
+                    self._stats['stale'] += 1
+                    continue
+                if (blob is not None and self._last_blob.get(job.path) == blob
+                        and await self._unchanged_in_head(job.path, blob)):
+                    self._stats['unchanged'] += 1
+                    continue
+                written = await self.core.run_in_git(self.writer, job.path, job.reason, *result)
+                self._stats['written' if written else 'unchanged'] += 1
+                if blob is not None:
+                    self._last_blob[job.path] = blob
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats['failed'] += 1
+                log.error(f"Snapshot job failed for {job.path}: {e}")
+            finally:
+                self._in_flight.pop(job.path, None)
+                if self._pending:
+                    self._work_ready.set()
+    
+    async def _unchanged_in_head(self, path: str, blob: str) -> bool:
+        """Whether the latest snapshot of ``path`` is still ``blob``.
+        
+        ``_last_blob`` only knows the commits made through this queue; the
+        CLI or the web UI may have committed other content since.
+        """
+        if self.head_blob is None:
+            return True
+        return await self.core.run_in_git(self.head_blob, path) == blob
+    
+    async def wait_idle(self, timeout: float) -> bool:
+        """Wait until nothing is queued or in flight. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._pending or self._in_flight:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+    
+    def depth(self) -> int:
+        """Number of queued paths (excluding in-flight work)."""
+        return len(self._pending)
+    
+    def stats(self) -> dict:
+        """Get queue statistics."""
+        avg_wait = self._wait_total / self._wait_count if self._wait_count else 0.0
+        info = {
+            'depth': len(self._pending),
+            'in_flight': len(self._in_flight),
+            'max_depth': self._max_depth,
+            'capacity': self.maxsize,
+            'workers': self.workers,
+            'avg_wait_seconds': round(avg_wait, 4),
+            'max_wait_seconds': round(self._wait_max, 4),
+        }
+        info.update(self._stats)
+        return info
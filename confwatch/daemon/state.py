@@ -0,0 +1,116 @@
+"""
+Persisted watcher state.
+
+For every monitored file the watcher remembers the stat signature and blob
+id of the last version it snapshotted (or verified against the repository),
+plus the commit that recorded it. The state is checkpointed atomically so
+that a restarted daemon can tell which files need re-hashing.
+"""
+
+import os
+import json
+import tempfile
+from typing import Dict, List, Optional
+
+from ..core.log import get_logger
+
+log = get_logger('state')
+
+STATE_VERSION = 1
+
+
+class WatcherState:
+    """Checkpointed per-file state of the file watcher.
+    
+    Not thread-safe: the watcher only mutates it on its event loop thread and
+    passes ``snapshot()`` copies to the I/O pool for writing.
+    """
+    
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        self.entries: Dict[str, dict] = {}
+        self.dirty = False
+        self.checkpoints = 0
+    
+    def load(self) -> bool:
+        """Load the last checkpoint. A missing or corrupt file means an empty state."""
+        try:
+            with open(self.state_file, 'r') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable state file {self.state_file}: {e}")
+            return False
+        
+        if not isinstance(data, dict) or data.get('version') != STATE_VERSION:
+            return False
+        entries = data.get('files')
+        if isinstance(entries, dict):
+            self.entries = entries
+        return True
+    
+    def get(self, path: str) -> Optional[dict]:
+        return self.entries.get(path)
+    
+    def signature(self, path: str) -> Optional[tuple]:
+        entry = self.entries.get(path)
+        if entry and entry.get('stat'):
+            return tuple(entry['stat'])
+        return None
+    
+    def record(self, path: str, signature: Optional[tuple], blob: str, commit: Optional[str] = None):
+        """Record the verified state of a file."""
+        entry = self.entries.setdefault(path, {})
+        entry['stat'] = list(signature) if signature else None
+        entry['blob'] = blob
+        if commit:
+            entry['commit'] = commit
+        self.dirty = True
+    
+    def discard(self, path: str):
+        if self.entries.pop(path, None) is not None:
+            self.dirty = True
+    
+    def prune(self, keep: List[str]):
+        """Drop entries for files that are no longer monitored."""
+        keep_set = set(keep)
+        for path in [p for p in self.entries if p not in keep_set]:
+            self.discard(path)
+    
+    def snapshot(self) -> dict:
+        """Copy of the state suitable for ``write``; clears the dirty flag."""
+        self.dirty = False
+        return {
+            'version': STATE_VERSION,
+            'files': {path: dict(entry) for path, entry in self.entries.items()},
+        }
+    
+    def write(self, data: dict):
+        """Atomically write a checkpoint (temp file, fsync, rename)."""
+        directory = os.path.dirname(self.state_file) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix='.watcher_state.', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.state_file)
+        except Exception:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        # Make the rename itself durable
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+        except OSError:
+            pass
+        self.checkpoints += 1
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+Combined mode: the file watcher and the web server in one process.
+
+Both sides share one AppContext, so there is a single repository handle and
+parsed config, and a new snapshot invalidates the web UI's cached history
+for that file right away.
+"""
+
+import threading
+from typing import Optional
+
+from ..core.context import AppContext
+from ..core.log import get_logger
+from .core import WatcherCore
+from .watcher import FileWatcher
+
+log = get_logger('supervisor')
+
+
+class Supervisor:
+    """Runs the file watcher and the web server in the daemon process."""
+    
+    def __init__(self, config_file: str, repo_dir: str, host: str = '0.0.0.0', port: int = 8080,
+                 core: Optional[WatcherCore] = None):
+        self.host = host
+        self.port = port
+        self.context = AppContext(config_file, repo_dir)
+        self.watcher = FileWatcher(config_file, repo_dir, core=core, context=self.context)
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self, use_watchdog: bool = True):
+        """Start the watcher, then serve the web UI from a background thread."""
+        self.watcher.start(use_watchdog=use_watchdog)
+        try:
+            self._start_web()
+        except Exception:
+            self.watcher.stop()
+            raise
+    
+    def _start_web(self):
+        from werkzeug.serving import make_server
+        from ..web import app as web_app
+        
+        web_app.set_context(self.context)
+        self._server = make_server(self.host, self.port, web_app.app, threaded=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="confwatch-web", daemon=True)
+        self._thread.start()
+        log.info(f"Web interface on http://{self.host}:{self.port}")
+    
+    def stop(self):
+        """Stop the web server first so no request sees a stopped watcher."""
+        if self._server is not None:
+            from ..web import app as web_app
+            web_app.close_event_streams()
+            self._server.shutdown()
+            self._thread.join(timeout=5)
+            self._server = None
+            self._thread = None
+            web_app.set_context(None)
+        if self.watcher.is_running:
+            self.watcher.stop()
+    
+    def status(self) -> dict:
+        status = self.watcher.status()
+        status['web'] = {
+            'running': self._server is not None,
+            'host': self.host,
+            'port': self.port,
+        }
+        status['context'] = self.context.stats()
+        return status
\ No newline at end of file
@@ -4,71 +4,158 @@ File watcher module for automatic change detection.
 
 import os
 import time
+import asyncio
 import threading
-import hashlib
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Set, Optional
-
-try:
-    from watchdog.observers import Observer
-    from watchdog.events import FileSystemEventHandler
-    WATCHDOG_AVAILABLE = True
-except ImportError:
-    WATCHDOG_AVAILABLE = False
+from typing import Dict, Set, Optional, Tuple
 
 from ..core.scanner import FileScanner
 from ..core.storage import GitStorage
+from ..core.expected_writes import ExpectedWrites, stat_signature
+from ..core.context import AppContext
+from ..core.search import SearchIndex
+from ..core import metrics
+from ..core.log import get_logger
+from .core import WatcherCore, WATCHDOG_AVAILABLE
+from .inotify import INOTIFY_AVAILABLE, IN_DELETE, IN_MOVED_FROM, IN_Q_OVERFLOW
+from .snapshot_queue import SnapshotQueue
+from .ratelimit import RateLimiter
+from .state import WatcherState
+from .journal import CaptureJournal
 
-
-class ConfigFileHandler(FileSystemEventHandler):
-    """Handle file system events for monitored configuration files."""
-    
-    def __init__(self, watcher):
-        self.watcher = watcher
-        super().__init__()
-    
-    def on_modified(self, event):
-        """Handle file modification events."""
-        if event.is_directory:
-            return
-        
-        file_path = event.src_path
-        if self.watcher.should_monitor_file(file_path):
-            self.watcher.schedule_snapshot(file_path, "File modified")
+log = get_logger('watcher')
 
 
 class FileWatcher:
     """Watches configuration files for changes and creates automatic snapshots."""
     
-    def __init__(self, config_file: str, repo_dir: str):
+    def __init__(self, config_file: str, repo_dir: str, core: Optional[WatcherCore] = None,
+                 state_file: Optional[str] = None, context: Optional[AppContext] = None):
         self.config_file = config_file
         self.repo_dir = repo_dir
-        self.scanner = FileScanner(config_file)
-        self.storage = GitStorage(repo_dir)
+        
+        # With a shared context (combined mode) the repository handle and the
+        # parsed config are shared with the web server, guarded by its lock
+        self.context = context
+        if context is not None:
+            self.scanner = context.scanner()
+            self.storage = context.storage
+            self._repo_lock = context.lock
+        else:
+            self.scanner = FileScanner(config_file)
+            self.storage = GitStorage(repo_dir)
+            self._repo_lock = threading.RLock()
+        
+        # Checkpointed per-file state (stat signature, blob id, last commit)
+        confwatch_home = os.path.dirname(os.path.dirname(config_file))
+        if state_file is None:
+            state_file = os.path.join(confwatch_home, "watcher_state.json")
+        self.state = WatcherState(state_file)
+        self._checkpoint_handle: Optional[asyncio.TimerHandle] = None
+        self.last_reconcile: Optional[dict] = None
+        
+        # Writes made by ConfWatch itself (rollbacks), recognised by stat alone
+        self.expected_writes = ExpectedWrites(confwatch_home)
+        self.echoes_suppressed = 0
+        
+        # Search index, kept current once a search has created it
+        if context is not None:
+            self.search_index = context.search_index
+        else:
+            self.search_index = SearchIndex.for_home(confwatch_home, self.storage, self._repo_lock)
         
         # Monitoring state
         self.is_running = False
-        self.observer = None
-        self.polling_thread = None
-        self.stop_event = threading.Event()
+        self.started_at: Optional[float] = None
+        self.mode: Optional[str] = None
+        self._polling_task: Optional[asyncio.Task] = None
+        self._put_tasks: Set[asyncio.Task] = set()
+        
+        # Debouncing (loop timer handles, keyed by absolute path)
+        self.pending_snapshots: Dict[str, asyncio.TimerHandle] = {}
+        self._pending_reasons: Dict[str, str] = {}
+        self._first_change: Dict[str, float] = {}  # for event-to-commit latency (metrics only)
+        
+        # Captures into the journal (loop timer handles, keyed by absolute path)
+        self._capture_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._capturing: Set[str] = set()
+        self._recapture: Set[str] = set()
+        self._journal_sync_handle: Optional[asyncio.TimerHandle] = None
         
-        # Debouncing
-        self.pending_snapshots: Dict[str, threading.Timer] = {}
-        self.debounce_delay = 5  # seconds
+        # Deferred snapshots of rate-limited files (loop timer handles)
+        self.summary_snapshots: Dict[str, asyncio.TimerHandle] = {}
+        self._summary_reasons: Dict[str, str] = {}
+        # Files whose last change was deferred: their snapshot commits only the
+        # latest content, captured versions are folded into it
+        self._rate_limited: Set[str] = set()
         
-        # File hashes for polling mode
+        # Stat signatures and blob ids for polling mode
+        self.file_stats: Dict[str, Tuple[int, int, int, int]] = {}
         self.file_hashes: Dict[str, str] = {}
         
         # Load configuration
         self.load_config()
+        self.rate_limiter = RateLimiter(**self.rate_limit)
+        
+        # Write-ahead journal of versions captured at event time
+        self.journal: Optional[CaptureJournal] = None
+        if self.capture_journal:
+            self.journal = CaptureJournal(os.path.join(confwatch_home, "capture.journal"),
+                                          max_versions=self.journal_max_versions)
+        
+        # Watched files: absolute path -> path as configured by the user
+        self.watched: Dict[str, str] = {}
+        self.watched_dirs: Set[str] = set()
+        self._dir_refs: Dict[str, int] = {}
+        self._resolved: Dict[str, str] = {}
+        self._load_watch_list()
+        
+        # Live config reload
+        self.config_path = str(Path(config_file).resolve())
+        self.reload_delay = 0.5  # seconds
+        self._reload_handle: Optional[asyncio.TimerHandle] = None
+        self._config_signature = None
+        self._config_dir_watched = False
+        self.config_reloads = 0
+        self.last_reload: Optional[dict] = None
+        
+        # Event loop core; a watcher owns it unless one is shared with it
+        self.owns_core = core is None
+        self.core = core or WatcherCore(io_workers=self.queue_workers)
+        
+        # Snapshot work queue (reads/hashes on the I/O pool, Git writes serialised)
+        self.queue = SnapshotQueue(
+            self.core,
+            self._read_versions,
+            self._write_snapshot,
+            maxsize=self.queue_size,
+            workers=self.queue_workers,
+            put_timeout=self.queue_put_timeout,
+            head_blob=self._head_blob,
+        )
     
     def load_config(self):
         """Load monitoring configuration."""
-        # For now, use simple defaults
-        # TODO: Load from config file
+        settings = self.scanner.get_settings('daemon')
         self.auto_monitoring_enabled = True
-        self.polling_interval = 30  # seconds
+        self.debounce_delay = float(settings.get('debounce', 5))  # seconds
+        self.polling_interval = float(settings.get('polling_interval', 30))  # seconds
+        self.queue_size = int(settings.get('queue_size', 256))
+        self.queue_workers = int(settings.get('queue_workers', 2))
+        self.queue_put_timeout = float(settings.get('queue_put_timeout', 1.0))
+        self.checkpoint_interval = float(settings.get('checkpoint_interval', 5))  # seconds
+        self.capture_journal = bool(settings.get('capture_journal', True))  # takes effect on restart
+        self.capture_delay = float(settings.get('capture_delay', 0.1))  # seconds for writes to settle
+        self.journal_sync_interval = float(settings.get('journal_sync_interval', 0.2))  # seconds
+        self.journal_max_versions = int(settings.get('journal_max_versions', 20))
+        self.rate_limit = {
+            'burst': int(settings.get('rate_limit_burst', 6)),
+            'refill_seconds': float(settings.get('rate_limit_refill', 60)),
+            'flap_threshold': int(settings.get('flap_threshold', 12)),
+            'flap_window': float(settings.get('flap_window', 300)),
+            'summary_interval': float(settings.get('summary_interval', 600)),
+        }
         self.ignore_patterns = [
             r'.*\.swp$',      # Vim swap files
             r'.*\.tmp$',      # Temporary files
@@ -76,212 +163,878 @@ class FileWatcher:
             r'.*\.bak$',      # Backup files
         ]
     
+    def _load_watch_list(self):
+        """Resolve the configured paths once, without reading or hashing files."""
+        self.watched = self._resolve_watch_list(self.scanner)
+    
+    def _resolve_watch_list(self, scanner: FileScanner) -> Dict[str, str]:
+        """Map absolute paths to configured paths, resolving only new entries."""
+        watched = {}
+        resolved = {}
+        for original_path in scanner.watched_files:
+            original_path = str(original_path)
+            abs_path = self._resolved.get(original_path)
+            if abs_path is None:
+                abs_path = scanner.expand_path(original_path)
+            resolved[original_path] = abs_path
+            watched[abs_path] = original_path
+        self._resolved = resolved
+        return watched
+    
     def should_monitor_file(self, file_path: str) -> bool:
         """Check if file should be monitored."""
-        # Get absolute path
         abs_path = str(Path(file_path).resolve())
-        
-        # Check if file is in our monitored list
-        watched_files = self.scanner.get_watched_files()
-        monitored_paths = {str(Path(f['original_path']).expanduser().resolve()) 
-                          for f in watched_files if f.get('exists', False)}
-        
-        return abs_path in monitored_paths
+        return abs_path in self.watched and os.path.exists(abs_path)
+    
+    def get_original_path(self, abs_path: str) -> Optional[str]:
+        """Get the original configured path for an absolute path."""
+        return self.watched.get(abs_path)
+    
+    # Debouncing
     
     def schedule_snapshot(self, file_path: str, reason: str = "Auto-detected change"):
-        """Schedule a debounced snapshot creation."""
+        """Schedule a debounced snapshot creation. Safe to call from any thread."""
         abs_path = str(Path(file_path).resolve())
-        
+        self.core.call_soon(self._schedule, abs_path, reason)
+    
+    def _schedule(self, abs_path: str, reason: str):
         # Cancel existing timer for this file
-        if abs_path in self.pending_snapshots:
-            self.pending_snapshots[abs_path].cancel()
+        handle = self.pending_snapshots.get(abs_path)
+        if handle is not None:
+            handle.cancel()
+            metrics.DEBOUNCE_CANCELLED.inc()
+        elif metrics.is_enabled():
+            self._first_change[abs_path] = time.monotonic()  # first change of this burst
         
-        # Schedule new snapshot
-        timer = threading.Timer(
-            self.debounce_delay,
-            self.create_auto_snapshot,
-            [abs_path, reason]
+        self.pending_snapshots[abs_path] = self.core.loop.call_later(
+            self.debounce_delay, self._enqueue_snapshot, abs_path, reason
         )
-        self.pending_snapshots[abs_path] = timer
-        timer.start()
+        self._pending_reasons[abs_path] = reason
+        log.debug(f"Scheduled snapshot for {abs_path} (reason: {reason})")
         
-        print(f"[WATCHER] Scheduled snapshot for {abs_path} (reason: {reason})")
+        # Rate-limited files are not captured: their summary takes the latest content
+        if (self.journal is not None and abs_path not in self.summary_snapshots
+                and not self.rate_limiter.is_damped(abs_path)):
+            self._schedule_capture(abs_path)
     
-    def create_auto_snapshot(self, file_path: str, reason: str):
-        """Create an automatic snapshot."""
+    # Capture journal
+    
+    def _schedule_capture(self, abs_path: str):
+        """Capture the file once writes to it have settled for ``capture_delay``."""
+        handle = self._capture_handles.get(abs_path)
+        if handle is not None:
+            handle.cancel()
+        self._capture_handles[abs_path] = self.core.loop.call_later(
+            self.capture_delay, self._start_capture, abs_path
+        )
+    
+    def _start_capture(self, abs_path: str):
+        self._capture_handles.pop(abs_path, None)
+        if abs_path in self._capturing:
+            self._recapture.add(abs_path)  # capture again once the running one is done
+            return
+        self._capturing.add(abs_path)
+        self.core.create_task(self._capture_async(abs_path))
+    
+    async def _capture_async(self, abs_path: str):
         try:
-            # Remove from pending
-            if file_path in self.pending_snapshots:
-                del self.pending_snapshots[file_path]
-            
-            # Check if file still exists and has actually changed
-            if not os.path.exists(file_path):
-                print(f"[WATCHER] File no longer exists: {file_path}")
+            if await self.core.run_in_io(self._capture, abs_path):
+                self._schedule_journal_sync()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"Failed to capture {abs_path}: {e}")
+        finally:
+            self._capturing.discard(abs_path)
+            if abs_path in self._recapture and self.is_running:
+                self._recapture.discard(abs_path)
+                self._start_capture(abs_path)
+    
+    def _capture(self, file_path: str) -> bool:
+        """Append the file's current content to the journal. Runs on the I/O pool."""
+        if file_path not in self.watched:
+            return False
+        result = self._read_snapshot(file_path)
+        if result is None:
+            return False
+        content, blob_id, signature = result
+        with metrics.SNAPSHOT_STAGE.time(stage='capture'):
+            return self.journal.append(file_path, content, blob_id, signature)
+    
+    def _schedule_journal_sync(self):
+        """Batch the fsyncs of captures made within ``journal_sync_interval``."""
+        if self._journal_sync_handle is None:
+            self._journal_sync_handle = self.core.loop.call_later(
+                self.journal_sync_interval, lambda: self.core.create_task(self._journal_sync_async())
+            )
+    
+    async def _journal_sync_async(self):
+        self._journal_sync_handle = None
+        try:
+            await self.core.run_in_io(self.journal.sync)
+        except Exception as e:
+            log.warning(f"Failed to sync capture journal: {e}")
+    
+    async def _recover_journal(self):
+        """Commit versions captured, but not committed, before the last shutdown."""
+        paths = self.journal.paths()
+        if not paths:
+            return
+        gone = [path for path in paths if path not in self.watched]
+        paths = [path for path in paths if path in self.watched]
+        head_blobs = await self.core.run_in_git(self._head_blobs, paths)
+        recovered = 0
+        for path in paths:
+            entries = self.journal.pending(path)
+            # A crash after the commits, but before they were marked done
+            if entries and head_blobs.get(path) == entries[-1].blob:
+                gone.append(path)
+                continue
+            recovered += len(entries)
+            self._submit_snapshot(path, "Recovered from capture journal")
+        for path in gone:
+            await self.core.run_in_io(self.journal.discard, path)
+        if recovered:
+            log.info(f"Recovered {recovered} captured version(s) from the capture journal")
+    
+    def _enqueue_snapshot(self, file_path: str, reason: str):
+        """Hand a debounced change over to the snapshot queue, unless rate limited."""
+        self.pending_snapshots.pop(file_path, None)
+        self._pending_reasons.pop(file_path, None)
+        delay = self.rate_limiter.admit(file_path)
+        if delay is None:
+            self._rate_limited.discard(file_path)
+            self._submit_snapshot(file_path, reason)
+            return
+        
+        # Defer; the summary snapshot reads the file's latest content
+        self._rate_limited.add(file_path)
+        handle = self.summary_snapshots.get(file_path)
+        when = self.core.loop.time() + delay
+        if handle is not None:
+            # Keep the pending summary, unless it is due later than it should be now, or
+            # the file got damped: then it follows summary_interval, not the bucket
+            if abs(handle.when() - when) < 0.001 or (
+                    handle.when() < when and not self.rate_limiter.is_damped(file_path)):
                 return
-            
-            # Read file content
-            try:
+            handle.cancel()
+            reason = self._summary_reasons.get(file_path, reason)
+        self.summary_snapshots[file_path] = self.core.loop.call_at(
+            when, self._summary_snapshot, file_path, reason
+        )
+        self._summary_reasons[file_path] = reason
+    
+    def _summary_snapshot(self, file_path: str, reason: str):
+        self.summary_snapshots.pop(file_path, None)
+        self._summary_reasons.pop(file_path, None)
+        reason = self.rate_limiter.summary_reason(file_path, reason)
+        self.rate_limiter.summary_taken(file_path)
+        self._submit_snapshot(file_path, reason)
+    
+    def _submit_snapshot(self, file_path: str, reason: str):
+        if self.queue.submit(file_path, reason):
+            return
+        # Queue is full: wait for a slot in the background (backpressure)
+        task = self.core.loop.create_task(self._put_snapshot(file_path, reason))
+        self._put_tasks.add(task)
+        task.add_done_callback(self._put_tasks.discard)
+    
+    async def _put_snapshot(self, file_path: str, reason: str):
+        if not await self.queue.put(file_path, reason):
+            log.warning(f"Snapshot queue full, dropped snapshot for {file_path}")
+    
+    # Snapshot work (runs on the core's executors)
+    
+    def _read_snapshot(self, file_path: str) -> Optional[tuple]:
+        """Read a file for snapshotting. Runs on the I/O pool.
+        
+        Returns ``(content, blob_id, stat_signature)``. The signature is taken
+        before reading, so a concurrent write makes it look stale, not fresh.
+        """
+        signature = self._stat_signature(file_path)
+        if signature is None:
+            log.debug(f"File no longer exists: {file_path}")
+            return None
+        if self._is_own_write(file_path, signature):
+            return None
+        
+        try:
+            with metrics.SNAPSHOT_STAGE.time(stage='read'):
                 with open(file_path, 'r', encoding='utf-8') as f:
                     content = f.read()
-            except Exception as e:
-                print(f"[WATCHER] Failed to read file {file_path}: {e}")
-                return
-            
-            # Create snapshot with auto comment
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            comment = f"[AUTO] {reason} at {timestamp}"
-            
-            # Find original path (the path as configured by user)
-            original_path = self.get_original_path(file_path)
-            if not original_path:
-                print(f"[WATCHER] Could not determine original path for {file_path}")
+        except Exception as e:
+            log.warning(f"Failed to read file {file_path}: {e}")
+            return None
+        
+        metrics.HASH_CHECKS.inc(result='hashed')
+        with metrics.SNAPSHOT_STAGE.time(stage='hash'):
+            blob_id = GitStorage.blob_id(content)
+        return content, blob_id, signature
+    
+    def _is_own_write(self, file_path: str, signature: tuple) -> bool:
+        """Check whether the file is exactly as a ConfWatch rollback left it.
+        
+        Such writes were already committed by the writer, so the snapshot is
+        skipped without reading the file.
+        """
+        blob_id = self.expected_writes.match(file_path, signature)
+        if blob_id is None:
+            return False
+        metrics.HASH_CHECKS.inc(result='own_write')
+        self.echoes_suppressed += 1
+        self.file_stats[file_path] = signature
+        self.file_hashes[file_path] = blob_id
+        if self.core.is_running:
+            self.core.call_soon(self._record_committed, file_path, signature, blob_id, None)
+        return True
+    
+    def _read_versions(self, file_path: str) -> Optional[tuple]:
+        """Read a file for committing, with its captured versions. Runs on the I/O pool.
+        
+        Returns ``(content, blob_id, stat_signature, versions, seqs)``, where
+        ``versions`` lists ``(captured_at, content)`` to commit in order (the
+        last one is ``content``; ``captured_at`` is None for the file as read
+        now) and ``seqs`` are the journal records they consume. ``blob_id``
+        is None when several versions are committed, so the queue does not
+        skip them because the last one matches the latest snapshot.
+        
+        For a rate-limited file only the latest version is committed (one
+        summary, as the limit promises); the captured ones are marked done
+        with it. ``blob_id`` is None then too, so they are not left pending.
+        """
+        current = self._read_snapshot(file_path)
+        entries = self.journal.pending(file_path) if self.journal is not None else []
+        if not entries:
+            return current
+        
+        versions = [(entry.captured_at, self.journal.read(entry)) for entry in entries]
+        signature = entries[-1].signature
+        blob_id = entries[-1].blob
+        if current is not None:
+            if current[1] != blob_id:
+                versions.append((None, current[0]))  # changed again since the last capture
+                blob_id = current[1]
+            signature = current[2]
+        seqs = tuple(entry.seq for entry in entries)
+        if file_path in self._rate_limited:
+            return versions[-1][1], None, signature, (versions[-1],), seqs
+        return versions[-1][1], blob_id if len(versions) == 1 else None, signature, tuple(versions), seqs
+    
+    def _hash_file(self, file_path: str) -> Optional[Tuple[tuple, str]]:
+        """Get ``(stat_signature, blob_id)`` the way snapshots would store the file."""
+        result = self._read_snapshot(file_path)
+        if result is None:
+            return None
+        return result[2], result[1]
+    
+    def _write_snapshot(self, file_path: str, reason: str, content: str, blob_id: Optional[str],
+                        signature: Optional[tuple] = None, versions: tuple = (), seqs: tuple = ()) -> bool:
+        """Commit a snapshot. Runs on the Git thread, so writes are serialised.
+        
+        ``versions`` and ``seqs`` come from ``_read_versions``: captured
+        versions are committed oldest first, then marked done in the journal.
+        """
+        # Find original path (the path as configured by user)
+        original_path = self.get_original_path(file_path)
+        if not original_path:
+            log.warning(f"Could not determine original path for {file_path}")
+            return False
+        
+        if blob_id is None:
+            blob_id = GitStorage.blob_id(content)
+        saved = 0
+        with self._repo_lock:
+            for captured_at, version in versions or ((None, content),):
+                # Create snapshot with auto comment
+                if captured_at is None:
+                    comment = f"[AUTO] {reason} at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+                else:
+                    captured = datetime.fromtimestamp(captured_at).strftime('%Y-%m-%d %H:%M:%S')
+                    comment = f"[AUTO] {reason} (captured at {captured})"
+                if self.storage.save_file(file_path, version, comment=comment, force=False):
+                    saved += 1
+            commit = self.storage.repo.head.commit.hexsha if saved else None
+            if saved and self.context is not None:
+                self.context.invalidate(file_path)
+        if self.journal is not None:
+            self.journal.mark_done(file_path, seqs, blob_id)
+        if saved:
+            self._update_search_index()
+        
+        first_change = self._first_change.pop(file_path, None)
+        if saved:
+            if first_change is not None:
+                metrics.EVENT_TO_COMMIT.observe(time.monotonic() - first_change)
+            if saved > 1:
+                log.info(f"Created {saved} auto snapshots for {original_path}",
+                         extra={'path': file_path, 'commit': commit})
+            else:
+                log.info(f"Created auto snapshot for {original_path}", extra={'path': file_path, 'commit': commit})
+            self._record_committed_threadsafe(file_path, signature, blob_id, commit)
+            return True
+        log.debug(f"No changes detected in {original_path}")
+        self._record_committed_threadsafe(file_path, signature, blob_id, None)
+        return False
+    
+    def _update_search_index(self):
+        """Index new snapshots right away, once a search has created the index (Git thread)."""
+        if not self.search_index.exists():
+            return
+        try:
+            self.search_index.update()
+        except Exception as e:
+            log.warning(f"Failed to update search index: {e}")
+    
+    def create_auto_snapshot(self, file_path: str, reason: str):
+        """Create an automatic snapshot synchronously, bypassing the queue.
+        
+        Must not be called from the event loop thread.
+        """
+        try:
+            result = self._read_versions(file_path)
+            if result is None:
                 return
-            
-            # Create snapshot
-            if self.storage.save_file(file_path, content, comment=comment, force=False):
-                print(f"[WATCHER] Created auto snapshot for {original_path}")
+            if self.core.is_running:
+                self.core.git_executor.submit(self._write_snapshot, file_path, reason, *result).result()
             else:
-                print(f"[WATCHER] No changes detected in {original_path}")
-                
+                self._write_snapshot(file_path, reason, *result)
         except Exception as e:
-            print(f"[WATCHER] Error creating snapshot for {file_path}: {e}")
+            log.error(f"Error creating snapshot for {file_path}: {e}")
     
-    def get_original_path(self, abs_path: str) -> Optional[str]:
-        """Get the original configured path for an absolute path."""
-        watched_files = self.scanner.get_watched_files()
-        for file_info in watched_files:
-            if file_info.get('exists', False):
-                file_abs_path = str(Path(file_info['original_path']).expanduser().resolve())
-                if file_abs_path == abs_path:
-                    return file_info['original_path']
-        return None
-    
-    def start_watchdog_monitoring(self):
-        """Start file monitoring using watchdog."""
-        if not WATCHDOG_AVAILABLE:
-            raise RuntimeError("Watchdog library not available. Install with: pip install watchdog")
-        
-        self.observer = Observer()
-        handler = ConfigFileHandler(self)
-        
-        # Watch directories containing our monitored files
-        watched_dirs = set()
-        watched_files = self.scanner.get_watched_files()
-        
-        for file_info in watched_files:
-            if file_info.get('exists', False):
-                file_path = Path(file_info['path']).parent
-                watched_dirs.add(str(file_path))
-        
-        # Schedule watchers for each directory
-        for dir_path in watched_dirs:
-            if os.path.exists(dir_path):
-                self.observer.schedule(handler, dir_path, recursive=False)
-                print(f"[WATCHER] Watching directory: {dir_path}")
-        
-        self.observer.start()
-        print("[WATCHER] File monitoring started (watchdog mode)")
-    
-    def start_polling_monitoring(self):
+    # Persisted state
+    
+    def _record_committed_threadsafe(self, file_path: str, signature: Optional[tuple], blob_id: str,
+                                     commit: Optional[str]):
+        if self.core.is_running:
+            self.core.call_soon(self._record_committed, file_path, signature, blob_id, commit)
+    
+    def _record_committed(self, file_path: str, signature: Optional[tuple], blob_id: str,
+                          commit: Optional[str]):
+        self.queue.note_blob(file_path, blob_id)
+        self._record_state(file_path, signature, blob_id, commit)
+    
+    def _record_state(self, file_path: str, signature: Optional[tuple], blob_id: str,
+                      commit: Optional[str]):
+        """Remember what was snapshotted or verified for a file (loop thread)."""
+        if file_path not in self.watched:
+            return
+        self.state.record(file_path, signature, blob_id, commit)
+        self._schedule_checkpoint()
+    
+    def _schedule_checkpoint(self):
+        if self._checkpoint_handle is None:
+            self._checkpoint_handle = self.core.loop.call_later(
+                self.checkpoint_interval, lambda: self.core.create_task(self._checkpoint_async())
+            )
+    
+    async def _checkpoint_async(self):
+        """Write the state to disk on the I/O pool."""
+        self._checkpoint_handle = None
+        if not self.state.dirty:
+            return
+        try:
+            await self.core.run_in_io(self.state.write, self.state.snapshot())
+        except Exception as e:
+            self.state.dirty = True
+            log.warning(f"Failed to checkpoint state: {e}")
+    
+    def _reconcile_scan(self, paths: list) -> Tuple[list, list]:
+        """Compare files against the checkpoint. Runs on the I/O pool.
+        
+        Files whose stat signature matches the checkpoint are trusted without
+        reading them; everything else is re-hashed.
+        """
+        trusted, suspicious = [], []
+        for abs_path in paths:
+            signature = self._stat_signature(abs_path)
+            if signature is None:
+                continue
+            entry = self.state.get(abs_path)
+            if entry and entry.get('blob') and self.state.signature(abs_path) == signature:
+                metrics.HASH_CHECKS.inc(result='skipped')
+                trusted.append((abs_path, signature, entry['blob']))
+                continue
+            hashed = self._hash_file(abs_path)
+            if hashed is not None:
+                suspicious.append((abs_path,) + hashed)
+        return trusted, suspicious
+    
+    def _head_blob(self, file_path: str) -> Optional[str]:
+        """Look up the latest snapshotted blob id of one file. Runs on the Git thread."""
+        with self._repo_lock:
+            return self.storage.get_head_blob_id(file_path)
+    
+    def _head_blobs(self, paths: list) -> Dict[str, Optional[str]]:
+        """Look up the latest snapshotted blob ids. Runs on the Git thread."""
+        with self._repo_lock:
+            return {abs_path: self.storage.get_head_blob_id(abs_path) for abs_path in paths}
+    
+    async def _reconcile_async(self, reason: str) -> dict:
+        """Snapshot every monitored file that drifted from its latest snapshot.
+        
+        Used at startup (changes made while the daemon was down) and for
+        rescans requested through the control socket.
+        """
+        started = time.monotonic()
+        try:
+            trusted, suspicious = await self.core.run_in_io(self._reconcile_scan, list(self.watched))
+            head_blobs = await self.core.run_in_git(self._head_blobs, [item[0] for item in suspicious])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"Reconciliation failed: {e}")
+            return {'success': False, 'error': str(e)}
+        
+        drifted = 0
+        for abs_path, signature, blob_id in trusted:
+            self.file_stats.setdefault(abs_path, signature)
+            self.file_hashes.setdefault(abs_path, blob_id)
+        
+        for abs_path, signature, blob_id in suspicious:
+            if abs_path not in self.watched:
+                continue
+            self.file_stats.setdefault(abs_path, signature)
+            self.file_hashes.setdefault(abs_path, blob_id)
+            head_blob = head_blobs.get(abs_path)
+            if head_blob == blob_id:
+                self.state.record(abs_path, signature, blob_id)
+                continue
+            drifted += 1
+            self._submit_snapshot(abs_path, reason if head_blob else "Initial snapshot")
+        
+        self.state.prune(list(self.watched))
+        if self.state.dirty:
+            self._schedule_checkpoint()
+        
+        return {
+            'success': True,
+            'checked': len(trusted) + len(suspicious),
+            'trusted': len(trusted),
+            'rehashed': len(suspicious),
+            'drifted': drifted,
+            'duration_ms': round((time.monotonic() - started) * 1000, 2),
+        }
+    
+    async def _startup_reconcile(self):
+        if self.journal is not None:
+            try:
+                await self._recover_journal()
+            except Exception as e:
+                log.error(f"Capture journal recovery failed: {e}")
+        result = await self._reconcile_async("Changed while daemon was stopped")
+        if result['success']:
+            self.last_reconcile = result
+            log.info(f"Startup reconciliation: {result['trusted']} unchanged, "
+                     f"{result['rehashed']} re-hashed, {result['drifted']} snapshotted")
+    
+    # Event monitoring
+    
+    def _on_directory_event(self, file_path: str, mask: int):
+        """Handle an event from a watched directory (loop thread)."""
+        if mask & IN_Q_OVERFLOW:
+            # Events were lost; re-check every watched file in the directory
+            for abs_path in self.watched:
+                if os.path.dirname(abs_path) == file_path and os.path.exists(abs_path):
+                    self._schedule(abs_path, "Event queue overflow")
+            return
+        
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            return
+        
+        if file_path in self.watched and os.path.exists(file_path):
+            self._schedule(file_path, "File modified")
+    
+    def _watch_file(self, abs_path: str):
+        """Count a watched file against its directory, watching it if needed."""
+        dir_path = os.path.dirname(abs_path)
+        self._dir_refs[dir_path] = self._dir_refs.get(dir_path, 0) + 1
+        if self.mode == 'polling' or dir_path in self.watched_dirs or not os.path.isdir(dir_path):
+            return
+        if self.core.watch_directory(dir_path, self._on_directory_event):
+            self.watched_dirs.add(dir_path)
+            log.debug(f"Watching directory: {dir_path}")
+    
+    def _unwatch_file(self, abs_path: str):
+        """Release a watched file; the directory watch goes with its last file."""
+        dir_path = os.path.dirname(abs_path)
+        refs = self._dir_refs.get(dir_path, 0) - 1
+        if refs > 0:
+            self._dir_refs[dir_path] = refs
+            return
+        self._dir_refs.pop(dir_path, None)
+        if dir_path in self.watched_dirs:
+            self.watched_dirs.discard(dir_path)
+            self.core.unwatch_directory(dir_path, self._on_directory_event)
+            log.debug(f"Stopped watching directory: {dir_path}")
+    
+    def _start_event_monitoring(self) -> bool:
+        """Subscribe to filesystem events for the watched directories."""
+        self.mode = self.core.enable_events()
+        if not self.mode:
+            return False
+        
+        for abs_path in self.watched:
+            self._watch_file(abs_path)
+        
+        # Watch the configuration file itself for live reloads
+        config_dir = os.path.dirname(self.config_path)
+        self._config_dir_watched = self.core.watch_directory(config_dir, self._on_config_event)
+        
+        log.info(f"File monitoring started ({self.mode} mode)")
+        return True
+    
+    def _start_polling_monitoring(self):
         """Start file monitoring using polling."""
-        self.polling_thread = threading.Thread(target=self._polling_loop, daemon=True)
-        self.polling_thread.start()
-        print("[WATCHER] File monitoring started (polling mode)")
+        self.mode = 'polling'
+        for abs_path in self.watched:
+            self._watch_file(abs_path)
+        self._polling_task = self.core.create_task(self._polling_loop())
+        log.info("File monitoring started (polling mode)")
+    
+    def _stat_signature(self, file_path: str) -> Optional[Tuple[int, int, int, int]]:
+        return stat_signature(file_path)
     
-    def _polling_loop(self):
+    def _poll_once(self) -> list:
+        """Check watched files for changes. Runs on the I/O pool.
+        
+        Files whose stat signature is unchanged are not read or hashed.
+        """
+        changed = []
+        for abs_path in list(self.watched):
+            signature = self._stat_signature(abs_path)
+            if signature is None:
+                continue
+            if self.file_stats.get(abs_path) == signature:
+                metrics.HASH_CHECKS.inc(result='skipped')
+                continue
+            if self._is_own_write(abs_path, signature):
+                continue
+            
+            hashed = self._hash_file(abs_path)
+            if hashed is None:
+                continue
+            signature, current_hash = hashed
+            previous_hash = self.file_hashes.get(abs_path)
+            if previous_hash is not None and previous_hash != current_hash:
+                changed.append(abs_path)
+            
+            if abs_path not in self.watched:
+                continue  # removed by a config reload meanwhile
+            self.file_stats[abs_path] = signature
+            self.file_hashes[abs_path] = current_hash
+        return changed
+    
+    async def _polling_loop(self):
         """Polling loop for file monitoring."""
-        while not self.stop_event.is_set():
+        while True:
             try:
-                watched_files = self.scanner.get_watched_files()
-                
-                for file_info in watched_files:
-                    if not file_info.get('exists', False):
-                        continue
-                    
-                    file_path = file_info['path']
-                    abs_path = str(Path(file_path).resolve())
-                    
-                    try:
-                        # Calculate current hash
-                        with open(file_path, 'rb') as f:
-                            current_hash = hashlib.sha256(f.read()).hexdigest()
-                        
-                        # Check if hash changed
-                        if abs_path in self.file_hashes:
-                            if self.file_hashes[abs_path] != current_hash:
-                                self.schedule_snapshot(abs_path, "File content changed")
-                        
-                        # Update stored hash
-                        self.file_hashes[abs_path] = current_hash
-                        
-                    except Exception as e:
-                        print(f"[WATCHER] Error checking file {file_path}: {e}")
-                
-                # Wait for next check
-                self.stop_event.wait(self.polling_interval)
+                signature = self._stat_signature(self.config_path)
+                if self._config_signature is None:
+                    self._config_signature = signature
+                elif signature != self._config_signature:
+                    self._config_signature = signature
+                    await self.reload_async()
                 
+                for abs_path in await self.core.run_in_io(self._poll_once):
+                    self._schedule(abs_path, "File content changed")
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                print(f"[WATCHER] Error in polling loop: {e}")
-                time.sleep(5)  # Wait before retrying
+                log.error(f"Error in polling loop: {e}")
+            
+            # Wait for next check
+            await asyncio.sleep(self.polling_interval)
+    
+    # Live configuration reload
+    
+    def _on_config_event(self, file_path: str, mask: int):
+        """Handle an event from the configuration directory (loop thread)."""
+        if file_path != self.config_path and not mask & IN_Q_OVERFLOW:
+            return
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            return  # editors replacing the file; wait for the new one
+        if self._reload_handle is not None:
+            self._reload_handle.cancel()
+        self._reload_handle = self.core.loop.call_later(self.reload_delay, self._start_reload)
+    
+    def _start_reload(self):
+        self._reload_handle = None
+        self.core.create_task(self.reload_async())
+    
+    def reload_config(self) -> dict:
+        """Re-read the configuration and apply the changes. Safe to call from any thread."""
+        return self.core.submit(self.reload_async()).result()
+    
+    async def reload_async(self) -> dict:
+        """Apply configuration changes incrementally.
+        
+        Only added and removed files are touched: unaffected files keep their
+        hash state, pending debounce timers and directory watches.
+        """
+        started = time.monotonic()
+        try:
+            scanner = await self.core.run_in_io(FileScanner, self.config_file)
+            watched = await self.core.run_in_io(self._resolve_watch_list, scanner)
+        except Exception as e:
+            log.error(f"Config reload failed, keeping previous configuration: {e}")
+            return {'success': False, 'error': str(e)}
+        
+        added = [p for p in watched if p not in self.watched]
+        removed = [p for p in self.watched if p not in watched]
+        
+        self.scanner = scanner
+        if self.context is not None:
+            self.context.set_scanner(scanner)
+        self.load_config()
+        self.queue.maxsize = max(1, self.queue_size)
+        self.queue.put_timeout = self.queue_put_timeout
+        self.rate_limiter.configure(**self.rate_limit)
+        if self.journal is not None:
+            self.journal.max_versions = max(1, self.journal_max_versions)
+        
+        for abs_path in removed:
+            for timers in (self.pending_snapshots, self.summary_snapshots):
+                handle = timers.pop(abs_path, None)
+                if handle is not None:
+                    handle.cancel()
+            self._pending_reasons.pop(abs_path, None)
+            self._summary_reasons.pop(abs_path, None)
+            self._rate_limited.discard(abs_path)
+            self._first_change.pop(abs_path, None)
+            handle = self._capture_handles.pop(abs_path, None)
+            if handle is not None:
+                handle.cancel()
+            self.rate_limiter.forget(abs_path)
+            self.queue.discard(abs_path)
+            self.file_stats.pop(abs_path, None)
+            self.file_hashes.pop(abs_path, None)
+            self.state.discard(abs_path)
+            self._unwatch_file(abs_path)
+            log.info(f"Stopped monitoring {self.watched[abs_path]}")
+        
+        self.watched = watched
+        if self.journal is not None and removed:
+            await self.core.run_in_io(lambda: [self.journal.discard(abs_path) for abs_path in removed])
+        
+        for abs_path in added:
+            self._watch_file(abs_path)
+            log.info(f"Started monitoring {watched[abs_path]}")
+            if os.path.exists(abs_path):
+                self._schedule(abs_path, "Added to configuration")
+        
+        self.config_reloads += 1
+        self.last_reload = {
+            'success': True,
+            'added': len(added),
+            'removed': len(removed),
+            'duration_ms': round((time.monotonic() - started) * 1000, 2),
+            'time': datetime.now().isoformat(),
+        }
+        log.info(f"Configuration reloaded: {len(added)} added, {len(removed)} removed")
+        return self.last_reload
+    
+    # Control commands
+    
+    def rescan(self) -> dict:
+        """Re-check all monitored files. Safe to call from any thread."""
+        return self.core.submit(self.rescan_async()).result()
+    
+    async def rescan_async(self) -> dict:
+        """Re-check all monitored files and snapshot those that drifted.
+        
+        Files whose stat matches the checkpoint are not read, so this is cheap
+        enough to run after events may have been lost.
+        """
+        result = await self._reconcile_async("Detected by rescan")
+        if result['success']:
+            log.info(f"Rescan: {result['rehashed']} re-hashed, {result['drifted']} snapshotted")
+        return result
+    
+    def flush(self, timeout: float = 30) -> dict:
+        """Take all pending snapshots now. Safe to call from any thread."""
+        return self.core.submit(self.flush_async(timeout)).result()
+    
+    async def flush_async(self, timeout: float = 30) -> dict:
+        """Take pending (debounced or rate-limited) snapshots now and wait for them."""
+        started = time.monotonic()
+        flushed = 0
+        for abs_path in list(self.pending_snapshots):
+            self.pending_snapshots[abs_path].cancel()
+            self._enqueue_snapshot(abs_path, self._pending_reasons.get(abs_path, "Flush requested"))
+            flushed += 1
+        for abs_path in list(self.summary_snapshots):
+            self.summary_snapshots[abs_path].cancel()
+            self._summary_snapshot(abs_path, self._summary_reasons.get(abs_path, "Flush requested"))
+            flushed += 1
+        
+        if self._put_tasks:
+            await asyncio.wait(list(self._put_tasks), timeout=timeout)
+        idle = await self.queue.wait_idle(max(0.0, timeout - (time.monotonic() - started)))
+        
+        # Persist the state as well
+        if self._checkpoint_handle is not None:
+            self._checkpoint_handle.cancel()
+            self._checkpoint_handle = None
+        await self._checkpoint_async()
+        
+        return {
+            'flushed': flushed,
+            'idle': idle,
+            'duration_ms': round((time.monotonic() - started) * 1000, 2),
+        }
+    
+    def metrics(self) -> Dict[str, float]:
+        """Flat numeric counters for monitoring."""
+        queue = self.queue.stats()
+        core = self.core.stats()
+        rate_limit = self.rate_limiter.stats()
+        metrics = {f'queue_{name}': value for name, value in queue.items()}
+        metrics.update({
+            'uptime_seconds': round(time.time() - self.started_at, 1) if self.started_at else 0,
+            'monitored_files': len(self.watched),
+            'watched_directories': len(self.watched_dirs),
+            'pending_snapshots': len(self.pending_snapshots),
+            'events_received': core['events_received'],
+            'threads': core['threads'],
+            'config_reloads': self.config_reloads,
+            'echoes_suppressed': self.echoes_suppressed,
+            'rate_limited_files': rate_limit['limited_files'],
+            'damped_files': len(rate_limit['damped_files']),
+            'deferred_changes': rate_limit['deferred_changes'],
+            'summary_snapshots': rate_limit['summary_snapshots'],
+            'state_checkpoints': self.state.checkpoints,
+        })
+        if self.journal is not None:
+            journal = self.journal.stats()
+            metrics.update({f'journal_{name}': journal[name]
+                            for name in ('pending_versions', 'captured', 'committed', 'dropped', 'syncs')})
+        return metrics
+    
+    # Lifecycle
     
     def start(self, use_watchdog: bool = True):
-        """Start file monitoring."""
+        """Start file monitoring.
+        
+        ``use_watchdog`` selects event-driven monitoring (inotify, or watchdog
+        where inotify is unavailable); otherwise files are polled.
+        """
         if self.is_running:
-            print("[WATCHER] Already running")
+            log.warning("Already running")
             return
         
-        self.is_running = True
-        self.stop_event.clear()
+        if self.owns_core:
+            self.core.start()
         
         try:
-            if use_watchdog and WATCHDOG_AVAILABLE:
-                self.start_watchdog_monitoring()
-            else:
-                if use_watchdog:
-                    print("[WATCHER] Watchdog not available, falling back to polling")
-                self.start_polling_monitoring()
+            self.core.submit(self._start_async(use_watchdog)).result()
+            self.is_running = True
+            self.started_at = time.time()
         except Exception as e:
-            print(f"[WATCHER] Failed to start monitoring: {e}")
-            self.is_running = False
+            log.error(f"Failed to start monitoring: {e}")
+            if self.owns_core:
+                self.core.stop()
             raise
     
+    async def _start_async(self, use_watchdog: bool):
+        self.state.load()
+        if self.journal is not None:
+            await self.core.run_in_io(self.journal.open)
+        self.queue.start()
+        if not (use_watchdog and self._start_event_monitoring()):
+            if use_watchdog:
+                log.warning("Event monitoring not available, falling back to polling")
+            self._start_polling_monitoring()
+        self.core.create_task(self._startup_reconcile())
+    
     def stop(self):
         """Stop file monitoring."""
         if not self.is_running:
-            print("[WATCHER] Not running")
+            log.warning("Not running")
             return
         
-        print("[WATCHER] Stopping file monitoring...")
-        
-        # Stop observer
-        if self.observer:
-            self.observer.stop()
-            self.observer.join()
-            self.observer = None
+        log.info("Stopping file monitoring...")
+        try:
+            self.core.submit(self._stop_async()).result(timeout=10)
+        except Exception as e:
+            log.error(f"Error while stopping: {e}")
         
-        # Stop polling thread
-        self.stop_event.set()
-        if self.polling_thread:
-            self.polling_thread.join(timeout=5)
-            self.polling_thread = None
+        if self.owns_core:
+            self.core.stop()
         
+        self.is_running = False
+        log.info("File monitoring stopped")
+    
+    async def _stop_async(self):
         # Cancel pending snapshots
-        for timer in self.pending_snapshots.values():
-            timer.cancel()
+        for handle in self.pending_snapshots.values():
+            handle.cancel()
         self.pending_snapshots.clear()
+        for handle in self.summary_snapshots.values():
+            handle.cancel()
+        self.summary_snapshots.clear()
+        self._pending_reasons.clear()
+        self._summary_reasons.clear()
+        self._rate_limited.clear()
+        self._first_change.clear()
+        for handle in self._capture_handles.values():
+            handle.cancel()
+        self._capture_handles.clear()
+        self._recapture.clear()
+        if self._journal_sync_handle is not None:
+            self._journal_sync_handle.cancel()
+            self._journal_sync_handle = None
+        for task in list(self._put_tasks):
+            task.cancel()
         
-        self.is_running = False
-        print("[WATCHER] File monitoring stopped")
+        if self._polling_task:
+            self._polling_task.cancel()
+            self._polling_task = None
+        if self._reload_handle is not None:
+            self._reload_handle.cancel()
+            self._reload_handle = None
+        
+        for dir_path in self.watched_dirs:
+            self.core.unwatch_directory(dir_path, self._on_directory_event)
+        self.watched_dirs.clear()
+        self._dir_refs.clear()
+        if self._config_dir_watched:
+            self.core.unwatch_directory(os.path.dirname(self.config_path), self._on_config_event)
+            self._config_dir_watched = False
+        
+        self.queue.stop()
+        
+        # Final checkpoint
+        if self._checkpoint_handle is not None:
+            self._checkpoint_handle.cancel()
+            self._checkpoint_handle = None
+        await self._checkpoint_async()
+        
+        # Uncommitted captures stay in the journal for the next start
+        if self.journal is not None:
+            try:
+                await self.core.run_in_io(self.journal.close)
+            except Exception as e:
+                log.warning(f"Failed to close capture journal: {e}")
     
     def status(self) -> dict:
         """Get monitoring status."""
-        watched_files = self.scanner.get_watched_files()
-        monitored_count = sum(1 for f in watched_files if f.get('exists', False))
+        monitored_count = sum(1 for abs_path in self.watched if os.path.exists(abs_path))
         
         return {
             'running': self.is_running,
-            'mode': 'watchdog' if (self.observer and WATCHDOG_AVAILABLE) else 'polling',
+            'mode': self.mode or 'stopped',
             'monitored_files': monitored_count,
+            'watched_directories': len(self.watched_dirs),
             'pending_snapshots': len(self.pending_snapshots),
             'watchdog_available': WATCHDOG_AVAILABLE,
-        } 
\ No newline at end of file
+            'inotify_available': INOTIFY_AVAILABLE,
+            'queue': self.queue.stats(),
+            'core': self.core.stats(),
+            'config_reloads': self.config_reloads,
+            'last_reload': self.last_reload,
+            'state_file': self.state.state_file,
+            'last_reconcile': self.last_reconcile,
+            'echoes_suppressed': self.echoes_suppressed,
+            'rate_limit': dict(self.rate_limiter.stats(), pending_summaries=len(self.summary_snapshots)),
+            'journal': self.journal.stats() if self.journal is not None else None,
+        }
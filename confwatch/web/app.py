@@ -4,19 +4,26 @@ Flask web application for ConfWatch.
 
 import os
 import json
-from pathlib import Path
-from flask import Flask, render_template, request, jsonify, send_from_directory, session, redirect, url_for
+import itertools
+import threading
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, abort
 from ..core.scanner import FileScanner
-from ..core.storage import GitStorage
 from ..core.auth import AuthManager
+from ..core.expected_writes import ExpectedWrites
+from ..core.context import AppContext
+from ..core.diff import DiffViewer
+from ..core.profiles import default_home
+from ..core import diffalgo, metrics
+from . import http_cache
+from .events import EventHub, TooManyStreams
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 import confwatch
 
 app = Flask(__name__)
 
-# Configuration
-CONFWATCH_HOME = os.path.expanduser("~/.confwatch")
+# Configuration ($CONFWATCH_HOME or ~/.confwatch, see set_home)
+CONFWATCH_HOME = default_home()
 CONFIG_FILE = os.path.join(CONFWATCH_HOME, "config", "config.yml")
 REPO_DIR = os.path.join(CONFWATCH_HOME, "repo")
 WEB_DIR = os.path.join(CONFWATCH_HOME, "web")
@@ -27,12 +34,103 @@ app.secret_key = os.urandom(24)
 # Initialize auth manager
 auth_manager = AuthManager(CONFIG_FILE)
 
+# Static files of the UI, compressed once per version
+_assets = http_cache.StaticAssets(WEB_DIR)
+
+def set_home(home: str):
+    """Serve another ConfWatch home (config, repository and password)."""
+    global CONFWATCH_HOME, CONFIG_FILE, REPO_DIR, WEB_DIR, auth_manager, _assets, _app_context, _event_hub
+    CONFWATCH_HOME = home
+    CONFIG_FILE = os.path.join(home, "config", "config.yml")
+    REPO_DIR = os.path.join(home, "repo")
+    WEB_DIR = os.path.join(home, "web")
+    auth_manager = AuthManager(CONFIG_FILE)
+    _assets = http_cache.StaticAssets(WEB_DIR)
+    _app_context = None
+    _event_hub = None
+
+# Shared context when running inside the daemon process (see set_context)
+_shared_context = None
+
+# Context of a standalone web server, created on first use and kept for the
+# process lifetime; it notices config and HEAD changes by itself
+_app_context = None
+_app_context_lock = threading.Lock()
+
+def set_context(context):
+    """Share the daemon's AppContext (repo handle, config, caches) with the web UI."""
+    global _shared_context
+    _shared_context = context
+
+def _context() -> AppContext:
+    """The daemon's shared context, or this server's long-lived one."""
+    global _app_context
+    if _shared_context is not None:
+        return _shared_context
+    if _app_context is None:
+        with _app_context_lock:
+            if _app_context is None:
+                _app_context = AppContext(CONFIG_FILE, REPO_DIR)
+    return _app_context
+
+# Event stream source of this process, created with the first stream
+_event_hub = None
+
+def _events() -> EventHub:
+    global _event_hub
+    if _event_hub is None:
+        context = _context()  # takes _app_context_lock itself on first use
+        with _app_context_lock:
+            if _event_hub is None:
+                settings = context.scanner().get_settings('web')
+                _event_hub = EventHub(_context, max_streams=int(settings.get('event_streams', 32)))
+    return _event_hub
+
+def close_event_streams():
+    """End the open event streams of this process (clients reconnect)."""
+    if _event_hub is not None:
+        _event_hub.close()
+
+def _wake_events():
+    """Publish a commit made by this process without waiting for the next poll."""
+    if _event_hub is not None:
+        _event_hub.wake()
+
+def _compression() -> bool:
+    """Whether responses are compressed (``compression`` in the ``web:`` section)."""
+    try:
+        return bool(_context().scanner().get_settings('web').get('compression', True))
+    except Exception:
+        return False
+
+def _static(filename):
+    """Serve a file of the web UI, pre-compressed and with cache validators."""
+    response = _assets.response(filename, compression=_compression())
+    if response is None:
+        abort(404)
+    return response
+
+@app.after_request
+def compress(response):
+    """Compress buffered responses for clients that accept it."""
+    if response.status_code != 200 or response.direct_passthrough or not _compression():
+        return response
+    return http_cache.compress_response(response, _context().responses)
+
 def require_auth(f):
     """Decorator to require authentication for routes."""
     def decorated_function(*args, **kwargs):
         # Check if authentication is enabled
         if not auth_manager.is_authenticated():
-            return send_from_directory(WEB_DIR, 'index.html')
+            return _static('index.html')
+        
+        # Scripts authenticate with an API token instead of a session
+        authorization = request.headers.get('Authorization', '')
+        if authorization:
+            scheme, _, token = authorization.partition(' ')
+            if scheme.lower() != 'bearer' or not auth_manager.verify_token(token.strip()):
+                return jsonify({'error': 'Invalid API token'}), 401, {'WWW-Authenticate': 'Bearer'}
+            return f(*args, **kwargs)
         
         # Check if user is authenticated
         if not session.get('authenticated'):
@@ -46,18 +144,18 @@ def require_auth(f):
 @require_auth
 def index():
     """Serve the main web interface."""
-    return send_from_directory(WEB_DIR, 'index.html')
+    return _static('index.html')
 
 @app.route('/login')
 def login():
     """Serve the login page."""
     if session.get('authenticated'):
         return redirect(url_for('index'))
-    return send_from_directory(WEB_DIR, 'login.html')
+    return _static('login.html')
 
 @app.route('/<path:filename>')
 def static_files(filename):
-    return send_from_directory(WEB_DIR, filename)
+    return _static(filename)
 
 @app.route('/api/auth/login', methods=['POST'])
 def api_login():
@@ -105,19 +203,18 @@ def api_rollback():
             return jsonify({'success': False, 'error': 'Missing file path or commit hash'})
         
         # Валидация пути - проверяем, что файл находится в разрешенных директориях
-        scanner = FileScanner(CONFIG_FILE)
-        expanded_path = scanner.expand_path(file_path)
+        context = _context()
+        expanded_path = context.resolve(file_path)
         
         # Проверяем, что файл существует и находится в разрешенных директориях
         if not os.path.exists(expanded_path):
             return jsonify({'success': False, 'error': f'File not found: {file_path}'})
         
         # Получаем абсолютный путь для корректной работы с storage
-        abs_path = str(Path(file_path).expanduser().resolve())
+        abs_path = expanded_path
         
         # Выполняем rollback
-        storage = GitStorage(REPO_DIR)
-        history = storage.get_file_history(abs_path)
+        history = context.get_file_history(abs_path)
         
         if not history:
             return jsonify({'success': False, 'error': f'No history found for {file_path}'})
@@ -134,26 +231,23 @@ def api_rollback():
             else:
                 return jsonify({'success': False, 'error': f'Commit {commit_hash[:8]} not found in history'})
         
-        # Получаем safe_name для файла используя абсолютный путь
-        safe_name = storage._safe_name(abs_path)
-        
         try:
             # Получаем содержимое файла из git по нужному коммиту
-            file_content = storage.repo.git.show(f"{commit_hash}:{safe_name}")
+            file_content = context.show_file(commit_hash, abs_path)
         except Exception as e:
             return jsonify({'success': False, 'error': f'Failed to retrieve file content from commit {commit_hash[:8]}: {str(e)}'})
         
         # Перезаписываем отслеживаемый файл этим содержимым с правильной кодировкой
         try:
-            with open(expanded_path, 'w', encoding='utf-8') as f:
-                f.write(file_content)
+            ExpectedWrites(CONFWATCH_HOME).write_file(expanded_path, file_content)
         except Exception as e:
             return jsonify({'success': False, 'error': f'Failed to write file {file_path}: {str(e)}'})
         
         # Создаём снапшот с комментарием используя абсолютный путь
         rollback_comment = f"Rollback from commit {commit_hash[:8]}"
-        if not storage.save_file(abs_path, file_content, comment=rollback_comment, force=True):
+        if not context.save_file(abs_path, file_content, comment=rollback_comment, force=True):
             return jsonify({'success': False, 'error': 'Failed to create rollback snapshot'})
+        _wake_events()
         
         return jsonify({
             'success': True, 
@@ -166,32 +260,41 @@ def api_rollback():
 @app.route('/api/files')
 @require_auth
 def get_files():
-    """Get list of monitored files."""
+    """Get list of monitored files with a summary of their history."""
     try:
-        scanner = FileScanner(CONFIG_FILE)
-        files = scanner.get_watched_files()
+        context = _context()
+        files = [(original_path, abs_path, os.path.exists(abs_path))
+                 for original_path, abs_path in context.watched_files()]
+        
+        # The list only changes with the config, HEAD or a file appearing or vanishing
+        etag = http_cache.make_etag(('files', context.config_version(), context.head(),
+                                     tuple(exists for _, _, exists in files)))
+        cached = http_cache.not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        # One log walk per HEAD for all files, instead of one history per file
+        summaries = context.file_summaries()
         
         result = []
-        for file_info in files:
-            # Check if file has history
-            has_history = False
-            history_count = 0
-            abs_path = str(Path(file_info['original_path']).expanduser().resolve())
-            if file_info['exists']:
-                storage = GitStorage(REPO_DIR)
-                history = storage.get_file_history(abs_path)
-                history_count = len(history)
-                has_history = history_count > 0
+        for original_path, abs_path, exists in files:
+            summary = summaries.get(abs_path) if exists else None
+            history_count = summary['count'] if summary else 0
             
             result.append({
-                'name': file_info['original_path'],
+                'name': original_path,
                 'abs_path': abs_path,
-                'exists': file_info['exists'],
-                'has_history': has_history,
-                'history_count': history_count
+                'exists': exists,
+                'has_history': history_count > 0,
+                'history_count': history_count,
+                'last_commit': summary['last_commit'] if summary else None,
+                'last_change': summary['last_change'] if summary else None,
+                'last_auto': summary['last_auto'] if summary else None,
+                'last_auto_change': summary['last_auto_change'] if summary else None,
+                'last_manual_change': summary['last_manual_change'] if summary else None,
             })
         
-        return jsonify({'files': result})
+        return http_cache.tag(jsonify({'files': result}), etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -203,25 +306,23 @@ def get_diff():
         if not file_path:
             return jsonify({'error': 'File parameter required'}), 400
         
-        scanner = FileScanner(CONFIG_FILE)
-        expanded_path = scanner.expand_path(file_path)
+        context = _context()
+        expanded_path = context.resolve(file_path)
         
         if not os.path.exists(expanded_path):
             return jsonify({'error': 'File not found'}), 404
         
         # Получаем абсолютный путь для корректной работы с storage
-        abs_path = str(Path(file_path).expanduser().resolve())
+        abs_path = expanded_path
         
-        # Читаем текущее содержимое файла с правильной кодировкой
         try:
-            with open(expanded_path, 'r', encoding='utf-8') as f:
-                current_content = f.read()
-        except Exception as e:
-            return jsonify({'error': f'Failed to read file: {str(e)}'}), 500
+            offset, limit = _window()
+            algorithm = _algorithm()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        storage = GitStorage(REPO_DIR)
-        # История по абсолютному пути
-        history = storage.get_file_history(abs_path)
+        # Cached per HEAD, so repeated diffs do not walk the log again
+        history = context.get_file_history(abs_path)
         
         if not history:
             return jsonify({'error': 'No history found'}), 404
@@ -232,15 +333,100 @@ def get_diff():
         prev_commit = history[1]['hash']
         curr_commit = history[0]['hash']
         
+        key = context.diff_key(abs_path, prev_commit, curr_commit, algorithm=algorithm)
+        if key is not None:
+            key += (offset, limit)
+            cached = http_cache.not_modified(http_cache.make_etag(key))
+            if cached is not None:
+                return cached
+        
         try:
-            diff = storage.get_file_diff(abs_path, prev_commit, curr_commit)
-            return diff, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+            diff = context.iter_file_diff(abs_path, prev_commit, curr_commit, algorithm=algorithm)
+            return _diff_response(diff, key, offset, limit)
         except Exception as e:
             return jsonify({'error': f'Failed to generate diff: {str(e)}'}), 500
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Streamed bodies are sent in pieces of about this size
+STREAM_CHUNK = 64 * 1024
+
+def _window(params=None):
+    """``offset`` and ``limit`` query parameters, or the same keys of ``params`` (limit None = all)."""
+    if params is None:
+        params = request.args
+    values = []
+    for name in ('offset', 'limit'):
+        value = params.get(name)
+        if value is None or value == '':
+            values.append(None)
+            continue
+        try:
+            number = int(value)
+        except ValueError:
+            raise ValueError(f'{name} must be an integer')
+        if number < 0:
+            raise ValueError(f'{name} must not be negative')
+        values.append(number)
+    return values[0] or 0, values[1]
+
+def _algorithm(params=None):
+    """The ``algorithm`` parameter resolved to a diff algorithm name (default: the configured one)."""
+    if params is None:
+        params = request.args
+    return diffalgo.resolve(params.get('algorithm') or None)
+
+def _batched(pieces):
+    """Join small pieces (str or bytes) into chunks of about STREAM_CHUNK bytes."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        if isinstance(piece, str):
+            piece = piece.encode('utf-8')
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+def _lines(chunks, offset: int, limit=None):
+    """Lines ``offset`` to ``offset + limit`` of a chunked body.
+    
+    Stops reading (and closes ``chunks``, ending ``git diff``) once the
+    window is complete.
+    """
+    try:
+        number = 0
+        rest = b''
+        for chunk in chunks:
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            for line in lines:
+                if limit is not None and number >= offset + limit:
+                    return
+                if number >= offset:
+                    yield line + b'\n'
+                number += 1
+        if rest and number >= offset and (limit is None or number < offset + limit):
+            yield rest
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+def _diff_response(diff, key, offset: int = 0, limit=None):
+    """Plain-text diff streamed from chunks, tagged with the blob pair it compares."""
+    if offset or limit is not None:
+        diff = _batched(_lines(diff, offset, limit))
+    response = app.response_class(diff, status=200, content_type='text/plain; charset=utf-8')
+    if key is not None:
+        http_cache.tag(response, http_cache.make_etag(key))
+    return response
+
 @app.route('/api/history')
 @require_auth
 def get_history():
@@ -250,15 +436,70 @@ def get_history():
             return jsonify({'error': 'File parameter required'}), 400
         
         # Получаем абсолютный путь для корректной работы с storage
-        abs_path = str(Path(file_path).expanduser().resolve())
-        
-        storage = GitStorage(REPO_DIR)
-        history = storage.get_file_history(abs_path)
+        context = _context()
+        abs_path = context.resolve(file_path)
         
-        if not history:
-            return jsonify({'error': 'No history found'}), 404
+        try:
+            offset, limit = _window()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        fmt = 'ndjson' if request.args.get('format') == 'ndjson' else 'json'
+        mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+        
+        # A file's history only changes when HEAD moves
+        key = ('history', fmt, offset, limit, context.safe_name(abs_path), context.head())
+        etag = http_cache.make_etag(key)
+        cached = http_cache.not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        body = context.responses.get(key)
+        if body is None:
+            records = context.iter_file_history(abs_path, offset, limit)
+            first = next(records, None)
+            if first is None and not offset:
+                return jsonify({'error': 'No history found'}), 404
+            
+            records = itertools.chain([first], records) if first is not None else iter(())
+            body = context.responses.tee(key, _batched(_json_items(records, fmt, 'history')))
         
-        return jsonify({'history': history}), 200
+        return http_cache.tag(app.response_class(body, status=200, mimetype=mimetype), etag)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _json_items(items, fmt: str, field: str):
+    """Items as ``{field: [...]}`` or as NDJSON, serialised one at a time."""
+    if fmt == 'ndjson':
+        for item in items:
+            yield app.json.dumps(item) + '\n'
+        return
+    yield '{"%s":[' % field
+    for i, item in enumerate(items):
+        yield (',' if i else '') + app.json.dumps(item)
+    yield ']}'
+
+@app.route('/api/content')
+@require_auth
+def get_content():
+    """A stored version of a file, streamed from the repository."""
+    try:
+        file_path = request.args.get('file')
+        commit = request.args.get('commit')
+        if not file_path or not commit:
+            return jsonify({'error': 'file, commit parameters required'}), 400
+        context = _context()
+        abs_path = context.resolve(file_path)
+        key = context.content_key(abs_path, commit)
+        if key is None:
+            return jsonify({'error': f'No version of {file_path} in {commit[:8]}'}), 404
+        # Blobs never change, so the blob id alone identifies the body
+        etag = http_cache.make_etag(key)
+        cached = http_cache.not_modified(etag)
+        if cached is not None:
+            return cached
+        content = context.iter_file_content(commit, abs_path)
+        response = app.response_class(content, status=200, content_type='text/plain; charset=utf-8')
+        return http_cache.tag(response, etag)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -274,9 +515,9 @@ def create_snapshot():
         if not file_path:
             return jsonify({'success': False, 'error': 'File parameter required'}), 400
         
-        scanner = FileScanner(CONFIG_FILE)
-        expanded_path = scanner.expand_path(file_path)
-        abs_path = str(Path(file_path).expanduser().resolve())
+        context = _context()
+        expanded_path = context.resolve(file_path)
+        abs_path = expanded_path
         
         if not os.path.exists(expanded_path):
             return jsonify({'success': False, 'error': f'File not found: {file_path}'}), 400
@@ -288,8 +529,8 @@ def create_snapshot():
         except Exception as e:
             return jsonify({'success': False, 'error': f'Failed to read file: {str(e)}'}), 500
         
-        storage = GitStorage(REPO_DIR)
-        if storage.save_file(abs_path, content, comment=comment, force=force):
+        if context.save_file(abs_path, content, comment=comment, force=force):
+            _wake_events()
             return jsonify({'success': True, 'message': f'Snapshot created for {abs_path}'})
         else:
             return jsonify({'success': True, 'message': f'No changes detected in {abs_path}'})
@@ -305,19 +546,270 @@ def get_diff_between():
         to_hash = request.args.get('to')
         if not file_path or not from_hash or not to_hash:
             return jsonify({'error': 'file, from, to parameters required'}), 400
-        storage = GitStorage(REPO_DIR)
-        diff = storage.get_file_diff(file_path, from_hash, to_hash)
-        return diff, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+        try:
+            offset, limit = _window()
+            algorithm = _algorithm()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        context = _context()
+        abs_path = context.resolve(file_path)
+        key = context.diff_key(abs_path, from_hash, to_hash, algorithm=algorithm)
+        if key is not None:
+            key += (offset, limit)
+            cached = http_cache.not_modified(http_cache.make_etag(key))
+            if cached is not None:
+                return cached
+        diff = context.iter_file_diff(abs_path, from_hash, to_hash, algorithm=algorithm)
+        return _diff_response(diff, key, offset, limit)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/side_by_side')
+@require_auth
+def get_side_by_side():
+    """Side-by-side diff rows, with folded context and intra-line changes.
+    
+    Compares ``from`` and ``to`` (default: the two latest snapshots).
+    ``context`` keeps that many unchanged lines around changes, ``inline=0``
+    turns off intra-line ranges, ``format=ndjson`` sends one row per line,
+    ``algorithm`` picks the line matching algorithm.
+    """
+    try:
+        file_path = request.args.get('file')
+        if not file_path:
+            return jsonify({'error': 'File parameter required'}), 400
+        try:
+            context_lines = request.args.get('context', '')
+            context_lines = int(context_lines) if context_lines else None
+            if context_lines is not None and context_lines < 0:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': 'context must be a non-negative integer'}), 400
+        inline = request.args.get('inline', '1') not in ('0', 'false', 'no')
+        try:
+            algorithm = _algorithm()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        fmt = 'ndjson' if request.args.get('format') == 'ndjson' else 'json'
+        
+        context = _context()
+        abs_path = context.resolve(file_path)
+        from_hash = request.args.get('from')
+        to_hash = request.args.get('to')
+        if not from_hash or not to_hash:
+            history = context.get_file_history(abs_path)
+            if len(history) < 2:
+                return jsonify({'error': 'No previous version found'}), 404
+            from_hash, to_hash = history[1]['hash'], history[0]['hash']
+        
+        key = context.diff_key(abs_path, from_hash, to_hash, 'side_by_side', algorithm)
+        if key is None:
+            return jsonify({'error': 'Version not found'}), 404
+        key += (context_lines, inline, fmt)
+        etag = http_cache.make_etag(key)
+        cached = http_cache.not_modified(etag)
+        if cached is not None:
+            return cached
+        
+        body = context.responses.get(key)
+        if body is None:
+            old = b''.join(context.iter_file_content(from_hash, abs_path)).decode('utf-8', 'replace')
+            new = b''.join(context.iter_file_content(to_hash, abs_path)).decode('utf-8', 'replace')
+            rows = DiffViewer.iter_side_by_side(old, new, context=context_lines, inline=inline,
+                                                algorithm=algorithm)
+            body = context.responses.tee(key, _batched(_json_items(rows, fmt, 'rows')))
+        mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+        return http_cache.tag(app.response_class(body, status=200, mimetype=mimetype), etag)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search')
+@require_auth
+def api_search():
+    """Snapshots containing a text: which files, since and until which commit."""
+    try:
+        query = request.args.get('q', '')
+        if not query:
+            return jsonify({'error': 'q parameter required'}), 400
+        try:
+            offset, limit = _window()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        context = _context()
+        found = context.search(query, request.args.get('file') or None, offset, 20 if limit is None else limit)
+        return jsonify(found)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# Entries accepted in one /api/batch request
+MAX_BATCH = 1000
+
+@app.route('/api/batch', methods=['POST'])
+@require_auth
+def api_batch():
+    """Run many history, diff and content reads in one request.
+    
+    The body is ``{"requests": [{"file": ..., "op": ..., "params": {...}}]}``
+    with ``op`` one of ``history``, ``diff``, ``diff_between`` and
+    ``content``. Results are streamed back as NDJSON, one line per entry, in
+    the order of the requests.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('requests')
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        return jsonify({'error': 'requests list required'}), 400
+    if len(entries) > MAX_BATCH:
+        return jsonify({'error': f'At most {MAX_BATCH} requests per batch'}), 400
+    try:
+        body = _batch_results(_context(), entries)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return app.response_class(_batched(body), mimetype='application/x-ndjson')
+
+class _BatchError(Exception):
+    """An entry of a batch that cannot be served; ``status`` is its HTTP equivalent."""
+    
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def _batch_results(context: AppContext, entries):
+    """NDJSON lines with the result of each batch entry."""
+    # Histories of every file that needs one, read in one walk on first use
+    history_files = [entry.get('file') for entry in entries
+                     if entry.get('op') in ('history', 'diff') and isinstance(entry.get('file'), str)]
+    histories = None
+    for index, entry in enumerate(entries):
+        file_path = entry.get('file')
+        op = entry.get('op')
+        line = {'index': index, 'file': file_path, 'op': op}
+        try:
+            if not isinstance(file_path, str) or not file_path:
+                raise _BatchError(400, 'File parameter required')
+            if op in ('history', 'diff') and histories is None:
+                histories = context.get_file_histories([context.resolve(f) for f in history_files])
+            result = _batch_entry(context, op, context.resolve(file_path), entry.get('params') or {}, histories)
+            line.update(status=200, result=result)
+        except _BatchError as e:
+            line.update(status=e.status, error=str(e))
+        except Exception as e:
+            line.update(status=500, error=str(e))
+        yield app.json.dumps(line) + '\n'
+
+def _batch_entry(context: AppContext, op, abs_path: str, params: dict, histories):
+    """Result of one batch entry; mirrors the corresponding GET endpoint."""
+    if not isinstance(params, dict):
+        raise _BatchError(400, 'params must be an object')
+    try:
+        offset, limit = _window(params)
+        algorithm = _algorithm(params)
+    except ValueError as e:
+        raise _BatchError(400, str(e))
+    
+    if op == 'history':
+        history = histories.get(abs_path, [])
+        if not history and not offset:
+            raise _BatchError(404, 'No history found')
+        return history[offset:] if limit is None else history[offset:offset + limit]
+    
+    if op == 'diff':
+        if not os.path.exists(abs_path):
+            raise _BatchError(404, 'File not found')
+        history = histories.get(abs_path, [])
+        if not history:
+            raise _BatchError(404, 'No history found')
+        if len(history) < 2:
+            raise _BatchError(404, 'No previous version found')
+        return _batch_diff(context, abs_path, history[1]['hash'], history[0]['hash'], offset, limit, algorithm)
+    
+    if op == 'diff_between':
+        from_hash = params.get('from')
+        to_hash = params.get('to')
+        if not from_hash or not to_hash:
+            raise _BatchError(400, 'from, to parameters required')
+        return _batch_diff(context, abs_path, from_hash, to_hash, offset, limit, algorithm)
+    
+    if op == 'content':
+        commit = params.get('commit')
+        if not commit:
+            raise _BatchError(400, 'commit parameter required')
+        if context.content_key(abs_path, commit) is None:
+            raise _BatchError(404, f'No version of {abs_path} in {commit[:8]}')
+        return b''.join(context.iter_file_content(commit, abs_path)).decode('utf-8', 'replace')
+    
+    raise _BatchError(400, f'Unknown op: {op}')
+
+def _batch_diff(context: AppContext, abs_path: str, version1: str, version2: str, offset: int, limit,
+                algorithm: str):
+    chunks = context.iter_file_diff(abs_path, version1, version2, algorithm=algorithm)
+    if offset or limit is not None:
+        chunks = _lines(chunks, offset, limit)
+    return b''.join(chunks).decode('utf-8', 'replace')
+
+@app.route('/api/events')
+@require_auth
+def api_events():
+    """Server-sent events: snapshots, rollbacks and file status changes."""
+    if request.method == 'HEAD':
+        # Flask answers HEAD for every GET route; a stream has no headers worth probing
+        return jsonify({'error': 'Method not allowed'}), 405, {'Allow': 'GET'}
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    # Under the pre-forking server every stream holds one of a fixed number
+    # of threads: keep one free for other requests, and end the streams when
+    # the worker retires so it can drain
+    server = request.environ.get('confwatch.server')
+    limit = None
+    try:
+        hub = _events()
+        if server is not None:
+            limit = server.threads - 1
+            server.add_shutdown_hook(hub.close)
+        stream = hub.stream(last_event_id, limit)
+    except TooManyStreams:
+        return jsonify({'error': 'Too many event streams'}), 503, {'Retry-After': '30'}
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return app.response_class(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # nginx: do not buffer the stream
+    })
+
 @app.route('/api/version')
 def api_version():
     return jsonify({"version": confwatch.__version__})
 
-def run_web_server(host='0.0.0.0', port=5000, debug=False):
-    """Run the web server."""
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus metrics; no session, scrapers cannot log in. 404 while disabled."""
+    if not metrics.is_enabled():
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return app.response_class(metrics.render(), mimetype=None, content_type=metrics.CONTENT_TYPE)
+
+def run_web_server(host='0.0.0.0', port=5000, debug=False, workers=0, threads=4, timeout=60,
+                   max_requests=0, notifier=None):
+    """Run the web server.
+    
+    With ``workers`` > 0 (and not in debug mode) requests are served by a
+    pre-forking server (see ``web.server``); otherwise by Flask's development
+    server.
+    """
+    try:
+        # Not through _context(): workers must not inherit a repository handle
+        metrics.configure(FileScanner(CONFIG_FILE))
+    except Exception as e:
+        print(f"Metrics disabled: {e}")
+    try:
+        diffalgo.configure(FileScanner(CONFIG_FILE))
+    except Exception as e:
+        print(f"Using the {diffalgo.DEFAULT_ALGORITHM} diff algorithm: {e}")
+    if workers > 0 and not debug:
+        from .server import PreforkServer
+        PreforkServer(app, host, port, workers=workers, threads=threads, timeout=timeout,
+                      max_requests=max_requests, notifier=notifier).serve()
+        return
     print(f"Starting ConfWatch web server on http://{host}:{port}")
+    if notifier:
+        notifier.ready(f"Serving on {host}:{port}")
     app.run(host=host, port=port, debug=debug)
 
 if __name__ == '__main__':
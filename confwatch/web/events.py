@@ -0,0 +1,260 @@
+"""
+Server-sent events for the web UI.
+
+``/api/events`` streams what changes in the repository and on disk:
+
+- ``snapshot`` and ``rollback``: a commit, with the watched files it changed;
+  the event id is the commit hash;
+- ``status``: watched files that appeared, disappeared, or were added to or
+  removed from the config;
+- ``reset``: the stream cannot be resumed (history was rewritten, or the
+  client was too far behind); reload everything.
+
+Events come from the repository, not from whoever made the commit, so the
+daemon, the CLI and every web worker produce the same stream. One thread
+per process checks HEAD (a few ``stat()`` calls, see
+``AppContext.head``) while at least one client is connected, and fans the
+events out to all streams. A client that reconnects with ``Last-Event-ID``
+gets the commits it missed, from memory or from ``git log``.
+"""
+
+import json
+import os
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from ..core.log import get_logger
+
+log = get_logger('events')
+
+POLL_INTERVAL = 1.0  # seconds between HEAD checks while clients are connected
+KEEPALIVE = 15.0  # seconds between comments on an idle stream
+RETRY_MS = 3000  # reconnection delay suggested to clients
+
+
+class TooManyStreams(Exception):
+    """The per-process limit of open event streams is reached."""
+
+
+def format_event(event: Dict) -> str:
+    lines = []
+    if event.get('id'):
+        lines.append(f"id: {event['id']}")
+    lines.append(f"event: {event['event']}")
+    lines.append(f"data: {json.dumps(event['data'], separators=(',', ':'))}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class EventStream:
+    """An open event stream: iterates the events, and gives its slot back when closed.
+    
+    The WSGI server closes the response even if it never iterates it (a
+    HEAD request, a client that is gone), so the slot cannot leak.
+    """
+    
+    def __init__(self, hub: "EventHub", events: Iterator[str]):
+        self._hub = hub
+        self._events = events
+        self._closed = False
+    
+    def __iter__(self) -> Iterator[str]:
+        return self._events
+    
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._events.close()
+        finally:
+            self._hub._release()
+
+
+class EventHub:
+    """Watches the repository and the watched files, and feeds event streams."""
+    
+    def __init__(self, context: Callable, max_streams: int = 32, backlog: int = 1000,
+                 interval: float = POLL_INTERVAL):
+        """
+        Args:
+            context: Returns the current AppContext
+            max_streams: Open streams allowed in this process
+            backlog: Events kept in memory for clients that reconnect
+            interval: Seconds between checks while streams are open
+        """
+        self.context = context
+        self.max_streams = max_streams
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._wake = threading.Event()
+        self._events: "deque[Tuple[int, Dict]]" = deque(maxlen=backlog)
+        self._seq = 0
+        self._streams = 0
+        self._epoch = 0  # bumped by close() to end the open streams
+        self._head: Optional[str] = None
+        self._files: Optional[Dict[str, Tuple[str, bool]]] = None  # abs path -> (name, exists)
+        self._thread: Optional[threading.Thread] = None
+        
+        # Counters
+        self.published = 0
+        self.resumed = 0
+        self.resets = 0
+    
+    def wake(self):
+        """Check for changes now instead of at the next interval."""
+        self._wake.set()
+    
+    # Polling
+    
+    def _start(self):
+        """Take the initial state and start the poller (condition held)."""
+        if self._thread is not None:
+            return
+        self._head = self.context().head()
+        self._files = self._file_states()
+        self._thread = threading.Thread(target=self._run, name='confwatch-events', daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._streams:
+                    self._cond.wait()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.poll()
+            except Exception as e:
+                log.error(f"Event poll failed: {e}")
+    
+    def poll(self):
+        """Publish the commits and file status changes since the last check."""
+        context = self.context()
+        head = context.head()
+        events = []
+        if head != self._head:
+            commits = None
+            if self._head and head:
+                with context.lock:
+                    commits = context.storage.get_commits(self._head, head)
+            if commits is None:
+                events.append({'event': 'reset', 'data': {'head': head}})
+            else:
+                events.extend(self._commit_event(commit) for commit in commits)
+            self._head = head
+        
+        files = self._file_states()
+        changed = [
+            {'name': name, 'abs_path': abs_path, 'exists': exists, 'watched': True}
+            for abs_path, (name, exists) in files.items()
+            if self._files.get(abs_path) != (name, exists)
+        ] + [
+            {'name': name, 'abs_path': abs_path, 'exists': exists, 'watched': False}
+            for abs_path, (name, exists) in self._files.items() if abs_path not in files
+        ]
+        self._files = files
+        if changed:
+            events.append({'event': 'status', 'data': {'files': changed}})
+        if events:
+            self._publish(events)
+    
+    def _file_states(self) -> Dict[str, Tuple[str, bool]]:
+        return {abs_path: (name, os.path.exists(abs_path)) for name, abs_path in self.context().watched_files()}
+    
+    def _commit_event(self, commit: Dict) -> Dict:
+        context = self.context()
+        names = {context.safe_name(abs_path): abs_path for _, abs_path in context.watched_files()}
+        data = dict(commit)
+        data['files'] = [names[name] for name in commit['files'] if name in names]
+        kind = 'rollback' if 'Rollback from commit' in commit['message'] else 'snapshot'
+        return {'id': commit['hash'], 'event': kind, 'data': data}
+    
+    def _publish(self, events: List[Dict]):
+        with self._cond:
+            for event in events:
+                self._seq += 1
+                self._events.append((self._seq, event))
+            self.published += len(events)
+            self._cond.notify_all()
+    
+    # Streams
+    
+    def stream(self, last_event_id: Optional[str] = None, limit: Optional[int] = None) -> "EventStream":
+        """Open an event stream. Raises TooManyStreams at the limit.
+        
+        ``limit`` lowers ``max_streams`` for this call: a server with a
+        fixed thread pool passes less than its thread count, since every
+        open stream holds a thread. The stream holds its slot until it is
+        closed, whether or not it was ever iterated.
+        """
+        with self._cond:
+            allowed = self.max_streams if limit is None else min(self.max_streams, limit)
+            if self._streams >= allowed:
+                raise TooManyStreams()
+            self._start()
+            seq = self._seq
+            head = self._head
+            missed = self._missed(last_event_id, head)
+            epoch = self._epoch
+            self._streams += 1
+            self._cond.notify_all()
+        return EventStream(self, self._stream(seq, missed, epoch))
+    
+    def _release(self):
+        with self._cond:
+            self._streams -= 1
+    
+    def _missed(self, last_event_id: Optional[str], head: Optional[str]) -> List[Dict]:
+        """Events after ``last_event_id`` up to the current state (condition held)."""
+        if not last_event_id or last_event_id == head:
+            return []
+        buffered = [event for _, event in self._events]
+        ids = [event.get('id') for event in buffered]
+        if last_event_id in ids:
+            self.resumed += 1
+            return buffered[ids.index(last_event_id) + 1:]
+        context = self.context()
+        commits = None
+        if head:
+            with context.lock:
+                commits = context.storage.get_commits(last_event_id, head)
+        if commits is None:
+            self.resets += 1
+            return [{'event': 'reset', 'data': {'head': head}}]
+        self.resumed += 1
+        return [self._commit_event(commit) for commit in commits]
+    
+    def close(self):
+        """End the open streams (clients reconnect); new streams can still be opened."""
+        with self._cond:
+            self._epoch += 1
+            self._cond.notify_all()
+    
+    def _stream(self, seq: int, missed: List[Dict], epoch: int) -> Iterator[str]:
+        yield f"retry: {RETRY_MS}\n\n"
+        for event in missed:
+            yield format_event(event)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._seq > seq or self._epoch != epoch, timeout=KEEPALIVE)
+                if self._epoch != epoch:
+                    return
+                if self._events and self._events[0][0] > seq + 1:
+                    events = [{'event': 'reset', 'data': {'head': self._head}}]  # fell behind
+                else:
+                    events = [event for number, event in self._events if number > seq]
+                seq = self._seq
+            if not events:
+                yield ": keepalive\n\n"
+            for event in events:
+                yield format_event(event)
+    
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'streams': self._streams,
+                'published': self.published,
+                'resumed': self.resumed,
+                'resets': self.resets,
+            }
\ No newline at end of file
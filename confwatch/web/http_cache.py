@@ -0,0 +1,282 @@
+"""
+HTTP caching and compression for the web UI.
+
+API responses carry ETags derived from what they were computed from (the
+HEAD commit, blob ids, the config version), so a client that polls gets a
+body-less ``304 Not Modified`` until something actually changed. Bodies are
+compressed with brotli (if the ``brotli`` package is installed) or gzip,
+whichever the client prefers; compressed bodies of tagged responses are kept
+in the response cache, so repeat views cost no compression either.
+
+Static assets are compressed once per file version. Pages reference them
+with a ``?v=<content hash>`` query, and versioned URLs are served as
+immutable, so browsers do not even revalidate them until they change.
+"""
+
+import os
+import re
+import gzip
+import zlib
+import hashlib
+import mimetypes
+import threading
+from typing import Dict, Iterable, Optional
+
+from flask import Response, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+MIN_SIZE = 1024  # bytes; smaller bodies are sent as they are
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+PRIVATE = 'private, no-cache'
+
+_COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+_ASSET_REF = re.compile(r'(\b(?:src|href)=")([^":?#]+\.(?:css|js))(")')
+
+
+def encodings() -> list:
+    """Content codings this server can produce, preferred first."""
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def compressible(mimetype: Optional[str]) -> bool:
+    return bool(mimetype) and mimetype.startswith(_COMPRESSIBLE)
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if level is None else level)
+    return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+
+
+def negotiate() -> Optional[str]:
+    """Content coding to use for the current request, or None for identity."""
+    return request.accept_encodings.best_match(encodings())
+
+
+def make_etag(key: tuple) -> str:
+    """Strong ETag for a response computed from ``key``."""
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:32]
+
+
+def not_modified(etag: str, cache_control: str = PRIVATE) -> Optional[Response]:
+    """A 304 response if the client already has ``etag``, else None.
+    
+    Compressed representations carry ``<etag>-<coding>`` (see
+    ``compress_response``), so those match as well.
+    """
+    tags = request.if_none_match
+    if not tags:
+        return None
+    if tags.star_tag or any(tags.contains(tag) for tag in _variants(etag)):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+    return None
+
+
+def _variants(etag: str) -> Iterable[str]:
+    yield etag
+    for encoding in encodings():
+        yield f"{etag}-{encoding}"
+
+
+def tag(response: Response, etag: str, cache_control: str = PRIVATE) -> Response:
+    """Mark a response as revalidatable with ``etag``."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def compress_response(response: Response, cache=None) -> Response:
+    """Compress a response body if the client accepts it.
+    
+    ``cache`` is a ``ResponseCache``; compressed bodies of responses with a
+    strong ETag are kept in it under that ETag. Streamed bodies are
+    compressed chunk by chunk instead (event streams are left alone).
+    """
+    if (response.status_code != 200 or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or not compressible(response.mimetype)
+            or response.mimetype == 'text/event-stream'):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.is_streamed:
+        return _compress_stream(response)
+    body = response.get_data()
+    if len(body) < MIN_SIZE:
+        return response
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    
+    etag, weak = response.get_etag()
+    key = ('encoded', encoding, etag) if cache is not None and etag and not weak else None
+    compressed = cache.get(key) if key else None
+    if compressed is None:
+        compressed = compress(body, encoding)
+        if key:
+            cache.put(key, compressed)
+    
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+
+def _compress_stream(response: Response) -> Response:
+    encoding = negotiate()
+    if encoding is None:
+        return response
+    response.response = _compressed_chunks(response.response, encoding)
+    response.headers.pop('Content-Length', None)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak=weak)
+    return response
+
+
+def _compressed_chunks(chunks: Iterable, encoding: str) -> Iterable[bytes]:
+    """Compress a body incrementally, flushing after each chunk so that
+    clients see data as soon as it is produced."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        flush = compressor.flush
+        finish = compressor.finish
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip container
+        flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        finish = compressor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compressor.process(chunk) if encoding == 'br' else compressor.compress(chunk)
+            data += flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class _Asset:
+    """One version of a static file, with its compressed variants."""
+    
+    __slots__ = ('signature', 'version', 'mimetype', 'mtime', 'variants', 'deps')
+    
+    def __init__(self, signature: tuple, version: str, mimetype: str, mtime: float,
+                 variants: Dict[str, bytes], deps: Dict[str, str]):
+        self.signature = signature
+        self.version = version
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.variants = variants  # coding ('identity', 'gzip', 'br') -> body
+        self.deps = deps  # assets referenced by a page -> their version
+
+
+class StaticAssets:
+    """Static files of the web UI, compressed once per file version.
+    
+    A file is re-read only when its size or mtime changes. In HTML pages,
+    references to local ``.css`` and ``.js`` files get a ``?v=<version>``
+    query, which makes those URLs safe to cache forever.
+    """
+    
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._assets: Dict[str, _Asset] = {}
+    
+    def version(self, filename: str) -> Optional[str]:
+        asset = self._load(filename)
+        return asset.version if asset else None
+    
+    def _load(self, filename: str) -> Optional[_Asset]:
+        path = safe_join(self.directory, filename)
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        signature = (st.st_size, st.st_mtime_ns)
+        
+        with self._lock:
+            asset = self._assets.get(filename)
+        if asset is not None and asset.signature == signature and all(
+                self.version(dep) == version for dep, version in asset.deps.items()):
+            return asset
+        
+        with open(path, 'rb') as f:
+            data = f.read()
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        deps: Dict[str, str] = {}
+        if mimetype == 'text/html':
+            data = self._link_assets(filename, data, deps)
+        
+        variants = {'identity': data}
+        if compressible(mimetype) and len(data) >= MIN_SIZE:
+            for encoding in encodings():
+                compressed = compress(data, encoding, level=9 if encoding == 'gzip' else None)
+                if len(compressed) < len(data):
+                    variants[encoding] = compressed
+        
+        asset = _Asset(signature, hashlib.sha1(data).hexdigest()[:12], mimetype, st.st_mtime, variants, deps)
+        with self._lock:
+            self._assets[filename] = asset
+        return asset
+    
+    def _link_assets(self, filename: str, data: bytes, deps: Dict[str, str]) -> bytes:
+        """Add ``?v=<version>`` to the local assets a page references."""
+        base = os.path.dirname(filename)
+        
+        def versioned(match):
+            ref = match.group(2)
+            dep = os.path.normpath(os.path.join(base, ref)) if base else ref
+            version = self.version(dep)
+            if version is None:
+                return match.group(0)
+            deps[dep] = version
+            return f"{match.group(1)}{ref}?v={version}{match.group(3)}"
+        
+        return _ASSET_REF.sub(versioned, data.decode('utf-8')).encode('utf-8')
+    
+    def response(self, filename: str, compression: bool = True) -> Optional[Response]:
+        """Response for a static file, or None if it does not exist."""
+        asset = self._load(filename)
+        if asset is None:
+            return None
+        immutable = request.args.get('v') == asset.version
+        cache_control = IMMUTABLE if immutable else REVALIDATE
+        
+        encoding = negotiate() if compression and len(asset.variants) > 1 else None
+        if encoding not in asset.variants:
+            encoding = 'identity'
+        etag = asset.version if encoding == 'identity' else f"{asset.version}-{encoding}"
+        
+        cached = not_modified(asset.version, cache_control)
+        if cached is not None:
+            cached.set_etag(etag)
+            return cached
+        
+        response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        if compressible(asset.mimetype):
+            response.vary.add('Accept-Encoding')
+        response.set_etag(etag)
+        response.last_modified = asset.mtime
+        response.headers['Cache-Control'] = cache_control
+        return response
\ No newline at end of file
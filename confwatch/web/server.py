@@ -0,0 +1,476 @@
+"""
+Production server for the web UI: a pre-forking master and worker processes.
+
+The master binds the listening socket and forks ``workers`` processes that
+accept connections from it. Each worker serves requests on a pool of
+``threads`` threads, so a slow diff occupies one thread instead of the
+server, and requests are spread over all cores. The master only supervises:
+
+- a worker that exits (crash, recycling) is replaced;
+- a worker whose heartbeat stops for ``timeout`` seconds is killed;
+- SIGHUP starts a new set of workers and retires the old ones gracefully
+  (they finish the requests they have accepted); the socket stays open, so
+  no connection is refused during a reload;
+- SIGTERM and SIGINT stop the workers gracefully, then the master exits.
+
+Workers recycle themselves after ``max_requests`` requests (plus jitter, so
+they do not all restart at once), and retire when a request has run for
+more than ``timeout`` seconds: a thread stuck in ``git`` cannot be
+interrupted, but its process can be replaced. The socket is opened with
+SO_REUSEPORT where available, so a restarted daemon can bind the port while
+the old one is still draining.
+"""
+
+import os
+import time
+import errno
+import random
+import select
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler, get_sockaddr, select_address_family
+
+from ..core import log as logs
+from ..core.log import get_logger
+
+log = get_logger('server')
+
+GRACEFUL_TIMEOUT = 5.0  # seconds a retiring worker may spend on accepted requests
+KEEPALIVE_TIMEOUT = 5.0  # seconds an idle connection may hold a thread
+HEARTBEAT_INTERVAL = 1.0
+
+
+class _RequestHandler(WSGIRequestHandler):
+    """Request handler that closes idle keep-alive connections."""
+    
+    timeout = KEEPALIVE_TIMEOUT
+
+
+class _TimedBody:
+    """Response body that reports the end of its request once it is closed (fully sent or aborted)."""
+    
+    __slots__ = ('body', 'done')
+    
+    def __init__(self, body, done: Callable[[], None]):
+        self.body = body
+        self.done: Optional[Callable[[], None]] = done
+    
+    def __iter__(self):
+        return iter(self.body)
+    
+    def close(self):
+        try:
+            close = getattr(self.body, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            done, self.done = self.done, None
+            if done is not None:
+                done()
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug WSGI server on an inherited socket, with a fixed thread pool.
+    
+    The accept loop waits for a free thread before accepting the next
+    connection, so a busy worker leaves new connections to the others.
+    Requests find the server in ``environ['confwatch.server']``, to size
+    long-lived responses to ``threads`` and to end them on shutdown
+    (``add_shutdown_hook``).
+    """
+    
+    multithread = True
+    
+    def __init__(self, host: str, port: int, app, fd: int, threads: int = 4):
+        self.threads = max(1, int(threads))
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='confwatch-web')
+        self._slots = threading.BoundedSemaphore(self.threads)
+        self._active: Dict[int, float] = {}  # thread id -> start of the request it serves
+        self.requests = 0
+        self._stopping = False
+        self._shutdown_hooks: List[Callable[[], None]] = []
+        super().__init__(host, port, self._timed, handler=_RequestHandler, fd=fd)
+        self.wsgi_app = app
+        # Shared with the other workers: the one that loses a race for a
+        # connection gets EAGAIN instead of blocking in accept()
+        self.socket.setblocking(False)
+    
+    def _timed(self, environ, start_response):
+        """Run the app; the request counts as active until its body has been sent.
+        
+        Streamed bodies (diffs, histories, contents) are produced while they
+        are sent, so the ``timeout`` watchdog must see them too. Event
+        streams are the exception: they stay open by design.
+        """
+        ident = threading.get_ident()
+        self._active[ident] = time.monotonic()
+        environ['confwatch.server'] = self
+        
+        def timed_start_response(status, headers, exc_info=None):
+            if any(name.lower() == 'content-type' and value.startswith('text/event-stream')
+                   for name, value in headers):
+                self._active.pop(ident, None)
+            return start_response(status, headers, exc_info)
+        
+        def done():
+            self._active.pop(ident, None)
+            self.requests += 1
+        
+        try:
+            body = self.wsgi_app(environ, timed_start_response)
+        except BaseException:
+            done()
+            raise
+        return _TimedBody(body, done)
+    
+    def oldest_request(self) -> float:
+        """Seconds the longest-running request has been running (0 if idle)."""
+        started = list(self._active.values())
+        return time.monotonic() - min(started) if started else 0.0
+    
+    def process_request(self, request, client_address):
+        while not self._slots.acquire(timeout=0.5):
+            if self._stopping:
+                self.shutdown_request(request)
+                return
+        try:
+            self._pool.submit(self._process, request, client_address)
+        except RuntimeError:  # pool shut down
+            self._slots.release()
+            self.shutdown_request(request)
+    
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+    
+    def add_shutdown_hook(self, hook: Callable[[], None]):
+        """Call ``hook`` when the server stops, e.g. to end streams that would block draining."""
+        if hook not in self._shutdown_hooks:
+            self._shutdown_hooks.append(hook)
+    
+    def shutdown(self):
+        """Stop accepting connections; returns once the accept loop has exited."""
+        self._stopping = True
+        for hook in list(self._shutdown_hooks):
+            try:
+                hook()
+            except Exception as e:
+                log.error(f"Shutdown hook failed: {e}")
+        super().shutdown()
+    
+    def drain(self, timeout: float) -> bool:
+        """Wait for accepted requests to finish. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        acquired = 0
+        try:
+            while acquired < self.threads:
+                if not self._slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    return False
+                acquired += 1
+            return True
+        finally:
+            for _ in range(acquired):
+                self._slots.release()
+
+
+class _Worker:
+    """Master-side record of a worker process."""
+    
+    __slots__ = ('pid', 'generation', 'heartbeat', 'started', 'last_beat', 'retiring')
+    
+    def __init__(self, pid: int, generation: int, heartbeat: int):
+        self.pid = pid
+        self.generation = generation
+        self.heartbeat = heartbeat  # read end of the worker's heartbeat pipe
+        self.started = self.last_beat = time.monotonic()
+        self.retiring: Optional[float] = None  # when it was asked to stop
+
+
+class PreforkServer:
+    """Pre-forking server: a supervising master and threaded workers."""
+    
+    def __init__(self, app, host: str = '0.0.0.0', port: int = 8080, workers: int = 2,
+                 threads: int = 4, timeout: float = 60, max_requests: int = 0,
+                 graceful_timeout: float = GRACEFUL_TIMEOUT, notifier=None):
+        """
+        Args:
+            app: WSGI application
+            host, port: Address to listen on
+            workers: Number of worker processes
+            threads: Request threads per worker
+            timeout: Seconds a request may run, and a worker may go without a heartbeat
+            max_requests: Requests after which a worker is replaced (0: never)
+            graceful_timeout: Seconds a stopping worker may spend finishing requests
+            notifier: SdNotifier told about readiness, reloads and stopping
+        """
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, int(workers))
+        self.threads = max(1, int(threads))
+        self.timeout = float(timeout)
+        self.max_requests = max(0, int(max_requests))
+        self.graceful_timeout = graceful_timeout
+        self.notifier = notifier
+        
+        self.socket: Optional[socket.socket] = None
+        self._workers: Dict[int, _Worker] = {}
+        self._generation = 0
+        self._signals = []
+        self._respawn_after = 0.0
+        self._master_pid = os.getpid()
+        
+        # Counters
+        self.spawned = 0
+        self.crashed = 0
+        self.killed = 0
+        self.reloads = 0
+    
+    # Master
+    
+    def _bind(self) -> socket.socket:
+        family = select_address_family(self.host, self.port)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        sock.bind(get_sockaddr(self.host, int(self.port), family))
+        sock.listen(socket.SOMAXCONN)
+        sock.setblocking(False)
+        return sock
+    
+    def serve(self):
+        """Serve until SIGTERM or SIGINT. Must be called from the main thread."""
+        self._master_pid = os.getpid()
+        self.socket = self._bind()
+        wake_r, wake_w = os.pipe()
+        os.set_blocking(wake_r, False)
+        os.set_blocking(wake_w, False)
+        previous_wakeup = signal.set_wakeup_fd(wake_w)
+        handlers = {}
+        for signum in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP, signal.SIGCHLD):
+            handlers[signum] = signal.signal(signum, self._on_signal)
+        
+        log.info(f"Serving on http://{self.host}:{self.port} with {self.workers} workers "
+                 f"x {self.threads} threads (PID: {os.getpid()})")
+        try:
+            self._spawn_missing()
+            if self.notifier:
+                self.notifier.ready(f"Serving on {self.host}:{self.port}, {self.workers} workers")
+            while self._run_once(wake_r):
+                pass
+        finally:
+            if self.notifier:
+                self.notifier.stopping()
+            self._stop_workers()
+            self.socket.close()
+            signal.set_wakeup_fd(previous_wakeup)
+            for signum, handler in handlers.items():
+                if handler is not None:
+                    signal.signal(signum, handler)
+            os.close(wake_r)
+            os.close(wake_w)
+            log.info("Server stopped")
+    
+    def _on_signal(self, signum, frame):
+        self._signals.append(signum)
+    
+    def _run_once(self, wake_r: int) -> bool:
+        """One supervision round. Returns False once the server should stop."""
+        fds = [wake_r] + [worker.heartbeat for worker in self._workers.values()]
+        try:
+            readable, _, _ = select.select(fds, [], [], HEARTBEAT_INTERVAL)
+        except OSError as e:
+            if e.errno != errno.EBADF:
+                raise
+            readable = []
+        now = time.monotonic()
+        beats = {worker.heartbeat: worker for worker in self._workers.values()}
+        for fd in readable:
+            try:
+                data = os.read(fd, 4096)
+            except (BlockingIOError, InterruptedError):
+                continue
+            if data and fd in beats:
+                beats[fd].last_beat = now
+        
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum in (signal.SIGTERM, signal.SIGINT):
+                log.info(f"Received signal {signum}, stopping")
+                return False
+            if signum == signal.SIGHUP:
+                self.reload()
+        
+        self._reap()
+        self._check_workers(now)
+        self._spawn_missing()
+        return True
+    
+    def reload(self):
+        """Replace all workers; the old ones finish their requests first."""
+        log.info("Reloading: starting new workers")
+        if self.notifier:
+            self.notifier.notify('RELOADING=1')
+        self.reloads += 1
+        self._generation += 1
+        old = [worker for worker in self._workers.values() if worker.generation < self._generation]
+        self._spawn_missing()
+        for worker in old:
+            self._retire(worker)
+        if self.notifier:
+            self.notifier.ready()
+    
+    def _retire(self, worker: _Worker):
+        if worker.retiring is None:
+            worker.retiring = time.monotonic()
+            self._kill(worker, signal.SIGTERM)
+    
+    def _kill(self, worker: _Worker, signum: int):
+        try:
+            os.kill(worker.pid, signum)
+        except ProcessLookupError:
+            pass
+    
+    def _reap(self):
+        """Collect exited workers."""
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.heartbeat)
+            code = os.waitstatus_to_exitcode(status)
+            if code != 0 and worker.retiring is None:
+                self.crashed += 1
+                log.warning(f"Worker {pid} exited unexpectedly (status {code})")
+                if time.monotonic() - worker.started < 1.0:
+                    # Failing right at startup: do not respawn in a tight loop
+                    self._respawn_after = time.monotonic() + 1.0
+    
+    def _check_workers(self, now: float):
+        """Kill workers that stopped beating or overran their graceful stop."""
+        for worker in list(self._workers.values()):
+            if worker.retiring is not None:
+                if now - worker.retiring > self.graceful_timeout + HEARTBEAT_INTERVAL:
+                    log.warning(f"Worker {worker.pid} did not stop in time, killing it")
+                    self.killed += 1
+                    self._kill(worker, signal.SIGKILL)
+            elif now - worker.last_beat > self.timeout:
+                log.warning(f"Worker {worker.pid} stopped responding, killing it")
+                self.killed += 1
+                worker.retiring = now
+                self._kill(worker, signal.SIGKILL)
+    
+    def _spawn_missing(self):
+        if time.monotonic() < self._respawn_after:
+            return
+        current = sum(1 for worker in self._workers.values()
+                      if worker.generation == self._generation and worker.retiring is None)
+        for _ in range(self.workers - current):
+            self._spawn()
+    
+    def _spawn(self):
+        beat_r, beat_w = os.pipe()
+        os.set_blocking(beat_r, False)
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                os.close(beat_r)
+                code = self._run_worker(beat_w)
+            except BaseException as e:
+                log.error(f"Worker failed: {e}")
+            finally:
+                logs.shutdown_logging()
+                os._exit(code)
+        os.close(beat_w)
+        self._workers[pid] = _Worker(pid, self._generation, beat_r)
+        self.spawned += 1
+    
+    def _stop_workers(self):
+        """Stop all workers gracefully, killing the ones that take too long."""
+        for worker in self._workers.values():
+            self._retire(worker)
+        deadline = time.monotonic() + self.graceful_timeout + HEARTBEAT_INTERVAL
+        while self._workers and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.05)
+        for worker in self._workers.values():
+            self._kill(worker, signal.SIGKILL)
+        while self._workers:
+            pid, _ = os.waitpid(-1, 0)
+            worker = self._workers.pop(pid, None)
+            if worker is not None:
+                os.close(worker.heartbeat)
+    
+    def status(self) -> dict:
+        return {
+            'workers': len(self._workers),
+            'threads': self.threads,
+            'spawned': self.spawned,
+            'crashed': self.crashed,
+            'killed': self.killed,
+            'reloads': self.reloads,
+        }
+    
+    # Worker
+    
+    def _run_worker(self, heartbeat: int) -> int:
+        """Serve requests until retired; runs in the forked child. Returns the exit code."""
+        signal.set_wakeup_fd(-1)
+        for worker in self._workers.values():
+            os.close(worker.heartbeat)
+        self._workers.clear()
+        retire = threading.Event()
+        signal.signal(signal.SIGTERM, lambda signum, frame: retire.set())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C reaches the master too
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        logs.after_fork()
+        
+        server = PooledWSGIServer(self.host, self.port, self.app, self.socket.fileno(), self.threads)
+        self.socket.close()
+        limit = self.max_requests + random.randint(0, self.max_requests // 10) if self.max_requests else 0
+        
+        def monitor():
+            reason = None
+            while reason is None:
+                if retire.wait(HEARTBEAT_INTERVAL):
+                    break
+                try:
+                    os.write(heartbeat, b'.')
+                except BlockingIOError:
+                    pass
+                if os.getppid() != self._master_pid:
+                    reason = "master exited"
+                elif limit and server.requests >= limit:
+                    reason = f"served {server.requests} requests"
+                elif server.oldest_request() > self.timeout:
+                    reason = f"a request has run for more than {self.timeout:g}s"
+            if reason:
+                log.info(f"Worker {os.getpid()} retiring: {reason}")
+            server.shutdown()
+        
+        threading.Thread(target=monitor, name='confwatch-worker-monitor', daemon=True).start()
+        server.serve_forever(poll_interval=0.5)
+        if not server.drain(self.graceful_timeout):
+            log.warning(f"Worker {os.getpid()} stopped with requests still running")
+        return 0
\ No newline at end of file
@@ -1,4 +1,5 @@
 let openBlock = null;
+let openView = null; // {kind: 'diff' | 'history', path} of the open block
 
 // --- Terminal command animation ---
 const demoCommands = [
@@ -43,8 +44,64 @@ document.addEventListener('DOMContentLoaded', function() {
 document.addEventListener("DOMContentLoaded", function() { 
     console.log("[INFO] ConfWatch Terminal initialized");
     loadFiles(); 
+    connectEvents();
 });
 
+// --- Live updates: server-sent events instead of polling ---
+function connectEvents() {
+    if (!window.EventSource) return;
+    // EventSource reconnects by itself and sends Last-Event-ID, so missed snapshots are replayed
+    const source = new EventSource('/api/events');
+    const onCommit = e => {
+        const data = JSON.parse(e.data);
+        const kind = e.type === 'rollback' ? 'Rollback' : 'Snapshot';
+        updateStatus(`[EVENT] ${kind} ${data.hash.slice(0, 8)}: ${data.files.join(', ') || 'untracked file'}`);
+        refreshFiles(data.files);
+    };
+    source.addEventListener('snapshot', onCommit);
+    source.addEventListener('rollback', onCommit);
+    source.addEventListener('status', e => {
+        const data = JSON.parse(e.data);
+        updateStatus(`[EVENT] Status changed: ${data.files.map(f => f.name).join(', ')}`);
+        refreshFiles(data.files.map(f => f.abs_path));
+    });
+    source.addEventListener('reset', () => refreshFiles(null));
+}
+
+function refreshFiles(paths) {
+    // Update the file rows in place; an open diff or history is reloaded only if its file changed
+    fetch("/api/files")
+        .then(response => response.json())
+        .then(data => {
+            if (!data.files) return;
+            const shown = Array.from(document.querySelectorAll('#fileList .file-item')).map(item => item.id);
+            const fresh = data.files.map(file => `block-${btoa(file.abs_path)}`);
+            if (shown.join() !== fresh.join()) {
+                // Files were added to or removed from the config: render the list again
+                const view = openView;
+                displayFiles(data.files);
+                openBlock = null;
+                openView = null;
+                if (view && fresh.includes(`block-${btoa(view.path)}`)) reopenView(view);
+                return;
+            }
+            data.files.forEach(file => {
+                const item = document.getElementById(`block-${btoa(file.abs_path)}`);
+                item.querySelector('.file-item-main').outerHTML = fileItemMain(file);
+            });
+            if (openView && (paths === null || paths.includes(openView.path))) reopenView(openView);
+        })
+        .catch(error => console.error("[ERROR] Failed to refresh files:", error));
+}
+
+function reopenView(view) {
+    if (view.kind === 'diff') {
+        showDiff(view.path);
+    } else {
+        showHistory(view.path);
+    }
+}
+
 function loadFiles() {
     // Предотвращаем стандартное поведение браузера
     if (event) {
@@ -80,12 +137,22 @@ function displayFiles(files) {
     
     fileList.innerHTML = files.map(file => `
         <div class="file-item" id="block-${btoa(file.abs_path)}">
+            ${fileItemMain(file)}
+            <div class="diff-container" id="diff-${btoa(file.abs_path)}" style="display:none;"></div>
+            <div class="history-container" id="history-${btoa(file.abs_path)}" style="display:none;"></div>
+        </div>
+    `).join("");
+}
+
+function fileItemMain(file) {
+    return `
             <div class="file-item-main">
                 <div class="file-info">
                     <div class="file-name">${file.name}</div>
                     <div class="file-status">
                         ${file.exists ? "[OK] File exists" : "[MISSING] File not found"} | 
                         ${file.history_count > 0 ? `[HISTORY] ${file.history_count} snapshots` : "[NEW] No history"}
+                        ${file.last_change ? ` | [LAST] ${file.last_change.slice(0,19).replace('T',' ')} ${file.last_auto ? "(auto)" : "(manual)"}` : ""}
                     </div>
                 </div>
                 <div class="file-actions">
@@ -98,11 +165,7 @@ function displayFiles(files) {
                         `<button class="btn" disabled>[HISTORY]</button>`
                     }
                 </div>
-            </div>
-            <div class="diff-container" id="diff-${btoa(file.abs_path)}" style="display:none;"></div>
-            <div class="history-container" id="history-${btoa(file.abs_path)}" style="display:none;"></div>
-        </div>
-    `).join("");
+            </div>`;
 }
 
 function showDiff(abs_path) {
@@ -113,6 +176,7 @@ function showDiff(abs_path) {
     diffContainer.style.display = "block";
     diffContainer.innerHTML = "<div class=\"loading\">[LOADING] Analyzing file differences...</div>";
     openBlock = diffContainer;
+    openView = {kind: 'diff', path: abs_path};
     
     fetch(`/api/diff?file=${encodeURIComponent(abs_path)}`)
         .then(response => {
@@ -155,6 +219,7 @@ function showHistory(abs_path) {
     historyContainer.style.display = "block";
     historyContainer.innerHTML = "<div class=\"loading\">[LOADING] Retrieving file history...</div>";
     openBlock = historyContainer;
+    openView = {kind: 'history', path: abs_path};
 
     fetch(`/api/history?file=${encodeURIComponent(abs_path)}`)
         .then(response => {
@@ -284,6 +349,7 @@ function closeOpenBlock() {
         openBlock.style.display = "none";
         openBlock.innerHTML = "";
         openBlock = null;
+        openView = null;
     }
 }
 
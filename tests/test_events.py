@@ -0,0 +1,93 @@
+"""
+Event streams under the pre-forking server's fixed thread pool.
+"""
+
+import http.client
+import os
+import socket
+import threading
+
+import pytest
+
+from confwatch.web import app as web
+from confwatch.web.server import PooledWSGIServer
+
+
+@pytest.fixture
+def server(tmp_path):
+    home = tmp_path / '.confwatch'
+    (home / 'config').mkdir(parents=True)
+    (home / 'config' / 'config.yml').write_text(f"watch:\n  - {tmp_path / 'a.conf'}\n")
+    web.set_home(str(home))
+    web.auth_manager.save_password('secret')
+    token = web.auth_manager.create_token('test')
+    
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    server = PooledWSGIServer('127.0.0.1', sock.getsockname()[1], web.app, os.dup(sock.fileno()), threads=2)
+    sock.close()
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.1}, daemon=True)
+    thread.start()
+    yield server, token
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, token, path, timeout=5.0):
+    conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=timeout)
+    conn.request('GET', path, headers={'Authorization': f'Bearer {token}'})
+    return conn, conn.getresponse()
+
+
+def test_streams_leave_a_thread_for_other_requests(server):
+    server, token = server
+    conn, stream = _get(server, token, '/api/events')
+    assert stream.status == 200
+    assert stream.readline().startswith(b'retry:')
+    # Open by design: not subject to the request timeout
+    assert server.oldest_request() == 0.0
+    
+    # Two threads: one stream is allowed, the next is refused...
+    refused, response = _get(server, token, '/api/events')
+    assert response.status == 503
+    refused.close()
+    
+    # ...and ordinary requests are still served
+    other, response = _get(server, token, '/api/version')
+    assert response.status == 200
+    other.close()
+    conn.close()
+
+
+def test_shutdown_ends_streams(server):
+    server, token = server
+    conn, stream = _get(server, token, '/api/events')
+    assert stream.status == 200
+    stream.readline()
+    
+    server.shutdown()
+    assert server.drain(5.0)
+    conn.close()
+
+def test_unread_stream_gives_its_slot_back(server):
+    server, token = server
+    hub = web._events()
+    for _ in range(3):
+        hub.stream(limit=1).close()  # what the server does with a body it never sends
+    assert hub.stats()['streams'] == 0
+    
+    conn, response = _get(server, token, '/api/events')
+    assert response.status == 200
+    conn.close()
+
+
+def test_head_is_rejected(server):
+    server, token = server
+    conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+    conn.request('HEAD', '/api/events', headers={'Authorization': f'Bearer {token}'})
+    response = conn.getresponse()
+    assert response.status == 405
+    assert response.getheader('Allow') == 'GET'
+    conn.close()
+    assert web._events().stats()['streams'] == 0
@@ -0,0 +1,64 @@
+"""
+Request accounting of the pre-forking server's worker.
+"""
+
+import http.client
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from confwatch.web.server import PooledWSGIServer
+
+
+def _serve(app, threads=2):
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(16)
+    server = PooledWSGIServer('127.0.0.1', sock.getsockname()[1], app, os.dup(sock.fileno()), threads=threads)
+    sock.close()
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.1}, daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def streaming():
+    """A server whose response body is sent one chunk per ``release()``."""
+    release = threading.Semaphore(0)
+    
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        for chunk in (b'first\n', b'second\n'):
+            release.acquire()
+            yield chunk
+    
+    server = _serve(app)
+    yield server, release
+    for _ in range(2):
+        release.release()
+    server.shutdown()
+    server.server_close()
+
+
+def test_streamed_body_counts_as_running(streaming):
+    server, release = streaming
+    conn = http.client.HTTPConnection('127.0.0.1', server.port, timeout=5)
+    conn.request('GET', '/')
+    release.release()
+    response = conn.getresponse()
+    assert response.readline() == b'first\n'
+    time.sleep(0.2)
+    # The app has returned its iterable, but the body is still being sent
+    assert server.oldest_request() >= 0.2
+    assert server.requests == 0
+    
+    release.release()
+    assert response.read() == b'second\n'
+    conn.close()
+    deadline = time.monotonic() + 5
+    while server.requests == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert server.requests == 1
+    assert server.oldest_request() == 0.0